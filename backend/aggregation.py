@@ -0,0 +1,158 @@
+"""
+Aggregation of per-point analyses into a single region-level result.
+
+Used by the polygon endpoints. Every point can carry a weight (e.g. the area of
+its POWER grid cell covered by the polygon); without weights all points count
+equally.
+"""
+
+
+def sample_meets(a):
+    """True when all primary metrics of an atmospheric signature meet the profile."""
+    t = a.get('temperature', {}).get('meets_profile')
+    w = a.get('wind', {}).get('meets_profile')
+    p = a.get('precipitation', {}).get('meets_profile')
+    h = a.get('humidity', {}).get('meets_profile')
+    return bool(t and w and p and h)
+
+
+def sample_percent_meets(result: dict) -> float:
+    """
+    The share (0-100) of days a point meets the whole profile: its final verdict,
+    which is empirical when the probability table covers it, else all-or-nothing
+    from the signature's flags.
+    """
+    percent = result.get('final_verdict', {}).get('percent_meet_profile')
+    if percent is None:
+        return 100.0 if sample_meets(result.get('atmospheric_signature', {})) else 0.0
+    return percent
+
+
+def aggregate_results(successful: list, weights: list = None) -> dict:
+    """
+    Combines successful point analyses (as returned by get_climatological_analysis)
+    into one result with the same shape. Numeric fields become (weighted) means and
+    each `meets_profile` flag holds when at least half of the weight meets it.
+    """
+    n = len(successful)
+    if weights is None:
+        weights = [1.0] * n
+    total_weight = sum(weights)
+
+    # Aggregation helpers
+    def mean(values):
+        return sum(w * v for w, v in zip(weights, values)) / total_weight if values and total_weight else 0
+
+    def share(flags):
+        return sum(w for w, f in zip(weights, flags) if f) / total_weight if total_weight else 0
+
+    aggregated = {}
+
+    # overall_score average
+    aggregated['overall_score'] = round(mean([s.get('overall_score', 0) for s in successful]))
+
+    # Location: use first result's location or indicate polygon
+    aggregated['location'] = successful[0].get('location', 'Polygon region')
+
+    # Aggregate atmospheric_signature
+    atms = [s.get('atmospheric_signature', {}) for s in successful]
+    # Temperature
+    temps = [a.get('temperature', {}) for a in atms]
+    aggregated_temp = {
+        'avg': round(mean([t.get('avg', 0) for t in temps]), 1),
+        'min': round(mean([t.get('min', 0) for t in temps]), 1),
+        'max': round(mean([t.get('max', 0) for t in temps]), 1),
+        'meets_profile': share([t.get('meets_profile') for t in temps]) >= 0.5,
+        'units': '°C'
+    }
+
+    # Wind
+    winds = [a.get('wind', {}) for a in atms]
+    aggregated_wind = {
+        'avg': round(mean([w.get('avg', 0) for w in winds]), 1),
+        'max': round(mean([w.get('max', 0) for w in winds]), 1),
+        'meets_profile': share([w.get('meets_profile') for w in winds]) >= 0.5,
+        'units': 'm/s'
+    }
+
+    # Humidity
+    hums = [a.get('humidity', {}) for a in atms]
+    aggregated_humidity = {
+        'avg': round(mean([h.get('avg', 0) for h in hums]), 1),
+        'meets_profile': share([h.get('meets_profile') for h in hums]) >= 0.5,
+        'units': '%'
+    }
+
+    # Precipitation
+    precs = [a.get('precipitation', {}) for a in atms]
+    aggregated_precip = {
+        'avg_daily_amount': round(mean([p.get('avg_daily_amount', 0) for p in precs]), 2),
+        'estimated_daily_chance': round(mean([p.get('estimated_daily_chance', 0) for p in precs]), 1),
+        'meets_profile': share([p.get('meets_profile') for p in precs]) >= 0.5,
+        'units': {'amount': 'mm/day', 'chance': '%'}
+    }
+
+    # Sunlight
+    suns = [a.get('sunlight', {}) for a in atms]
+    aggregated_sun = {
+        'sunny_day_likelihood': round(mean([s.get('sunny_day_likelihood', 0) for s in suns])),
+        'clearness_index': round(mean([s.get('clearness_index', 0) for s in suns]), 2),
+        'units': '% likelihood'
+    }
+
+    aggregated['atmospheric_signature'] = {
+        'temperature': aggregated_temp,
+        'wind': aggregated_wind,
+        'humidity': aggregated_humidity,
+        'precipitation': aggregated_precip,
+        'sunlight': aggregated_sun
+    }
+
+    # Specialty scores: average each numeric score
+    spec = [s.get('specialty_scores', {}) for s in successful]
+    keys = set().union(*(d.keys() for d in spec))
+    aggregated['specialty_scores'] = {k: round(mean([d.get(k, 0) for d in spec])) for k in keys}
+
+    # Final verdict: the (weighted) mean of each sample's chance to meet the profile,
+    # so a region that meets it 49% of the time everywhere reports 49%, not 0%
+    percent_meet = round(mean([sample_percent_meets(s) for s in successful]))
+    aggregated['final_verdict'] = {
+        'percent_meet_profile': percent_meet,
+        'samples_evaluated': n
+    }
+    return aggregated
+
+
+class RunningAggregate:
+    """
+    Incrementally maintained headline numbers for a region, so streaming responses can
+    report progress after every sample without re-aggregating everything so far.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_weight = 0.0
+        self.score_sum = 0.0
+        self.temp_sum = 0.0
+        self.rain_chance_sum = 0.0
+        self.meet_sum = 0.0
+
+    def add(self, result: dict, weight: float = 1.0):
+        atm = result.get('atmospheric_signature', {})
+        self.count += 1
+        self.total_weight += weight
+        self.score_sum += weight * result.get('overall_score', 0)
+        self.temp_sum += weight * atm.get('temperature', {}).get('avg', 0)
+        self.rain_chance_sum += weight * atm.get('precipitation', {}).get('estimated_daily_chance', 0)
+        self.meet_sum += weight * sample_percent_meets(result)
+
+    def snapshot(self) -> dict:
+        if not self.total_weight:
+            return {'samples_evaluated': self.count}
+        return {
+            'overall_score': round(self.score_sum / self.total_weight),
+            'temperature_avg': round(self.temp_sum / self.total_weight, 1),
+            'estimated_daily_chance': round(self.rain_chance_sum / self.total_weight, 1),
+            'percent_meet_profile': round(self.meet_sum / self.total_weight),
+            'samples_evaluated': self.count,
+        }
@@ -0,0 +1,307 @@
+"""
+Benchmark harness for the analysis endpoints, run against the local POWER stub.
+
+By default it starts the stub (power_stub.py) and the app (main.py) as uvicorn
+subprocesses, with the app pointed at the stub and its disk cache and grid store
+switched off, so every run starts cold and never touches NASA. It then drives one
+endpoint open-loop at a fixed request rate (requests are fired on schedule whether
+or not earlier ones have finished, so a slow server shows up as latency rather than
+as a lower offered load) and records latency percentiles, throughput, errors,
+upstream calls served by the stub and the app's memory. Results are written as JSON
+and can be compared against a saved baseline.
+
+Examples:
+    python benchmark.py --scenario point --rps 50 --duration 30
+    python benchmark.py --scenario polygon --rps 5 --stub-latency-ms 200 --stub-failure-rate 0.05
+    python benchmark.py --scenario point --compare data/benchmarks/baseline-point.json
+
+    # An app that is already running (pointed at a stub on --stub-url)
+    python benchmark.py --app-url http://127.0.0.1:8000 --stub-url http://127.0.0.1:8001 --app-pid 1234
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import tempfile
+import httpx
+import numpy as np
+from pathlib import Path
+
+# --- Configuration ---
+APP_PORT = 8100
+STUB_PORT = 8101
+STARTUP_TIMEOUT = 30       # seconds to wait for a spawned server to answer
+MEMORY_SAMPLE_INTERVAL = 0.5
+RESULTS_DIR = "data/benchmarks"
+DEFAULT_PROFILE = {"temp_min": 15, "temp_max": 25, "wind_max": 10, "rain_chance_max": 20, "humidity_max": 70}
+
+
+# --- Scenarios ---
+
+def _random_point(rng: random.Random, cells: int):
+    # With `cells` > 0 points are drawn from that many fixed locations, to control the
+    # cache hit ratio; otherwise every request is a new location
+    if cells > 0:
+        rng = random.Random(rng.randrange(cells))
+    return round(rng.uniform(-60, 70), 4), round(rng.uniform(-180, 180), 4)
+
+
+def _square(lat: float, lon: float, size: float) -> dict:
+    ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def point_request(rng: random.Random, cells: int):
+    lat, lon = _random_point(rng, cells)
+    return "/api/analyze/point", {
+        "lat": lat, "lon": lon, "month": rng.randint(1, 12), "day": rng.randint(1, 28), "profile": DEFAULT_PROFILE,
+    }
+
+
+def polygon_request(rng: random.Random, cells: int):
+    lat, lon = _random_point(rng, cells)
+    return "/api/analyze/polygon", {
+        "polygon": _square(lat, lon, 2.0), "month": rng.randint(1, 12), "day": rng.randint(1, 28),
+        "profile": DEFAULT_PROFILE, "sample_count": 9,
+    }
+
+
+def profile_request(rng: random.Random, cells: int):
+    lat, lon = _random_point(rng, cells)
+    return "/api/profile/from_date", {"lat": lat, "lon": lon, "month": rng.randint(1, 12), "day": rng.randint(1, 28)}
+
+
+SCENARIOS = {"point": point_request, "polygon": polygon_request, "profile": profile_request}
+
+
+# --- Processes ---
+
+def _spawn(module: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+        cwd=Path(__file__).parent,
+    )
+
+
+async def _wait_ready(client: httpx.AsyncClient, url: str):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {STARTUP_TIMEOUT}s")
+
+
+def read_rss_bytes(pid: int):
+    """Resident set size of a process (Linux /proc), or None where unavailable."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# --- Load Generation ---
+
+async def drive(client: httpx.AsyncClient, app_url: str, scenario, rps: float, duration: float, cells: int, seed: int) -> list:
+    """
+    Fires requests open-loop at `rps` for `duration` seconds. Returns one
+    (latency_seconds, status) tuple per request; status 0 means a transport error.
+    """
+    rng = random.Random(seed)
+    results = []
+
+    async def one(path: str, body: dict):
+        started = time.perf_counter()
+        try:
+            response = await client.post(app_url + path, json=body)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        results.append((time.perf_counter() - started, status))
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rps * duration)):
+        delay = start + i / rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(*scenario(rng, cells))))
+    await asyncio.gather(*tasks)
+    return results
+
+
+async def sample_memory(pid: int, samples: list):
+    while True:
+        rss = read_rss_bytes(pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    latencies = np.array([r[0] for r in results]) * 1000
+    statuses = [r[1] for r in results]
+    ok = latencies[[s == 200 for s in statuses]]
+    errors = {}
+    for s in statuses:
+        if s != 200:
+            errors[str(s)] = errors.get(str(s), 0) + 1
+    percentiles = np.percentile(ok, [50, 95, 99]).round(1).tolist() if len(ok) else [None] * 3
+    return {
+        "requests": len(results),
+        "succeeded": int(len(ok)),
+        "errors": errors,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": percentiles[0], "p95": percentiles[1], "p99": percentiles[2],
+            "max": round(float(ok.max()), 1) if len(ok) else None,
+            "mean": round(float(ok.mean()), 1) if len(ok) else None,
+        },
+    }
+
+
+async def run(args) -> dict:
+    stub_config = {
+        "latency_ms": args.stub_latency_ms,
+        "latency_sigma": args.stub_latency_sigma,
+        "slow_rate": args.stub_slow_rate,
+        "slow_ms": args.stub_slow_ms,
+        "failure_rate": args.stub_failure_rate,
+        "seed": args.seed,
+    }
+    processes = []
+    app_url, stub_url, app_pid = args.app_url, args.stub_url, args.app_pid
+    with tempfile.TemporaryDirectory() as scratch:
+        try:
+            if not app_url:
+                stub_url = f"http://127.0.0.1:{STUB_PORT}"
+                app_url = f"http://127.0.0.1:{APP_PORT}"
+                processes.append(_spawn("power_stub", STUB_PORT, {}))
+                app = _spawn("main", APP_PORT, {
+                    "POWER_CLIMATOLOGY_API_URL": f"{stub_url}/api/temporal/climatology/point",
+                    "CLIMATOLOGY_CACHE_PATH": str(Path(scratch, "cache.sqlite3")) if args.disk_cache else "",
+                    "CLIMATOLOGY_GRID_DIR": "",
+                    "PROBABILITY_TABLE_DIR": "",
+                })
+                processes.append(app)
+                app_pid = app.pid
+
+            timeout = httpx.Timeout(args.timeout)
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+            async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+                await _wait_ready(client, app_url + "/")
+                if stub_url:
+                    await _wait_ready(client, stub_url + "/stub/stats")
+                    await client.post(stub_url + "/stub/config", json=stub_config)
+                    await client.post(stub_url + "/stub/reset")
+
+                memory = []
+                sampler = asyncio.ensure_future(sample_memory(app_pid, memory)) if app_pid else None
+                started = time.perf_counter()
+                results = await drive(client, app_url, SCENARIOS[args.scenario], args.rps, args.duration, args.cells, args.seed)
+                elapsed = time.perf_counter() - started
+                if sampler:
+                    sampler.cancel()
+
+                summary = summarize(results, elapsed)
+                summary["upstream_calls"] = (await client.get(stub_url + "/stub/stats")).json() if stub_url else None
+                summary["app"] = {
+                    "upstream": (await client.get(app_url + "/api/upstream/stats")).json(),
+                    "cache": (await client.get(app_url + "/api/cache/stats")).json(),
+                }
+                summary["memory_rss_mb"] = {
+                    "start": round(memory[0] / 1e6, 1), "peak": round(max(memory) / 1e6, 1), "end": round(memory[-1] / 1e6, 1),
+                } if memory else None
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=10)
+
+    return {
+        "scenario": args.scenario,
+        "timestamp": time.time(),
+        "git_commit": _git_commit(),
+        "config": {
+            "rps": args.rps, "duration_s": args.duration, "cells": args.cells, "seed": args.seed,
+            "disk_cache": args.disk_cache, "stub": stub_config if stub_url else None,
+        },
+        "results": summary,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> bool:
+    """Prints latency/throughput changes against a baseline; False if p95 or throughput regressed too far."""
+    ok = True
+    now, before = report["results"], baseline["results"]
+    for key in ("p50", "p95", "p99"):
+        a, b = before["latency_ms"][key], now["latency_ms"][key]
+        if a and b:
+            change = (b - a) / a
+            print(f"latency {key}: {a} -> {b} ms ({change:+.0%})")
+            if key == "p95" and change > max_regression:
+                ok = False
+    a, b = before["throughput_rps"], now["throughput_rps"]
+    if a:
+        change = (b - a) / a
+        print(f"throughput: {a} -> {b} rps ({change:+.0%})")
+        if change < -max_regression:
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis endpoints against the local POWER stub.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="point")
+    parser.add_argument("--rps", type=float, default=20, help="Offered load, requests per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    parser.add_argument("--cells", type=int, default=0, help="Draw points from this many locations (0: all distinct)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request client timeout (seconds)")
+    parser.add_argument("--disk-cache", action="store_true", help="Enable the app's on-disk cache (in a temp dir)")
+    parser.add_argument("--stub-latency-ms", type=float, default=50)
+    parser.add_argument("--stub-latency-sigma", type=float, default=0.3)
+    parser.add_argument("--stub-slow-rate", type=float, default=0)
+    parser.add_argument("--stub-slow-ms", type=float, default=5000)
+    parser.add_argument("--stub-failure-rate", type=float, default=0)
+    parser.add_argument("--app-url", help="Benchmark an already running app instead of spawning one")
+    parser.add_argument("--stub-url", help="Stub the running app uses (for upstream call counts)")
+    parser.add_argument("--app-pid", type=int, help="PID of the running app (for memory sampling)")
+    parser.add_argument("--out", default=RESULTS_DIR, help="Directory for the JSON results (default: %(default)s)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95/throughput regression (default: 20%%)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report["results"], indent=2))
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    path = out / f"{time.strftime('%Y%m%d-%H%M%S')}-{args.scenario}.json"
+    path.write_text(json.dumps(report, indent=2))
+    print(f"Results written to '{path}'")
+
+    if args.compare and not compare(report, json.loads(Path(args.compare).read_text()), args.max_regression):
+        print("Regression beyond --max-regression")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
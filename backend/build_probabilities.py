@@ -0,0 +1,93 @@
+"""
+Builds the per-day probability table (see probability_table.py) from the MERRA-2
+daily store written by ingest_merra2.py.
+
+Every stored month is read once and its days are scattered into the table's
+day-of-year x year layout, so the build is one sequential pass over the store.
+Months covering different cells than the first one are skipped (re-ingest them
+with the same --bbox).
+
+Size: the table is cells x 366 days x years x 4 variables of float16, i.e. about
+2.9 KB per cell and year. The whole globe (361 x 576 cells) over 1980-2023 would
+be ~27 GB, so builds above --max-gb (default 8) are refused; narrow them with --bbox.
+
+Examples:
+    python build_probabilities.py
+    python build_probabilities.py --bbox 68 6 98 36
+    python build_probabilities.py --store data/merra2_store --out data/probability_table
+"""
+import argparse
+import numpy as np
+import xarray as xr
+
+from ingest_merra2 import bbox_slices
+from merra2_store import MERRA2Store, MERRA2_STORE_DIR, month_path
+from probability_table import ProbabilityTable, PROBABILITY_TABLE_DIR, TABLE_VARIABLES
+from scoring import DAYS_IN_YEAR, day_of_year
+
+MAX_TABLE_GB = 8.0
+
+
+def table_bytes(lat_idx: slice, lon_idx: slice, years: int) -> int:
+    return (lat_idx.stop - lat_idx.start) * (lon_idx.stop - lon_idx.start) * DAYS_IN_YEAR * years * len(TABLE_VARIABLES) * 2
+
+
+def build(store_dir: str, out_dir: str, bbox=None, max_gb: float = MAX_TABLE_GB) -> ProbabilityTable:
+    store = MERRA2Store.open(store_dir)
+    months = sorted(store.meta["months"].items())
+    if not months:
+        raise ValueError(f"The MERRA-2 store at '{store_dir}' is empty (run ingest_merra2.py)")
+
+    region = months[0][1]
+    stored_lat, stored_lon = slice(*region["lat_idx"]), slice(*region["lon_idx"])
+    lat_idx, lon_idx = stored_lat, stored_lon
+    if bbox is not None:
+        # Only the part of the stored region inside the box
+        box_lat, box_lon = bbox_slices(bbox)
+        lat_idx = slice(max(stored_lat.start, box_lat.start), min(stored_lat.stop, box_lat.stop))
+        lon_idx = slice(max(stored_lon.start, box_lon.start), min(stored_lon.stop, box_lon.stop))
+        if lat_idx.start >= lat_idx.stop or lon_idx.start >= lon_idx.stop:
+            raise ValueError("The bounding box doesn't overlap the cells in the MERRA-2 store")
+
+    first_year, last_year = int(months[0][0][:4]), int(months[-1][0][:4])
+    size = table_bytes(lat_idx, lon_idx, last_year - first_year + 1)
+    if size > max_gb * 1e9:
+        raise ValueError(f"The table would take {size / 1e9:.1f} GB (limit {max_gb:g} GB); narrow it with --bbox or raise --max-gb")
+    table = ProbabilityTable.create(out_dir, lat_idx, lon_idx, first_year, last_year - first_year + 1)
+    lat_sel = slice(lat_idx.start - stored_lat.start, lat_idx.stop - stored_lat.start)
+    lon_sel = slice(lon_idx.start - stored_lon.start, lon_idx.stop - stored_lon.start)
+
+    for key, meta in months:
+        if meta["lat_idx"] != region["lat_idx"] or meta["lon_idx"] != region["lon_idx"]:
+            print(f"{key}: covers different cells, skipped")
+            continue
+        year, month = int(key[:4]), int(key[5:])
+        with xr.open_dataset(month_path(store_dir, year, month), engine="netcdf4") as dataset:
+            days = dataset["time"].dt.day.values
+            rows = day_of_year(month, days)
+            for v, name in enumerate(TABLE_VARIABLES):
+                # (time, lat, lon) -> (lat, lon, time) to match table[:, :, rows, year, v]
+                values = dataset[name].values[:, lat_sel, lon_sel]
+                table.data[:, :, rows, year - first_year, v] = np.moveaxis(values, 0, -1)
+        print(f"{key}: {len(days)} days")
+
+    table.save_meta()
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the per-day probability table from the MERRA-2 store.")
+    parser.add_argument("--store", default=MERRA2_STORE_DIR, help="MERRA-2 store directory (default: %(default)s)")
+    parser.add_argument("--out", default=PROBABILITY_TABLE_DIR, help="Table directory (default: %(default)s)")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+                        help="Only build the table for stored cells in this bounding box")
+    parser.add_argument("--max-gb", type=float, default=MAX_TABLE_GB, help="Refuse to build a larger table (default: %(default)s)")
+    args = parser.parse_args()
+
+    table = build(args.store, args.out, args.bbox, args.max_gb)
+    years = table.meta["years"]
+    print(f"Built '{args.out}': {table.data.shape[0]}x{table.data.shape[1]} cells, {years} years ({table.data.nbytes / 1e6:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
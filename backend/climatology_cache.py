@@ -0,0 +1,223 @@
+"""
+Caches for NASA POWER climatology responses.
+
+Climatology for a location never changes between requests, so each response is
+stored in a local SQLite file keyed by the POWER grid cell the point snaps to
+(see power_grid.py) and the requested parameter set. Nearby points in the same
+cell are then served without any network I/O.
+
+In front of the disk cache sits a bounded in-process LRU, and concurrent misses
+for the same key are coalesced into a single upstream fetch (SingleFlight).
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Awaitable, Callable
+
+# --- Configuration ---
+CLIMATOLOGY_CACHE_PATH = os.getenv("CLIMATOLOGY_CACHE_PATH", "data/climatology_cache.sqlite3")
+CLIMATOLOGY_CACHE_TTL_DAYS = float(os.getenv("CLIMATOLOGY_CACHE_TTL_DAYS", "30"))
+CLIMATOLOGY_LRU_MAX_ENTRIES = int(os.getenv("CLIMATOLOGY_LRU_MAX_ENTRIES", "2048"))
+CLIMATOLOGY_LRU_MAX_BYTES = int(os.getenv("CLIMATOLOGY_LRU_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Bump this whenever the shape of the cached payload changes; older rows are ignored.
+CACHE_VERSION = 1
+
+
+class ClimatologyCache:
+    """
+    A small SQLite-backed key/value store for climatology payloads, with a TTL,
+    a payload version and hit/miss counters.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS climatology (
+                cell TEXT NOT NULL,
+                params TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (cell, params)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, cell: str, params: str, allow_stale: bool = False) -> Optional[dict]:
+        """
+        Returns the cached payload, or None on a miss, stale row or old version.
+        With allow_stale, rows past their TTL are still returned (used as a fallback
+        when upstream is unavailable).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, fetched_at, payload FROM climatology WHERE cell = ? AND params = ?",
+                (cell, params),
+            ).fetchone()
+
+            if row is None or row[0] != CACHE_VERSION:
+                self.misses += 1
+                return None
+            if not allow_stale and self.ttl_seconds > 0 and time.time() - row[1] > self.ttl_seconds:
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+        return json.loads(row[2])
+
+    def put(self, cell: str, params: str, payload: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO climatology (cell, params, version, fetched_at, payload) VALUES (?, ?, ?, ?, ?)",
+                (cell, params, CACHE_VERSION, time.time(), json.dumps(payload)),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM climatology").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "version": CACHE_VERSION,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryLRU:
+    """
+    An in-process LRU capped both by entry count and by (approximate) bytes.
+    The caller supplies each entry's size when inserting it. Thread-safe, since
+    sync endpoints (e.g. map tiles) use it from FastAPI's thread pool.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size: int):
+        if size > self.max_bytes or self.max_entries <= 0:
+            return # Never let a single oversized entry flush the whole cache
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller starts the work
+    as a task and every caller (including later arrivals) awaits that one task.
+    The task is shielded, so one caller being cancelled doesn't cancel the rest.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def do(self, key, fn: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "coalesced": self.coalesced}
+
+
+memory_cache = MemoryLRU(CLIMATOLOGY_LRU_MAX_ENTRIES, CLIMATOLOGY_LRU_MAX_BYTES)
+fetch_flights = SingleFlight()
+
+_disk_cache: Optional[ClimatologyCache] = None
+
+
+def get_disk_cache() -> Optional[ClimatologyCache]:
+    """
+    Returns the process-wide cache, opening it on first use. Setting
+    CLIMATOLOGY_CACHE_PATH to an empty string disables on-disk caching.
+    """
+    global _disk_cache
+    if _disk_cache is None and CLIMATOLOGY_CACHE_PATH:
+        _disk_cache = ClimatologyCache(CLIMATOLOGY_CACHE_PATH, CLIMATOLOGY_CACHE_TTL_DAYS * 86400)
+    return _disk_cache
@@ -1,18 +1,77 @@
+"""
+Bulk downloader for MERRA-2 files (tavg1_2d_slv_Nx by default) from NASA GES DISC.
+
+Files are fetched by a bounded pool of workers (each request also takes a slot from
+the global upstream scheduler, see scheduler.py). Every download goes to a
+`.part` file first and is resumed with an HTTP Range request after an interruption,
+then checked (expected size, HDF5 signature and, when given, a SHA-256 checksum)
+before it is moved into place. Finished files are recorded in an on-disk manifest,
+so re-running the same command skips them and only fetches what is missing.
+
+Examples:
+    # Every day of a date range
+    python download_data.py --start 1980-01-01 --end 2023-12-31
+
+    # The same day of every year (what the validation scripts use)
+    python download_data.py --years 1980 2023 --month 8 --day 15
+
+    # Precipitation comes from the surface flux collection
+    python download_data.py --start 1980-01-01 --end 2023-12-31 --collection tavg1_2d_flx_Nx
+
+    # Against a local stub instead of GES DISC (see power_stub.py)
+    python download_data.py --start 2020-08-01 --end 2020-08-31 \\
+        --base-url http://127.0.0.1:8001/data/MERRA2/M2T1NXSLV.5.12.4/
+"""
 import os
+import json
+import time
+import random
 import asyncio
+import hashlib
+import argparse
 import httpx
+from datetime import date, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
 
+from scheduler import upstream_scheduler
+from resilience import is_retryable
+
 # --- Configuration ---
 load_dotenv()
-TARGET_MONTH = 8
-TARGET_DAY = 15
-START_YEAR = 1980
-END_YEAR = 2023
 OUTPUT_DIR = "data"
 NASA_TOKEN = os.getenv("NASA_TOKEN")
-BASE_DOWNLOAD_URL = "https://goldsmr4.gesdisc.eosdis.nasa.gov/data/MERRA2/M2T1NXSLV.5.12.4/"
+GES_DISC_DATA_URL = os.getenv("MERRA2_DATA_URL", "https://goldsmr4.gesdisc.eosdis.nasa.gov/data/MERRA2/")
+# File collections we use and their GES DISC product directories
+COLLECTIONS = {
+    "tavg1_2d_slv_Nx": "M2T1NXSLV.5.12.4", # single-level: temperature, wind, humidity
+    "tavg1_2d_flx_Nx": "M2T1NXFLX.5.12.4", # surface fluxes: precipitation
+}
+COLLECTION = "tavg1_2d_slv_Nx"
+BASE_DOWNLOAD_URL = f"{GES_DISC_DATA_URL}{COLLECTIONS[COLLECTION]}/"
+
+DEFAULT_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "6"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "60"))  # per read, not per file
+RETRY_ATTEMPTS = 5
+RETRY_MAX_DELAY = 30
+CHUNK_SIZE = 1024 * 1024   # read size when hashing files already on disk
+MANIFEST_FILE = "manifest.json"
+MANIFEST_SAVE_EVERY = 20   # completed files between manifest writes
+PROGRESS_INTERVAL = 5      # seconds between progress lines
+
+# netCDF-4 files are HDF5 containers; anything else (e.g. an HTML login page) is rejected
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+
+
+class DownloadError(Exception):
+    """A download that finished but failed verification."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# --- File Naming ---
 
 def get_merra_stream_id(year: int) -> int:
     """
@@ -30,53 +89,316 @@ def get_merra_stream_id(year: int) -> int:
     else:
         raise ValueError("Year is out of the valid MERRA-2 range.")
 
-async def download_file(client, year, month, day, output_path):
-    s_month, s_day = str(month).zfill(2), str(day).zfill(2)
-    stream_id = get_merra_stream_id(year) # <-- GET THE CORRECT STREAM ID
 
-    file_name = f"MERRA2_{stream_id}.tavg1_2d_slv_Nx.{year}{s_month}{s_day}.nc4"
-    file_url = f"{BASE_DOWNLOAD_URL}{year}/{s_month}/{file_name}"
-    
-    if output_path.exists():
-        print(f"✅ SKIPPED: '{output_path.name}' already exists.")
-        return
+def merra_file_name(day: date, collection: str = COLLECTION) -> str:
+    return f"MERRA2_{get_merra_stream_id(day.year)}.{collection}.{day:%Y%m%d}.nc4"
 
-    print(f"🔽 DOWNLOADING: '{file_name}'...")
-    try:
-        headers = {"Authorization": f"Bearer {NASA_TOKEN}"}
-        async with client.stream("GET", file_url, headers=headers, timeout=60.0) as response:
-            response.raise_for_status()
-            with open(output_path, "wb") as f:
-                async for chunk in response.aiter_bytes():
-                    f.write(chunk)
-            print(f"✅ SUCCESS: Saved '{output_path.name}'")
-    except httpx.HTTPStatusError as e:
-        print(f"❌ FAILED: HTTP error for {year}-{s_month}-{s_day}: {e}")
-    except Exception as e:
-        print(f"❌ FAILED: An unexpected error for {year}-{s_month}-{s_day}: {e}")
-
-async def main():
-    if not NASA_TOKEN:
-        print("❌ ERROR: NASA_TOKEN not found in .env file.")
-        return
-    
-    output_dir_path = Path(OUTPUT_DIR)
-    output_dir_path.mkdir(exist_ok=True)
-    
-    print("--- Starting MERRA-2 Data Download ---")
-    async with httpx.AsyncClient() as client:
-        for year in range(START_YEAR, END_YEAR + 1):
+
+def collection_url(collection: str) -> str:
+    return f"{GES_DISC_DATA_URL}{COLLECTIONS[collection]}/"
+
+
+def merra_file_url(base_url: str, day: date, collection: str = COLLECTION) -> str:
+    return f"{base_url.rstrip('/')}/{day:%Y}/{day:%m}/{merra_file_name(day, collection)}"
+
+
+def dates_in_range(start: date, end: date):
+    """Every date from start to end, inclusive."""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def same_day_each_year(start_year: int, end_year: int, month: int, day: int):
+    """One date per year; years where the date doesn't exist (29 Feb) are skipped."""
+    dates = []
+    for year in range(start_year, end_year + 1):
+        try:
+            dates.append(date(year, month, day))
+        except ValueError:
+            print(f"⚠️  WARNING: Skipping invalid date for year {year}.")
+    return dates
+
+
+def load_checksums(path: str) -> dict:
+    """Reads a `sha256sum`-style file ("<hex digest>  <file name>" per line)."""
+    checksums = {}
+    for line in Path(path).read_text().splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            checksums[Path(parts[1].lstrip("*")).name] = parts[0].lower()
+    return checksums
+
+
+# --- Manifest ---
+
+class Manifest:
+    """
+    JSON record of every completed file (size, SHA-256, URL), written atomically so
+    an interrupted run never leaves it half-written.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries = json.loads(path.read_text()) if path.exists() else {}
+        self._unsaved = 0
+
+    def is_complete(self, file_path: Path) -> bool:
+        entry = self.entries.get(file_path.name)
+        return entry is not None and file_path.exists() and file_path.stat().st_size == entry["size"]
+
+    def record(self, file_path: Path, size: int, sha256: str, url: str):
+        self.entries[file_path.name] = {"size": size, "sha256": sha256, "url": url, "completed_at": time.time()}
+        self._unsaved += 1
+        if self._unsaved >= MANIFEST_SAVE_EVERY:
+            self.save()
+
+    def forget(self, name: str):
+        self.entries.pop(name, None)
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+        tmp.replace(self.path)
+        self._unsaved = 0
+
+
+# --- Progress ---
+
+class Progress:
+    """Counters for a run, printed periodically while it is in progress."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.resumed = 0
+        self.retries = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._part_bytes = {} # file name -> bytes this run wrote to its .part file
+
+    def wrote(self, name: str, count: int):
+        self.bytes += count
+        self._part_bytes[name] = self._part_bytes.get(name, 0) + count
+
+    def discarded(self, name: str):
+        """A .part file was thrown away: what this run downloaded into it no longer counts."""
+        self.bytes -= self._part_bytes.pop(name, 0)
+
+    def finished(self, name: str):
+        self._part_bytes.pop(name, None)
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        finished = self.completed + self.skipped + self.failed
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - finished
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "resumed": self.resumed,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "elapsed_s": round(elapsed, 1),
+            "mb_per_s": round(self.bytes / elapsed / 1e6, 2) if elapsed > 0 else 0.0,
+            "eta_s": round(remaining / rate) if rate > 0 else None,
+        }
+
+    def line(self) -> str:
+        s = self.stats()
+        eta = f"{s['eta_s']}s" if s["eta_s"] is not None else "?"
+        return (f"[{s['completed'] + s['skipped'] + s['failed']}/{s['total']}] "
+                f"{s['completed']} downloaded, {s['skipped']} skipped, {s['failed']} failed, "
+                f"{s['bytes'] / 1e6:.1f} MB at {s['mb_per_s']} MB/s, ETA {eta}")
+
+
+# --- Downloading ---
+
+def _hash_existing(path: Path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(block)
+    return hasher
+
+
+async def download_file(client: httpx.AsyncClient, url: str, output_path: Path, progress: Progress, expected_sha256: str = None):
+    """
+    Downloads one file to `output_path`, resuming a leftover `.part` file with a
+    Range request. Returns (size, sha256) once the file is verified and in place.
+    """
+    part = output_path.with_name(output_path.name + ".part")
+    offset = part.stat().st_size if part.exists() else 0
+    hasher = _hash_existing(part) if offset else hashlib.sha256()
+
+    headers = {"Authorization": f"Bearer {NASA_TOKEN}"} if NASA_TOKEN else {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+
+    async with upstream_scheduler.slot(url):
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 416:
+                # Nothing left to send: the .part file is either complete or unusable
+                total = int(response.headers.get("content-range", "bytes */-1").rsplit("/", 1)[1])
+                if total != offset:
+                    part.unlink()
+                    progress.discarded(output_path.name)
+                    raise DownloadError(f"Partial file does not match the server copy of '{output_path.name}'")
+            else:
+                response.raise_for_status()
+                if offset and response.status_code == 206:
+                    progress.resumed += 1
+                    total = int(response.headers["content-range"].rsplit("/", 1)[1])
+                    mode = "ab"
+                else:
+                    # The server ignored the Range header: start over
+                    if offset:
+                        progress.discarded(output_path.name)
+                    offset = 0
+                    hasher = hashlib.sha256()
+                    total = int(response.headers.get("content-length", -1))
+                    mode = "wb"
+
+                # Written as it arrives (no re-chunking into larger reads), so an
+                # interrupted transfer keeps everything received for the next Range request
+                with open(part, mode) as f:
+                    async for chunk in response.aiter_bytes():
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        progress.wrote(output_path.name, len(chunk))
+
+    # --- Verify before moving into place ---
+    size = part.stat().st_size
+    if total >= 0 and size != total:
+        raise DownloadError(f"Incomplete download of '{output_path.name}' ({size} of {total} bytes)")
+    with open(part, "rb") as f:
+        if f.read(len(HDF5_SIGNATURE)) != HDF5_SIGNATURE:
+            part.unlink()
+            progress.discarded(output_path.name)
+            raise DownloadError(f"'{output_path.name}' is not a netCDF-4 file (check NASA_TOKEN)", retryable=False)
+    digest = hasher.hexdigest()
+    if expected_sha256 and digest != expected_sha256:
+        part.unlink()
+        progress.discarded(output_path.name)
+        raise DownloadError(f"Checksum mismatch for '{output_path.name}'")
+
+    part.replace(output_path)
+    progress.finished(output_path.name)
+    return size, digest
+
+
+async def download_with_retries(client, url: str, output_path: Path, progress: Progress, expected_sha256: str = None):
+    """download_file with jittered exponential backoff; each retry resumes the .part file."""
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return await download_file(client, url, output_path, progress, expected_sha256)
+        except Exception as e:
+            retryable = e.retryable if isinstance(e, DownloadError) else is_retryable(e)
+            if not retryable or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            progress.retries += 1
+            await asyncio.sleep(min(RETRY_MAX_DELAY, 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+async def download_all(dates, output_dir: Path, base_url: str = BASE_DOWNLOAD_URL, collection: str = COLLECTION,
+                       concurrency: int = DEFAULT_CONCURRENCY, checksums: dict = None, verify: bool = False) -> Progress:
+    """
+    Downloads the files for `dates` into `output_dir`, skipping those the manifest
+    already records. With `verify`, recorded files are re-hashed first and fetched
+    again if they no longer match. Returns the run's Progress.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(output_dir / MANIFEST_FILE)
+    checksums = checksums or {}
+    progress = Progress(len(dates))
+
+    todo = []
+    for day in dates:
+        output_path = output_dir / merra_file_name(day, collection)
+        if manifest.is_complete(output_path):
+            recorded = manifest.entries[output_path.name]["sha256"]
+            if not verify or _hash_existing(output_path).hexdigest() == recorded:
+                progress.skipped += 1
+                continue
+            output_path.unlink() # corrupted since it was recorded: fetch it again
+        manifest.forget(output_path.name)
+        part = output_path.with_name(output_path.name + ".part")
+        if output_path.exists() and not part.exists():
+            # Unrecorded (e.g. from an older run): treat it as partial and resume it
+            output_path.replace(part)
+        todo.append((merra_file_url(base_url, day, collection), output_path))
+    print(f"{len(todo)} files to download, {progress.skipped} already complete")
+
+    queue = iter(todo)
+
+    # A fixed pool of workers pulls from one iterator, as in ingest_grid.py
+    async def worker(client):
+        for url, output_path in queue:
             try:
-                stream_id = get_merra_stream_id(year)
-                file_name = f"MERRA2_{stream_id}.tavg1_2d_slv_Nx.{year}{str(TARGET_MONTH).zfill(2)}{str(TARGET_DAY).zfill(2)}.nc4"
-                output_file_path = output_dir_path / file_name
-                await download_file(client, year, TARGET_MONTH, TARGET_DAY, output_file_path)
-                await asyncio.sleep(1) # Be polite to the server
-            except ValueError:
-                print(f"⚠️  WARNING: Skipping invalid date for year {year}.")
+                size, digest = await download_with_retries(client, url, output_path, progress, checksums.get(output_path.name))
+            except Exception as e:
+                print(f"❌ FAILED: '{output_path.name}': {e}")
+                progress.failed += 1
                 continue
+            manifest.record(output_path, size, digest, url)
+            progress.completed += 1
+
+    async def report():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            print(progress.line())
+
+    reporter = asyncio.ensure_future(report())
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(DOWNLOAD_TIMEOUT, connect=30.0)
+    try:
+        async with httpx.AsyncClient(timeout=timeout, limits=limits, follow_redirects=True) as client:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+        manifest.save()
+
+    print(progress.line())
+    if progress.failed:
+        print(f"{progress.failed} files failed; re-run the same command to resume them")
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download MERRA-2 files in bulk, resumably.")
+    dates = parser.add_mutually_exclusive_group(required=True)
+    dates.add_argument("--start", type=date.fromisoformat, help="First date (YYYY-MM-DD); use with --end")
+    dates.add_argument("--years", nargs=2, type=int, metavar=("START_YEAR", "END_YEAR"),
+                       help="Download one day (--month/--day) from every year in this range")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last date, inclusive (default: --start)")
+    parser.add_argument("--month", type=int, default=8)
+    parser.add_argument("--day", type=int, default=15)
+    parser.add_argument("--out", default=OUTPUT_DIR, help="Output directory (default: %(default)s)")
+    parser.add_argument("--base-url", help="Collection URL (default: the collection's GES DISC directory)")
+    parser.add_argument("--collection", default=COLLECTION, choices=sorted(COLLECTIONS), help="File collection (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--checksums", help="sha256sum-style file of expected checksums")
+    parser.add_argument("--verify", action="store_true", help="Re-hash files already in the manifest")
+    args = parser.parse_args()
+
+    if args.start:
+        selected = dates_in_range(args.start, args.end or args.start)
+    else:
+        selected = same_day_each_year(args.years[0], args.years[1], args.month, args.day)
+    base_url = args.base_url or collection_url(args.collection)
+    if not NASA_TOKEN and not args.base_url:
+        print("⚠️  WARNING: NASA_TOKEN not found in .env file; GES DISC will reject the requests.")
+
+    print("--- Starting MERRA-2 Data Download ---")
+    progress = asyncio.run(download_all(
+        selected, Path(args.out), base_url, args.collection, args.concurrency,
+        load_checksums(args.checksums) if args.checksums else None, args.verify,
+    ))
     print("\n--- Download process complete. ---")
+    print(json.dumps(progress.stats()))
 
-if __name__ == "__main__":
-    asyncio.run(main())
 
+if __name__ == "__main__":
+    main()
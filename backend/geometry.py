@@ -0,0 +1,262 @@
+"""
+Vectorized polygon helpers for region analysis.
+
+Polygons are handled as lists of rings ([exterior, hole, hole, ...]), each ring an
+(K, 2) array of [lon, lat] vertices, so GeoJSON Polygons (with holes) and
+MultiPolygons share one code path. Point-in-polygon tests run on whole arrays of
+candidate points at once.
+"""
+import math
+import numpy as np
+
+from power_grid import LAT_STEP, LON_STEP, N_LAT, N_LON
+
+# --- Configuration ---
+MAX_POLYGON_SAMPLES = 2000
+MAX_GRID_SIDE = 512  # Candidate grid is at most MAX_GRID_SIDE x MAX_GRID_SIDE
+MAX_POLYGON_CELLS = 2000  # POWER grid cells a single polygon analysis may cover
+
+# Candidate points tested per chunk, to bound the (points x edges) work matrix
+_PIP_CHUNK = 4096
+
+
+def parse_polygons(payload: dict) -> list:
+    """
+    Extracts polygons from a GeoJSON Feature, FeatureCollection, Polygon or
+    MultiPolygon. Also accepts a bare {"coordinates": ...} ring list, as the frontend
+    used to send. Returns a list of polygons, each a list of (K, 2) ring arrays.
+    """
+    if payload.get("type") == "FeatureCollection":
+        polygons = []
+        for feature in payload.get("features", []):
+            polygons.extend(parse_polygons(feature))
+        return polygons
+
+    geometry = payload.get("geometry", payload) or {}
+    kind = geometry.get("type")
+    if kind is not None and kind not in ("Polygon", "MultiPolygon"):
+        raise ValueError(f"Unsupported geometry type '{kind}' (expected a Polygon or MultiPolygon)")
+    coords = geometry.get("coordinates", [])
+    if not coords:
+        raise ValueError("Invalid polygon payload")
+
+    try:
+        if kind == "MultiPolygon":
+            raw_polygons = coords
+        elif isinstance(coords[0][0], (int, float)):
+            raw_polygons = [[coords]] # A single bare ring
+        else:
+            raw_polygons = [coords]
+
+        polygons = []
+        for rings in raw_polygons:
+            arrays = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings if len(ring) >= 3]
+            if arrays:
+                polygons.append(arrays)
+    except (TypeError, IndexError, ValueError):
+        # Nested to the wrong depth, or vertices that aren't [lon, lat] numbers
+        raise ValueError("Invalid polygon payload")
+    if not polygons:
+        raise ValueError("Invalid polygon payload")
+    return polygons
+
+
+def _ring_contains(ring: np.ndarray, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    # Even-odd ray casting against every edge at once (points x edges)
+    xi, yi = ring[:, 0], ring[:, 1]
+    xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+    crosses = (yi > lats[:, None]) != (yj > lats[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at_lat = (xj - xi) * (lats[:, None] - yi) / (yj - yi) + xi
+    return np.logical_xor.reduce(crosses & (lons[:, None] < x_at_lat), axis=1)
+
+
+def points_in_polygons(lons, lats, polygons: list) -> np.ndarray:
+    """
+    Returns a boolean mask of which points fall inside any of the polygons
+    (inside the exterior ring and outside all of its holes).
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    inside = np.zeros(lons.shape, dtype=bool)
+
+    for start in range(0, lons.size, _PIP_CHUNK):
+        chunk = slice(start, start + _PIP_CHUNK)
+        for rings in polygons:
+            in_polygon = _ring_contains(rings[0], lons[chunk], lats[chunk])
+            for hole in rings[1:]:
+                in_polygon &= ~_ring_contains(hole, lons[chunk], lats[chunk])
+            inside[chunk] |= in_polygon
+    return inside
+
+
+def ring_area(ring: np.ndarray) -> float:
+    """Planar (shoelace) area of a ring in square degrees."""
+    x, y = ring[:, 0], ring[:, 1]
+    return abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1))) / 2
+
+
+def polygons_area(polygons: list) -> float:
+    return sum(ring_area(rings[0]) - sum(ring_area(h) for h in rings[1:]) for rings in polygons)
+
+
+def polygons_bounds(polygons: list):
+    """(min_lon, min_lat, max_lon, max_lat) over all exterior rings."""
+    exteriors = np.concatenate([rings[0] for rings in polygons])
+    return exteriors[:, 0].min(), exteriors[:, 1].min(), exteriors[:, 0].max(), exteriors[:, 1].max()
+
+
+def polygons_centroid(polygons: list):
+    """Vertex-average centroid as (lat, lon), used as a fallback sample."""
+    exteriors = np.concatenate([rings[0] for rings in polygons])
+    return float(exteriors[:, 1].mean()), float(exteriors[:, 0].mean())
+
+
+def sample_polygons(polygons: list, count: int) -> list:
+    """
+    Returns up to `count` (lat, lon) sample points spread evenly across the polygons.
+
+    A regular grid is laid over the bounding box, sized from the polygon/bbox area
+    ratio so that roughly `count` cell centres land inside, and refined until enough
+    do. When there are more inside points than needed, an evenly strided subset is
+    taken so the samples cover the whole region rather than its first rows.
+    """
+    count = max(1, min(MAX_POLYGON_SAMPLES, int(count)))
+    min_lon, min_lat, max_lon, max_lat = polygons_bounds(polygons)
+    width, height = max_lon - min_lon, max_lat - min_lat
+    if width <= 0 or height <= 0:
+        # degenerate polygon: fallback to centroid
+        return [polygons_centroid(polygons)]
+
+    fill_ratio = min(1.0, max(polygons_area(polygons) / (width * height), 1e-3))
+    side = min(MAX_GRID_SIDE, max(1, math.ceil(math.sqrt(count / fill_ratio))))
+
+    while True:
+        lon_step, lat_step = width / side, height / side
+        grid_lons, grid_lats = np.meshgrid(
+            min_lon + (np.arange(side) + 0.5) * lon_step,
+            min_lat + (np.arange(side) + 0.5) * lat_step,
+        )
+        grid_lons, grid_lats = grid_lons.ravel(), grid_lats.ravel()
+        inside = points_in_polygons(grid_lons, grid_lats, polygons)
+        if inside.sum() >= count or side >= MAX_GRID_SIDE:
+            break
+        # Grow gently so the surplus (and the stride below) stays small
+        side = min(MAX_GRID_SIDE, math.ceil(side * 1.25))
+
+    sample_lons, sample_lats = grid_lons[inside], grid_lats[inside]
+    if sample_lons.size == 0:
+        # e.g. a very thin polygon: fall back to the centroid
+        return [polygons_centroid(polygons)]
+
+    if sample_lons.size > count:
+        picks = np.unique(np.linspace(0, sample_lons.size - 1, count).round().astype(int))
+        sample_lons, sample_lats = sample_lons[picks], sample_lats[picks]
+    return list(zip(sample_lats.tolist(), sample_lons.tolist()))
+
+
+# --- POWER Grid Cell Coverage ---
+
+def _clip_ring_to_box(ring: np.ndarray, x0: float, y0: float, x1: float, y1: float) -> list:
+    """
+    Sutherland-Hodgman clip of a ring against an axis-aligned box. The result may
+    contain degenerate edges for concave rings, but its shoelace area is exact.
+    """
+    points = ring.tolist()
+    boundaries = (
+        (lambda p: p[0] >= x0, lambda p, q: (x0, p[1] + (q[1] - p[1]) * (x0 - p[0]) / (q[0] - p[0]))),
+        (lambda p: p[0] <= x1, lambda p, q: (x1, p[1] + (q[1] - p[1]) * (x1 - p[0]) / (q[0] - p[0]))),
+        (lambda p: p[1] >= y0, lambda p, q: (p[0] + (q[0] - p[0]) * (y0 - p[1]) / (q[1] - p[1]), y0)),
+        (lambda p: p[1] <= y1, lambda p, q: (p[0] + (q[0] - p[0]) * (y1 - p[1]) / (q[1] - p[1]), y1)),
+    )
+    for inside, intersect in boundaries:
+        if not points:
+            break
+        clipped = []
+        prev = points[-1]
+        for cur in points:
+            if inside(cur):
+                if not inside(prev):
+                    clipped.append(intersect(prev, cur))
+                clipped.append(cur)
+            elif inside(prev):
+                clipped.append(intersect(prev, cur))
+            prev = cur
+        points = clipped
+    return points
+
+
+def _clipped_area(polygons: list, x0: float, y0: float, x1: float, y1: float) -> float:
+    area = 0.0
+    for rings in polygons:
+        for k, ring in enumerate(rings):
+            clipped = _clip_ring_to_box(ring, x0, y0, x1, y1)
+            if len(clipped) >= 3:
+                ring_clip_area = ring_area(np.asarray(clipped))
+                area += ring_clip_area if k == 0 else -ring_clip_area # holes subtract
+    return area
+
+
+def polygon_cells(polygons: list) -> dict:
+    """
+    Enumerates the POWER grid cells that intersect the polygons, with the fraction of
+    each cell the polygons cover. Cells crossed by a polygon edge are clipped exactly;
+    all other candidate cells are either fully inside or fully outside, which one
+    vectorized centre test decides. Returns a dict of arrays: lat_idx, lon_idx,
+    lat, lon (cell centres), coverage (0-1) and weight (covered area, proportional
+    to km^2, normalised to sum to 1).
+    """
+    min_lon, min_lat, max_lon, max_lat = polygons_bounds(polygons)
+    # Longitude indices stay unwrapped here and are wrapped at the end
+    lat0, lat1 = round((min_lat + 90) / LAT_STEP), round((max_lat + 90) / LAT_STEP)
+    lon0, lon1 = round((min_lon + 180) / LON_STEP), round((max_lon + 180) / LON_STEP)
+    n_lat, n_lon = lat1 - lat0 + 1, lon1 - lon0 + 1
+    if n_lat * n_lon > MAX_POLYGON_CELLS * 4:
+        raise ValueError(f"Polygon is too large for cell mode (max {MAX_POLYGON_CELLS} POWER grid cells)")
+
+    # --- 1. Mark every cell touched by the bounding box of some polygon edge ---
+    boundary = np.zeros((n_lat, n_lon), dtype=bool)
+    for rings in polygons:
+        for ring in rings:
+            a, b = ring, np.roll(ring, 1, axis=0)
+            lat_lo = np.rint((np.minimum(a[:, 1], b[:, 1]) + 90) / LAT_STEP).astype(int) - lat0
+            lat_hi = np.rint((np.maximum(a[:, 1], b[:, 1]) + 90) / LAT_STEP).astype(int) - lat0
+            lon_lo = np.rint((np.minimum(a[:, 0], b[:, 0]) + 180) / LON_STEP).astype(int) - lon0
+            lon_hi = np.rint((np.maximum(a[:, 0], b[:, 0]) + 180) / LON_STEP).astype(int) - lon0
+            for i0, i1, j0, j1 in zip(lat_lo, lat_hi, lon_lo, lon_hi):
+                boundary[i0:i1 + 1, j0:j1 + 1] = True
+
+    lat_idx, lon_idx = np.meshgrid(np.arange(lat0, lat1 + 1), np.arange(lon0, lon1 + 1), indexing="ij")
+    center_lat = -90.0 + lat_idx * LAT_STEP
+    center_lon = -180.0 + lon_idx * LON_STEP
+
+    # --- 2. Interior cells: fully in or fully out ---
+    coverage = np.zeros((n_lat, n_lon), dtype=np.float64)
+    interior = ~boundary
+    coverage[interior] = points_in_polygons(center_lon[interior], center_lat[interior], polygons)
+
+    # --- 3. Boundary cells: exact clipped area ---
+    cell_area = LAT_STEP * LON_STEP
+    for i, j in np.argwhere(boundary):
+        x, y = center_lon[i, j], center_lat[i, j]
+        coverage[i, j] = _clipped_area(
+            polygons, x - LON_STEP / 2, y - LAT_STEP / 2, x + LON_STEP / 2, y + LAT_STEP / 2
+        ) / cell_area
+
+    keep = coverage > 1e-9
+    if np.count_nonzero(keep) > MAX_POLYGON_CELLS:
+        raise ValueError(f"Polygon is too large for cell mode (max {MAX_POLYGON_CELLS} POWER grid cells)")
+
+    coverage = np.minimum(coverage[keep], 1.0) # overlapping MultiPolygon parts can exceed 1
+    lats, lons = center_lat[keep], center_lon[keep]
+    # Cell area on the sphere shrinks with cos(latitude)
+    weight = coverage * np.cos(np.radians(lats))
+    weight = weight / weight.sum() if weight.sum() > 0 else np.full(weight.shape, 1 / max(weight.size, 1))
+    return {
+        "lat_idx": np.clip(lat_idx[keep], 0, N_LAT - 1),
+        "lon_idx": lon_idx[keep] % N_LON,
+        "lat": lats,
+        "lon": (lons + 180.0) % 360.0 - 180.0,
+        "coverage": coverage,
+        "weight": weight,
+    }
@@ -0,0 +1,147 @@
+"""
+Precomputed global climatology grid store.
+
+The store is a directory holding one float32 array laid out as
+lat x lon x month x parameter on the POWER native grid (see power_grid.py),
+plus a small meta.json. Cells that were never ingested are NaN. Once a store
+has been built with ingest_grid.py the service answers any covered point by
+index lookup, with no network round trip.
+
+The service memory-maps the array read-only instead of loading it, so opening is
+instant, a point lookup only pages in the ~0.5 KB block of its cell, and every
+uvicorn worker shares the same pages through the OS page cache rather than
+holding its own copy on the heap.
+"""
+import os
+import json
+import time
+import numpy as np
+from pathlib import Path
+from typing import Optional
+
+from power_grid import LAT_STEP, LON_STEP, N_LAT, N_LON, snap_to_cell
+from scoring import PARAMETERS, CLIMATOLOGY_DTYPE
+
+# --- Configuration ---
+CLIMATOLOGY_GRID_DIR = os.getenv("CLIMATOLOGY_GRID_DIR", "data/climatology_grid")
+# Set to false to load the whole array onto the heap instead (e.g. on network filesystems)
+CLIMATOLOGY_GRID_MMAP = os.getenv("CLIMATOLOGY_GRID_MMAP", "true").lower() in ("1", "true", "yes")
+
+# Bump this whenever the on-disk layout changes
+STORE_VERSION = 1
+DATA_FILE = "climatology.npy"
+META_FILE = "meta.json"
+
+
+class GridStore:
+    """
+    Read/write access to a lat x lon x month x parameter climatology array.
+    """
+
+    def __init__(self, directory: str, data: np.ndarray, meta: dict):
+        self.directory = directory
+        self.data = data
+        self.meta = meta
+        self.parameters = tuple(meta["parameters"])
+
+    @classmethod
+    def open(cls, directory: str, writable: bool = False) -> "GridStore":
+        path = Path(directory)
+        meta = json.loads((path / META_FILE).read_text())
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Grid store version {meta.get('version')} is not supported (expected {STORE_VERSION})")
+        # Ingest updates the file in place; the service maps it read-only
+        if writable:
+            mmap_mode = "r+"
+        else:
+            mmap_mode = "r" if CLIMATOLOGY_GRID_MMAP else None
+        data = np.load(path / DATA_FILE, mmap_mode=mmap_mode)
+        return cls(directory, data, meta)
+
+    @classmethod
+    def create(cls, directory: str, parameters=PARAMETERS) -> "GridStore":
+        """
+        Creates an empty (all-NaN) store on disk and returns it opened for writing.
+        The array is written through a memory map, so the full grid never has to
+        fit in RAM during ingest.
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        # Build the new file beside the old one and swap it in, rather than truncating
+        # a file that running services may have mapped (they keep the old copy)
+        tmp = path / (DATA_FILE + ".tmp")
+        data = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(N_LAT, N_LON, 12, len(parameters)))
+        data[:] = np.nan
+        data.flush()
+        os.replace(tmp, path / DATA_FILE)
+        meta = {
+            "version": STORE_VERSION,
+            "parameters": list(parameters),
+            "lat_step": LAT_STEP,
+            "lon_step": LON_STEP,
+            "shape": list(data.shape),
+            "created": time.time(),
+            "cells_filled": 0,
+        }
+        store = cls(directory, data, meta)
+        store.save_meta()
+        return store
+
+    def save_meta(self):
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+        self.meta["cells_filled"] = int(np.count_nonzero(~np.isnan(self.data[:, :, 0, 0])))
+        Path(self.directory, META_FILE).write_text(json.dumps(self.meta, indent=2))
+
+    # --- Writing ---
+
+    def put(self, lat_idx: int, lon_idx: int, climatology: np.ndarray):
+        """Stores a (12,) structured climatology array for one cell."""
+        self.data[lat_idx, lon_idx] = self._to_block(climatology)
+
+    def _to_block(self, climatology: np.ndarray) -> np.ndarray:
+        block = np.full((12, len(self.parameters)), np.nan, dtype=np.float32)
+        for j, name in enumerate(self.parameters):
+            if name in climatology.dtype.names:
+                block[:, j] = climatology[name]
+        return block
+
+    # --- Reading ---
+
+    def lookup_cells(self, lat_idx, lon_idx) -> np.ndarray:
+        """
+        Returns an (N, 12) structured climatology array for arrays of cell indices.
+        Cells that were never ingested come back as all-NaN rows. Only the requested
+        cells' blocks are read (and copied) from the mapped file.
+        """
+        blocks = self.data[np.asarray(lat_idx), np.asarray(lon_idx)]
+        climatology = np.full(blocks.shape[:-1], np.nan, dtype=CLIMATOLOGY_DTYPE)
+        for j, name in enumerate(self.parameters):
+            if name in CLIMATOLOGY_DTYPE.names:
+                climatology[name] = blocks[..., j]
+        return climatology
+
+    def lookup(self, lat: float, lon: float) -> Optional[np.ndarray]:
+        """Returns the (12,) climatology of the cell containing a point, or None if it isn't covered."""
+        lat_idx, lon_idx = snap_to_cell(lat, lon)
+        climatology = self.lookup_cells([lat_idx], [lon_idx])[0]
+        if np.isnan(climatology["T2M"]).all():
+            return None
+        return climatology
+
+
+_grid_store: Optional[GridStore] = None
+_grid_store_checked = False
+
+
+def get_grid_store() -> Optional[GridStore]:
+    """
+    Returns the process-wide grid store, opening it on first use, or None when no
+    store has been built at CLIMATOLOGY_GRID_DIR.
+    """
+    global _grid_store, _grid_store_checked
+    if not _grid_store_checked:
+        _grid_store_checked = True
+        if CLIMATOLOGY_GRID_DIR and Path(CLIMATOLOGY_GRID_DIR, META_FILE).exists():
+            _grid_store = GridStore.open(CLIMATOLOGY_GRID_DIR)
+    return _grid_store
@@ -0,0 +1,129 @@
+"""
+Region heatmaps: "where in this box matches my profile".
+
+Every POWER grid cell inside a bounding box is read from the offline grid store
+(see grid_store.py), interpolated to the requested date and scored in one
+vectorized pass. The result is a small uint8 raster (one pixel per grid cell,
+north-up) that is returned either as base64 JSON or as a PNG overlay.
+"""
+import os
+import base64
+import struct
+import zlib
+import numpy as np
+
+from power_grid import LAT_STEP, LON_STEP, N_LON, snap_to_cell, cell_center
+from scoring import conditions_for_day, score_conditions, day_of_year
+from probability_table import empirical_probabilities
+
+# --- Configuration ---
+MAX_HEATMAP_CELLS = int(os.getenv("MAX_HEATMAP_CELLS", "50000"))
+NODATA = 255 # raster value for cells the grid store doesn't cover
+
+
+def bbox_cells(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    """
+    Returns (lat_idx, lon_idx) index arrays for the grid cells covering a bounding
+    box, latitudes north to south and longitudes west to east. A box with
+    min_lon > max_lon crosses the antimeridian.
+    """
+    if min_lat > max_lat:
+        raise ValueError("Bounding box min_lat must not exceed max_lat")
+    south, west = snap_to_cell(min_lat, min_lon)
+    north, _ = snap_to_cell(max_lat, max_lon)
+    lon_span = max_lon - min_lon
+    if lon_span < 0:
+        lon_span += 360
+    lat_idx = np.arange(north, south - 1, -1)
+    lon_idx = (west + np.arange(min(int(round(lon_span / LON_STEP)) + 1, N_LON))) % N_LON
+    if len(lat_idx) * len(lon_idx) > MAX_HEATMAP_CELLS:
+        raise ValueError(f"Bounding box is too large for a heatmap (max {MAX_HEATMAP_CELLS} POWER grid cells)")
+    return lat_idx, lon_idx
+
+
+def score_region(store, bbox, month: int, day: int, profile, weights) -> dict:
+    """
+    Scores every grid cell in `bbox` (min_lon, min_lat, max_lon, max_lat) for a date.
+    Returns the (H, W) uint8 `scores` (0-100, NODATA where uncovered) and
+    `meets_profile` (0/1, NODATA where uncovered) rasters plus their geographic bounds.
+    """
+    lat_idx, lon_idx = bbox_cells(*bbox)
+    climatology = store.lookup_cells(lat_idx[:, None], lon_idx[None, :]) # (H, W, 12)
+    shape = climatology.shape[:2]
+
+    conditions = conditions_for_day(climatology.reshape(-1, 12), month, day)
+    probabilities = empirical_probabilities(lat_idx[:, None], lon_idx[None, :], day_of_year(month, day), profile)
+    scored = score_conditions(conditions, profile, weights, probabilities)
+    valid = scored["valid"]
+
+    scores = np.full(valid.shape, NODATA, dtype=np.uint8)
+    scores[valid] = np.clip(scored["overall_score"][valid], 0, 100).astype(np.uint8)
+    meets = np.full(valid.shape, NODATA, dtype=np.uint8)
+    meets[valid] = scored["all_in_comfort"][valid]
+
+    north, west = cell_center(lat_idx[0], lon_idx[0])
+    south, _ = cell_center(lat_idx[-1], lon_idx[-1])
+    east = west + (len(lon_idx) - 1) * LON_STEP
+    return {
+        "scores": scores.reshape(shape),
+        "meets_profile": meets.reshape(shape),
+        "bounds": {
+            "west": west - LON_STEP / 2,
+            "south": max(south - LAT_STEP / 2, -90.0),
+            "east": east + LON_STEP / 2,
+            "north": min(north + LAT_STEP / 2, 90.0),
+        },
+    }
+
+
+def raster_json(region: dict) -> dict:
+    """Compact JSON form of a score_region result: row-major uint8 rasters as base64."""
+    scores, meets = region["scores"], region["meets_profile"]
+    covered = scores != NODATA
+    return {
+        "bounds": region["bounds"],
+        "shape": list(scores.shape), # [rows (north to south), cols (west to east)]
+        "lat_step": LAT_STEP,
+        "lon_step": LON_STEP,
+        "nodata": NODATA,
+        "encoding": "base64-uint8",
+        "scores": base64.b64encode(scores.tobytes()).decode("ascii"),
+        "meets_profile": base64.b64encode(meets.tobytes()).decode("ascii"),
+        "cells": int(scores.size),
+        "covered_cells": int(covered.sum()),
+        "matching_cells": int((meets == 1).sum()),
+    }
+
+
+# --- PNG Rendering ---
+
+def score_colors(scores: np.ndarray) -> np.ndarray:
+    """
+    Maps a uint8 score raster to RGBA: red (0) through yellow (50) to green (100),
+    semi-transparent so the basemap shows through, and fully transparent for NODATA.
+    """
+    t = np.clip(scores.astype(np.float64), 0, 100) / 100
+    rgba = np.empty(scores.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = np.rint(255 * np.minimum(1, 2 * (1 - t)))
+    rgba[..., 1] = np.rint(255 * np.minimum(1, 2 * t))
+    rgba[..., 2] = 0
+    rgba[..., 3] = np.where(scores == NODATA, 0, 170)
+    return rgba
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Encodes an (H, W, 4) uint8 array as an RGBA PNG, using only zlib."""
+    height, width = rgba.shape[:2]
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    # Each scanline is prefixed with filter type 0 (none)
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)])
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
@@ -0,0 +1,119 @@
+"""
+Offline ingest for the climatology grid store (see grid_store.py).
+
+Examples:
+    # Import saved POWER climatology point responses (one JSON file per point)
+    python ingest_grid.py --from-dir fixtures/power_climatology
+
+    # Pull every POWER grid cell inside a bounding box (min_lon min_lat max_lon max_lat)
+    python ingest_grid.py --bbox 68 6 98 36
+
+    # The whole globe is ~208k cells, so expect this to run for a long time
+    python ingest_grid.py --bbox -180 -90 180 90
+"""
+import json
+import math
+import asyncio
+import argparse
+import numpy as np
+from pathlib import Path
+
+from power_grid import LAT_STEP, LON_STEP, N_LAT, N_LON, snap_to_cell, cell_center
+from grid_store import GridStore, CLIMATOLOGY_GRID_DIR, DATA_FILE
+from scoring import PARAMETERS, climatology_from_power
+from nasa_service import create_http_client, fetch_climatology
+
+# --- Configuration ---
+DEFAULT_CONCURRENCY = 8
+SAVE_EVERY = 500 # Flush progress to disk every N cells so an interrupted run can resume
+
+
+def open_store(directory: str, fresh: bool) -> GridStore:
+    if not fresh and Path(directory, DATA_FILE).exists():
+        return GridStore.open(directory, writable=True)
+    return GridStore.create(directory, PARAMETERS)
+
+
+def import_from_dir(store: GridStore, source_dir: str) -> int:
+    """
+    Imports POWER climatology point responses saved as JSON. The point's location is
+    read from the GeoJSON geometry ([lon, lat, elevation]).
+    """
+    imported = 0
+    for path in sorted(Path(source_dir).glob("*.json")):
+        data = json.loads(path.read_text())
+        lon, lat = data["geometry"]["coordinates"][:2]
+        climatology = climatology_from_power(data.get("properties", {}).get("parameter", {}))
+        store.put(*snap_to_cell(lat, lon), climatology)
+        imported += 1
+    return imported
+
+
+def cells_in_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    """Yields (lat_idx, lon_idx) for every grid cell centre inside the bounding box."""
+    lat_start = max(math.ceil((min_lat + 90) / LAT_STEP), 0)
+    lat_stop = min(math.floor((max_lat + 90) / LAT_STEP), N_LAT - 1)
+    lon_start = math.ceil((min_lon + 180) / LON_STEP)
+    lon_stop = min(math.floor((max_lon + 180) / LON_STEP), lon_start + N_LON - 1)
+    for lat_idx in range(lat_start, lat_stop + 1):
+        for lon_idx in range(lon_start, lon_stop + 1):
+            yield lat_idx, lon_idx % N_LON
+
+
+async def fetch_bbox(store: GridStore, bbox, concurrency: int) -> int:
+    """Fetches every not-yet-ingested cell in the bbox from the POWER API."""
+    todo = [cell for cell in cells_in_bbox(*bbox) if np.isnan(store.data[cell[0], cell[1], 0, 0])]
+    print(f"{len(todo)} cells to fetch")
+
+    queue = iter(todo)
+    done = 0
+    failed = 0
+
+    # A fixed pool of workers pulls from one iterator, so a global run doesn't
+    # create hundreds of thousands of pending coroutines up front
+    async def worker(client):
+        nonlocal done, failed
+        for lat_idx, lon_idx in queue:
+            lat, lon = cell_center(lat_idx, lon_idx)
+            try:
+                data = await fetch_climatology(lat, lon, client)
+            except Exception as e:
+                print(f"Failed to fetch cell ({lat}, {lon}): {e}")
+                failed += 1
+                continue
+            store.put(lat_idx, lon_idx, climatology_from_power(data.get("properties", {}).get("parameter", {})))
+            done += 1
+            if done % SAVE_EVERY == 0:
+                store.save_meta()
+                print(f"{done}/{len(todo)} cells ingested")
+
+    async with create_http_client() as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    if failed:
+        print(f"{failed} cells failed; re-run the same command to retry them")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline POWER climatology grid store.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-dir", help="Directory of saved POWER climatology JSON responses to import")
+    source.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+                        help="Fetch every grid cell in this bounding box from the POWER API")
+    parser.add_argument("--out", default=CLIMATOLOGY_GRID_DIR, help="Store directory (default: %(default)s)")
+    parser.add_argument("--fresh", action="store_true", help="Start a new store instead of updating the existing one")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    store = open_store(args.out, args.fresh)
+    if args.from_dir:
+        count = import_from_dir(store, args.from_dir)
+    else:
+        count = asyncio.run(fetch_bbox(store, args.bbox, args.concurrency))
+    store.save_meta()
+    print(f"Ingested {count} cells into '{args.out}' ({store.meta['cells_filled']} cells filled in total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Ingest downloaded MERRA-2 hourly files into the local daily store (see merra2_store.py).
+
+Files are processed one month at a time: every day of the month (its single-level
+file plus, when downloaded, its surface flux file for precipitation) is reduced to
+daily summaries in a separate process (across all cores), then the month is
+written as one compressed, chunked netCDF-4 file. Each file is opened lazily
+through xarray (dask-chunked along time when dask is installed) and only the
+variables and cells we use are ever read. Days already in the store are skipped,
+so re-running after more downloads only processes the new days. A month stored for
+a different --bbox is only replaced with --force.
+
+Examples:
+    # Everything download_data.py saved under data/
+    python ingest_merra2.py
+
+    # Only August 2020, only India, on 4 cores
+    python ingest_merra2.py --start 2020-08-01 --end 2020-08-31 --bbox 68 6 98 36 --workers 4
+"""
+import os
+import re
+import math
+import time
+import argparse
+import importlib.util
+import numpy as np
+import xarray as xr
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+
+from power_grid import LAT_STEP, LON_STEP, N_LAT, N_LON
+from download_data import OUTPUT_DIR, COLLECTION, COLLECTIONS
+from merra2_store import MERRA2Store, MERRA2_STORE_DIR, SOURCE_VARIABLES, DAILY_VARIABLES, daily_summary, month_path
+
+# --- Configuration ---
+HOURS_PER_CHUNK = 6 # dask chunk length along time when reading an hourly file
+FILE_PATTERN = re.compile(r"MERRA2_\d+\.(?P<collection>[\w]+)\.(?P<day>\d{8})\.nc4$")
+HAS_DASK = importlib.util.find_spec("dask") is not None
+FLUX_COLLECTION = "tavg1_2d_flx_Nx"
+
+
+def find_files(input_dir: str, start: str = None, end: str = None) -> dict:
+    """
+    Maps YYYYMMDD -> {collection: path} for every completed MERRA-2 file in
+    input_dir (partial .part downloads are ignored), limited to [start, end]. Days
+    without a single-level (COLLECTION) file are left out.
+    """
+    files = defaultdict(dict)
+    for path in Path(input_dir).rglob("MERRA2_*.nc4"):
+        match = FILE_PATTERN.match(path.name)
+        if not match or match["collection"] not in COLLECTIONS:
+            continue
+        day = match["day"]
+        if (start and day < start) or (end and day > end):
+            continue
+        files[day][match["collection"]] = str(path)
+    return {day: paths for day, paths in files.items() if COLLECTION in paths}
+
+
+def bbox_slices(bbox):
+    """(lat, lon) index slices of the grid cells inside a bounding box; None means the whole grid."""
+    if bbox is None:
+        return slice(0, N_LAT), slice(0, N_LON)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("Bounding box must be MIN_LON MIN_LAT MAX_LON MAX_LAT with min <= max")
+    lat = slice(max(math.floor((min_lat + 90) / LAT_STEP), 0), min(math.ceil((max_lat + 90) / LAT_STEP), N_LAT - 1) + 1)
+    lon = slice(max(math.floor((min_lon + 180) / LON_STEP), 0), min(math.ceil((max_lon + 180) / LON_STEP), N_LON - 1) + 1)
+    return lat, lon
+
+
+def _open_subset(stack: ExitStack, path: str, collection: str, lat_idx: slice, lon_idx: slice) -> xr.Dataset:
+    chunks = {"time": HOURS_PER_CHUNK} if HAS_DASK else None
+    dataset = stack.enter_context(xr.open_dataset(path, engine="netcdf4", chunks=chunks))
+    return dataset[list(SOURCE_VARIABLES[collection])].isel(lat=lat_idx, lon=lon_idx)
+
+
+def summarize_day(day: str, paths: dict, lat_idx: slice, lon_idx: slice):
+    """
+    Runs in a worker process: reads one day's hourly files (only SOURCE_VARIABLES,
+    only the requested cells) and returns (day, daily_summary dict).
+    """
+    with ExitStack() as stack:
+        hourly = _open_subset(stack, paths[COLLECTION], COLLECTION, lat_idx, lon_idx)
+        fluxes = None
+        if FLUX_COLLECTION in paths:
+            fluxes = _open_subset(stack, paths[FLUX_COLLECTION], FLUX_COLLECTION, lat_idx, lon_idx)
+        if HAS_DASK:
+            import dask
+            # Parallelism comes from the process pool; keep each worker single-threaded
+            stack.enter_context(dask.config.set(scheduler="synchronous"))
+        return day, daily_summary(hourly, fluxes)
+
+
+def load_existing_month(store: MERRA2Store, year: int, month: int, keep_days: set) -> dict:
+    """Reads back the stored days of a month that aren't being re-ingested, as {day: fields}."""
+    path = month_path(store.directory, year, month)
+    if not keep_days or not path.exists():
+        return {}
+    existing = {}
+    with xr.open_dataset(path, engine="netcdf4") as dataset:
+        for i, t in enumerate(dataset["time"].values):
+            day = np.datetime_as_string(t, unit="D").replace("-", "")
+            if day in keep_days:
+                existing[day] = {name: dataset[name].values[i] for name in DAILY_VARIABLES}
+    return existing
+
+
+def _stored_cells(store: MERRA2Store, year: int, month: int):
+    # ([lat start, stop], [lon start, stop]) of a stored month file, or None
+    meta = store.meta["months"].get(f"{year:04d}-{month:02d}")
+    return (meta["lat_idx"], meta["lon_idx"]) if meta is not None else None
+
+
+def ingest(input_dir: str, out_dir: str, bbox=None, workers: int = None, start: str = None, end: str = None, force: bool = False) -> int:
+    """Ingests every new day found in input_dir. Returns the number of days processed."""
+    store = MERRA2Store.open(out_dir, create=True)
+    lat_idx, lon_idx = bbox_slices(bbox)
+    files = find_files(input_dir, start=start, end=end)
+
+    months = defaultdict(list)
+    for day in sorted(files):
+        months[(int(day[:4]), int(day[4:6]))].append(day)
+
+    # A month file covers one set of cells: writing other cells replaces the whole
+    # month, dropping stored days that aren't being re-ingested
+    cells = [lat_idx.start, lat_idx.stop], [lon_idx.start, lon_idx.stop]
+    mismatched = [f"{year:04d}-{month:02d}" for year, month in months
+                  if _stored_cells(store, year, month) not in (None, cells)]
+    if mismatched and not force:
+        raise ValueError(f"{len(mismatched)} months ({mismatched[0]} first) are stored for a different bounding box; "
+                         "re-run with the same --bbox, or with --force to replace them")
+
+    processed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for (year, month), days in months.items():
+            stored = store.days(year, month)
+            with_precip = store.days(year, month, "precip_days")
+            same_cells = _stored_cells(store, year, month) == cells
+            if force or not same_cells:
+                new_days = days
+            else:
+                # New days, and stored days whose flux file has arrived since
+                new_days = [d for d in days if d not in stored or (FLUX_COLLECTION in files[d] and d not in with_precip)]
+            if not new_days:
+                continue
+
+            started = time.monotonic()
+            fields = load_existing_month(store, year, month, stored - set(new_days) if same_cells and not force else set())
+            n = len(new_days)
+            for day, summary in executor.map(summarize_day, new_days, [files[d] for d in new_days], [lat_idx] * n, [lon_idx] * n):
+                fields[day] = summary
+
+            ordered = sorted(fields)
+            store.write_month(year, month, ordered, [fields[d] for d in ordered], lat_idx, lon_idx)
+            store.save_meta()
+            processed += len(new_days)
+            size_mb = store.meta["months"][f"{year:04d}-{month:02d}"]["bytes"] / 1e6
+            print(f"{year:04d}-{month:02d}: {len(new_days)} new days ({len(ordered)} total), "
+                  f"{size_mb:.1f} MB, {time.monotonic() - started:.1f}s")
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest MERRA-2 hourly files into the local daily store.")
+    parser.add_argument("--input", default=OUTPUT_DIR, help="Directory of downloaded .nc4 files (default: %(default)s)")
+    parser.add_argument("--out", default=MERRA2_STORE_DIR, help="Store directory (default: %(default)s)")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+                        help="Only keep grid cells in this bounding box (default: the whole globe)")
+    parser.add_argument("--start", help="First day to ingest (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last day to ingest (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Re-ingest days that are already stored, and replace months stored for a different --bbox")
+    args = parser.parse_args()
+
+    start = args.start.replace("-", "") if args.start else None
+    end = args.end.replace("-", "") if args.end else None
+    count = ingest(args.input, args.out, args.bbox, args.workers, start, end, args.force)
+    print(f"Ingested {count} days into '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,31 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict
-import asyncio
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List, Literal
+from contextlib import asynccontextmanager
+import json
+import httpx
 
 # Import the function from your service file
 from nasa_service import get_climatological_analysis
 from nasa_service import get_profile_from_climatology
+from nasa_service import get_batch_analysis, stream_batch_analysis
+from nasa_service import get_calendar_ranking
+from nasa_service import create_http_client
+from geometry import parse_polygons, sample_polygons, polygon_cells
+from aggregation import aggregate_results, RunningAggregate
+from heatmap import score_region, raster_json, score_colors, encode_png
+from grid_store import get_grid_store
+from probability_table import get_probability_table
+from tiles import get_tile, tile_cache, LAYERS, SCORE_LAYER, MAX_TILE_ZOOM, TILE_MAX_AGE
+from scheduler import upstream_scheduler
+from resilience import power_resilience
+from climatology_cache import get_disk_cache, memory_cache, fetch_flights
+from metrics import registry, stage, from_stats, Gauge, CONTENT_TYPE
+from metrics import polygon_samples
+from metrics import current_trace
+from telemetry import setup_tracing, shutdown_tracing
+from middleware import RequestMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 # --- 1. Define the Upgraded Data Models (The API Contract) ---
@@ -27,25 +47,78 @@ class ScoreWeights(BaseModel):
 
 # The main request body, now including weights
 class AnalysisRequest(BaseModel):
-    lat: float
-    lon: float
-    month: int
-    day: int
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31) # clamped to the month's length
     profile: ComfortProfile
     weights: ScoreWeights = ScoreWeights() # Use default weights if not provided
 
 
 class PolygonAnalysisRequest(BaseModel):
     polygon: Dict
-    month: int
-    day: int
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31)
     profile: ComfortProfile
     weights: ScoreWeights = ScoreWeights()
-    # approximate number of sample points to use across the polygon (max 36)
+    # approximate number of sample points to use across the polygon (max MAX_POLYGON_SAMPLES)
     sample_count: int = 9
+    # "samples": evenly spaced sample points; "cells": every intersecting POWER grid
+    # cell once, aggregated by covered area (sample_count is ignored)
+    mode: Literal["samples", "cells"] = "samples"
+
+
+MAX_BATCH_ITEMS = 5000
+
+class BatchPoint(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31)
+
+
+# Many points sharing one profile and weights, validated as a single request
+class BatchAnalysisRequest(BaseModel):
+    items: List[BatchPoint] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+    profile: ComfortProfile
+    weights: ScoreWeights = ScoreWeights()
+
+# A location and profile to rank the whole year for
+class CalendarRequest(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    profile: ComfortProfile
+    weights: ScoreWeights = ScoreWeights()
+    top: int = Field(5, ge=1, le=31) # how many of the best entries to list
+    resolution: Literal["month", "day"] = "month" # rank the 12 months or all 366 days
+
+# A region, date and profile to score every grid cell for
+class HeatmapRequest(BaseModel):
+    bbox: List[float] = Field(min_length=4, max_length=4) # [min_lon, min_lat, max_lon, max_lat]
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31)
+    profile: ComfortProfile
+    weights: ScoreWeights = ScoreWeights()
+    format: Literal["json", "png"] = "json"
 
 # --- 2. Create the FastAPI App Instance ---
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_tracing() # optional OpenTelemetry export, see telemetry.py
+    # One pooled NASA POWER client for the whole app lifetime, closed on shutdown
+    async with create_http_client() as client:
+        app.state.power_client = client
+        yield
+    shutdown_tracing()
+
+
+def power_client(req: Request) -> httpx.AsyncClient:
+    """Dependency that hands the app's shared POWER client to the service layer."""
+    return req.app.state.power_client
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow cross origin requests from the frontend dev server(s)
 app.add_middleware(
@@ -54,15 +127,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Raster-Bounds", "ETag", "Server-Timing"],
 )
+# Owner tagging, metrics, Server-Timing and tracing (see middleware.py); added last, so outermost
+app.add_middleware(RequestMiddleware)
+
+
+def _with_timing(result: dict, debug: bool) -> dict:
+    """Adds the request's spans to a JSON response body in debug mode."""
+    trace = current_trace.get()
+    if debug and trace is not None:
+        result["debug"] = {"timing": trace.summary()}
+    return result
 
 # --- 3. Update the API Endpoint to use the new models ---
 
 @app.post("/api/analyze/point")
-async def analyze_point(request: AnalysisRequest):
+async def analyze_point(request: AnalysisRequest, debug: bool = False, client: httpx.AsyncClient = Depends(power_client)):
     """
     Accepts a location, date, and an expanded user profile, and returns
     a full "Atmospheric Signature" analysis based on NASA POWER data.
+    With debug=true the per-stage timings are included under "debug".
     """
     analysis_result = await get_climatological_analysis(
         lat=request.lat,
@@ -70,215 +155,321 @@ async def analyze_point(request: AnalysisRequest):
         month=request.month,
         day=request.day,
         profile=request.profile,
-        weights=request.weights
+        weights=request.weights,
+        client=client
     )
     
     if "error" in analysis_result:
         raise HTTPException(status_code=500, detail=analysis_result["error"])
 
-    return analysis_result
+    return _with_timing(analysis_result, debug)
+
+
+@app.post("/api/analyze/calendar")
+async def analyze_calendar(request: CalendarRequest, client: httpx.AsyncClient = Depends(power_client)):
+    """
+    Scores every month (or, with resolution "day", every day) of the year for a
+    location and returns a ranked calendar, replacing one /api/analyze/point round
+    trip per month with a single request.
+    """
+    result = await get_calendar_ranking(
+        lat=request.lat,
+        lon=request.lon,
+        profile=request.profile,
+        weights=request.weights,
+        top=request.top,
+        resolution=request.resolution,
+        client=client
+    )
+
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+
+    return result
+
+
+def _polygon_samples(request: PolygonAnalysisRequest):
+    """
+    Returns (samples, coverage, weights) for a polygon request: the (lat, lon) points
+    to analyze and, in "cells" mode, each cell's covered fraction and area weight.
+    """
+    polygons = parse_polygons(request.polygon)
+    if request.mode == "cells":
+        # One sample per intersecting POWER grid cell, weighted by covered area
+        cells = polygon_cells(polygons)
+        samples = list(zip(cells["lat"].tolist(), cells["lon"].tolist()))
+        polygon_samples.observe(len(samples), mode=request.mode)
+        return samples, cells["coverage"].tolist(), cells["weight"].tolist()
+    samples = sample_polygons(polygons, request.sample_count)
+    polygon_samples.observe(len(samples), mode=request.mode)
+    return samples, None, None
+
+
+def _sample_entry(lat, lon, res, coverage=None):
+    sample = {
+        'lat': lat,
+        'lon': lon,
+        'overall_score': res.get('overall_score'),
+        'atmospheric_signature': res.get('atmospheric_signature', {}),
+        'specialty_scores': res.get('specialty_scores', {})
+    }
+    if coverage is not None:
+        sample['coverage'] = round(coverage, 3)
+    return sample
 
 
 @app.post("/api/analyze/polygon")
-async def analyze_polygon(request: PolygonAnalysisRequest):
+async def analyze_polygon(request: PolygonAnalysisRequest, debug: bool = False, client: httpx.AsyncClient = Depends(power_client)):
     """
-    Accept a GeoJSON polygon, generate a small grid of sample points within the polygon,
-    run the point analysis for each sample concurrently, and return an aggregated result.
+    Accept a GeoJSON Polygon or MultiPolygon (holes supported), spread a grid of sample
+    points across it (or, in "cells" mode, take every intersecting POWER grid cell),
+    analyze them as one batch and return an aggregated result. With debug=true the
+    time spent sampling, fetching, parsing, scoring and aggregating is included
+    under "debug".
     """
     try:
-        coords = request.polygon.get('geometry', {}).get('coordinates', [])
-        if not coords:
-            raise ValueError('Invalid polygon payload')
-
-        ring = coords[0] if isinstance(coords[0], list) else coords
-
-        # Helper: point-in-polygon (ray casting), polygon defined as list of [lon, lat]
-        def point_in_poly(lon, lat, poly):
-            inside = False
-            j = len(poly) - 1
-            for i in range(len(poly)):
-                xi, yi = poly[i][0], poly[i][1]
-                xj, yj = poly[j][0], poly[j][1]
-                intersect = ((yi > lat) != (yj > lat)) and (lon < (xj - xi) * (lat - yi) / (yj - yi + 1e-12) + xi)
-                if intersect:
-                    inside = not inside
-                j = i
-            return inside
-
-        # Bounding box
-        lons = [p[0] for p in ring]
-        lats = [p[1] for p in ring]
-        min_lon, max_lon = min(lons), max(lons)
-        min_lat, max_lat = min(lats), max(lats)
-
-        # Grid sampling: try to produce approximately sample_count points inside polygon
-        import math
-        target = max(1, min(36, int(request.sample_count)))
-        side = max(1, int(math.ceil(math.sqrt(target))))
-        samples = []
-        if max_lon - min_lon <= 0 or max_lat - min_lat <= 0:
-            # degenerate polygon: fallback to centroid
-            centroid_lat = sum(lats) / len(lats)
-            centroid_lon = sum(lons) / len(lons)
-            samples = [(centroid_lat, centroid_lon)]
-        else:
-            lon_step = (max_lon - min_lon) / side
-            lat_step = (max_lat - min_lat) / side
-            for i in range(side):
-                for j in range(side):
-                    # use cell center
-                    lon = min_lon + (i + 0.5) * lon_step
-                    lat = min_lat + (j + 0.5) * lat_step
-                    if point_in_poly(lon, lat, ring):
-                        samples.append((lat, lon))
-                    if len(samples) >= target:
-                        break
-                if len(samples) >= target:
-                    break
-
-            # If no samples found (e.g., very thin polygon), fall back to centroid
-            if not samples:
-                centroid_lat = sum(lats) / len(lats)
-                centroid_lon = sum(lons) / len(lons)
-                samples = [(centroid_lat, centroid_lon)]
-
-        # Run analyses concurrently for each sample point
-        tasks = [get_climatological_analysis(lat=lat, lon=lon, month=request.month, day=request.day, profile=request.profile, weights=request.weights) for (lat, lon) in samples]
-        results = await asyncio.gather(*tasks)
+        with stage("sample"):
+            samples, coverage, sample_weights = _polygon_samples(request)
+
+        # Analyze every sample in one batch: samples sharing a POWER grid cell are
+        # fetched once, and all of them are scored in a single vectorized pass
+        points = [(lat, lon, request.month, request.day) for (lat, lon) in samples]
+        results = [None] * len(points)
+        async for row in get_batch_analysis(points, request.profile, request.weights, client=client):
+            results[row["index"]] = row.get("result")
 
         # Filter out failing results
         successful = [r for r in results if r and isinstance(r, dict) and 'overall_score' in r]
         if not successful:
             raise HTTPException(status_code=500, detail='All sample analyses failed')
 
-        # Aggregation helpers
-        def mean(values):
-            return sum(values) / len(values) if values else 0
-
-        n = len(successful)
-        aggregated = {}
-
-        # overall_score average
-        aggregated['overall_score'] = round(mean([s.get('overall_score', 0) for s in successful]))
-
-        # Location: use first result's location or indicate polygon
-        aggregated['location'] = successful[0].get('location', 'Polygon region')
-
-        # Aggregate atmospheric_signature
-        atms = [s.get('atmospheric_signature', {}) for s in successful]
-        # Temperature
-        temps = [a.get('temperature', {}) for a in atms]
-        aggregated_temp = {
-            'avg': round(mean([t.get('avg', 0) for t in temps]), 1),
-            'min': round(mean([t.get('min', 0) for t in temps]), 1),
-            'max': round(mean([t.get('max', 0) for t in temps]), 1),
-            'meets_profile': (sum(1 for t in temps if t.get('meets_profile')) / n) >= 0.5,
-            'units': '°C'
-        }
-
-        # Wind
-        winds = [a.get('wind', {}) for a in atms]
-        aggregated_wind = {
-            'avg': round(mean([w.get('avg', 0) for w in winds]), 1),
-            'max': round(mean([w.get('max', 0) for w in winds]), 1),
-            'meets_profile': (sum(1 for w in winds if w.get('meets_profile')) / n) >= 0.5,
-            'units': 'm/s'
-        }
-
-        # Humidity
-        hums = [a.get('humidity', {}) for a in atms]
-        aggregated_humidity = {
-            'avg': round(mean([h.get('avg', 0) for h in hums]), 1),
-            'meets_profile': (sum(1 for h in hums if h.get('meets_profile')) / n) >= 0.5,
-            'units': '%'
-        }
-
-        # Precipitation
-        precs = [a.get('precipitation', {}) for a in atms]
-        aggregated_precip = {
-            'avg_daily_amount': round(mean([p.get('avg_daily_amount', p.get('avg_daily_amount', 0)) for p in precs]), 2),
-            'estimated_daily_chance': round(mean([p.get('estimated_daily_chance', 0) for p in precs]), 1),
-            'meets_profile': (sum(1 for p in precs if p.get('meets_profile')) / n) >= 0.5,
-            'units': {'amount': 'mm/day', 'chance': '%'}
-        }
-
-        # Sunlight
-        suns = [a.get('sunlight', {}) for a in atms]
-        aggregated_sun = {
-            'sunny_day_likelihood': round(mean([s.get('sunny_day_likelihood', 0) for s in suns])),
-            'clearness_index': round(mean([s.get('clearness_index', 0) for s in suns]), 2),
-            'units': '% likelihood'
-        }
-
-        aggregated['atmospheric_signature'] = {
-            'temperature': aggregated_temp,
-            'wind': aggregated_wind,
-            'humidity': aggregated_humidity,
-            'precipitation': aggregated_precip,
-            'sunlight': aggregated_sun
-        }
-
-        # Specialty scores: average each numeric score
-        spec = [s.get('specialty_scores', {}) for s in successful]
-        keys = set().union(*(d.keys() for d in spec))
-        aggregated_special = {k: round(mean([d.get(k, 0) for d in spec])) for k in keys}
-        aggregated['specialty_scores'] = aggregated_special
-
-        # Final verdict: percent of samples where all primary metrics meet profile
-        def sample_meets(a):
-            t = a.get('temperature', {}).get('meets_profile')
-            w = a.get('wind', {}).get('meets_profile')
-            p = a.get('precipitation', {}).get('meets_profile')
-            h = a.get('humidity', {}).get('meets_profile')
-            return bool(t and w and p and h)
-
-        meet_count = sum(1 for s in successful if sample_meets(s.get('atmospheric_signature', {})))
-        percent_meet = round((meet_count / n) * 100)
-        aggregated['final_verdict'] = {
-            'percent_meet_profile': percent_meet,
-            'samples_evaluated': n
-        }
+        ok_weights = [w for w, r in zip(sample_weights, results) if r and 'overall_score' in r] if sample_weights else None
+        with stage("aggregate"):
+            aggregated = aggregate_results(successful, ok_weights)
 
         # include per-sample details for frontend layer rendering
-        per_sample = []
-        for (lat, lon), res in zip(samples, results):
-            if res and isinstance(res, dict) and 'overall_score' in res:
-                per_sample.append({
-                    'lat': lat,
-                    'lon': lon,
-                    'overall_score': res.get('overall_score'),
-                    'atmospheric_signature': res.get('atmospheric_signature', {}),
-                    'specialty_scores': res.get('specialty_scores', {})
-                })
+        per_sample = [
+            _sample_entry(lat, lon, res, coverage[k] if coverage else None)
+            for k, ((lat, lon), res) in enumerate(zip(samples, results))
+            if res and isinstance(res, dict) and 'overall_score' in res
+        ]
 
         aggregated['samples'] = per_sample
-        return aggregated
+        return _with_timing(aggregated, debug)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/api/analyze/polygon/stream")
+async def analyze_polygon_stream(request: PolygonAnalysisRequest, http_request: Request, format: Optional[str] = None, client: httpx.AsyncClient = Depends(power_client)):
+    """
+    Streaming variant of /api/analyze/polygon. Emits a "start" event, then one "sample"
+    event per sample as soon as its grid cell's data arrives (with running aggregates),
+    and finally a "summary" event holding the full aggregated result without the
+    per-sample list. Responds with NDJSON by default, or Server-Sent Events when
+    format=sse or the client accepts text/event-stream. Disconnecting stops scoring
+    and drops the grid cells not yet being fetched; fetches already under way are
+    shared (see SingleFlight) and finish into the cache for the next request.
+    """
+    try:
+        with stage("sample"):
+            samples, coverage, sample_weights = _polygon_samples(request)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    use_sse = format == "sse" or "text/event-stream" in http_request.headers.get("accept", "")
+    points = [(lat, lon, request.month, request.day) for (lat, lon) in samples]
+
+    def encode(event: dict) -> str:
+        if use_sse:
+            return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + "\n"
+
+    async def events():
+        yield encode({"type": "start", "total": len(points), "mode": request.mode})
+
+        running = RunningAggregate()
+        successful, ok_weights = [], []
+        async for row in stream_batch_analysis(points, request.profile, request.weights, client=client):
+            i = row["index"]
+            res = row.get("result")
+            if res is None:
+                yield encode({"type": "sample_error", "index": i, "error": row.get("error")})
+                continue
+
+            weight = sample_weights[i] if sample_weights else 1.0
+            running.add(res, weight)
+            successful.append(res)
+            ok_weights.append(weight)
+            lat, lon = samples[i]
+            yield encode({
+                "type": "sample",
+                "index": i,
+                "sample": _sample_entry(lat, lon, res, coverage[i] if coverage else None),
+                "running": running.snapshot(),
+            })
+
+        if successful:
+            yield encode({"type": "summary", "result": aggregate_results(successful, ok_weights)})
+        else:
+            yield encode({"type": "error", "detail": "All sample analyses failed"})
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/api/analyze/batch")
+async def analyze_batch(request: BatchAnalysisRequest, client: httpx.AsyncClient = Depends(power_client)):
+    """
+    Analyzes up to MAX_BATCH_ITEMS points in one round trip. Points in the same POWER
+    grid cell share one fetch, and results are streamed back as NDJSON, one line per
+    item ({"index": i, "result": {...}} or {"index": i, "error": "..."}).
+    """
+    points = [(item.lat, item.lon, item.month, item.day) for item in request.items]
+
+    async def ndjson_lines():
+        async for row in get_batch_analysis(points, request.profile, request.weights, client=client):
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/api/analyze/heatmap")
+def analyze_heatmap(request: HeatmapRequest):
+    """
+    Scores every POWER grid cell in a bounding box for a date, straight from the
+    offline grid store, and returns a north-up raster of overall scores (one pixel
+    per cell). JSON carries base64 uint8 score and meets-profile rasters; format=png
+    returns a colored overlay image with its bounds in the X-Raster-Bounds header.
+    """
+    store = get_grid_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Heatmaps need the offline climatology grid store (see ingest_grid.py)")
+
+    try:
+        with stage("heatmap"):
+            region = score_region(store, request.bbox, request.month, request.day, request.profile, request.weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.format == "png":
+        b = region["bounds"]
+        return Response(
+            encode_png(score_colors(region["scores"])),
+            media_type="image/png",
+            headers={"X-Raster-Bounds": f"{b['west']},{b['south']},{b['east']},{b['north']}"},
+        )
+    return raster_json(region)
+
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.png")
+def map_tile(
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    month: int = Query(ge=1, le=12),
+    day: int = Query(15, ge=1, le=31),
+    profile: ComfortProfile = Depends(),
+    weights: ScoreWeights = Depends(),
+):
+    """
+    XYZ map tile of the comfort score (layer "score", using the profile and weights
+    query parameters) or of one POWER parameter (e.g. "T2M") for a date, rendered
+    from the offline grid store. Tiles carry an ETag and Cache-Control, and repeat
+    renders are served from an in-process LRU.
+    """
+    if layer not in LAYERS:
+        raise HTTPException(status_code=404, detail=f"Unknown layer '{layer}' (expected one of {', '.join(LAYERS)})")
+    if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    store = get_grid_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Map tiles need the offline climatology grid store (see ingest_grid.py)")
+
+    scoring_args = (profile.model_dump(), weights.model_dump()) if layer == SCORE_LAYER else ()
+    with stage("tile"):
+        png, etag = get_tile(store, layer, z, x, y, month, day, *scoring_args)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={TILE_MAX_AGE}"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(png, media_type="image/png", headers=headers)
+
+
 @app.get("/")
 def read_root():
     return {"status": "AtmoSphere Backend v2 is running!"}
 
 
+@app.get("/api/capabilities")
+def capabilities():
+    """Which optional offline datasets this server has, so the frontend only asks for what exists."""
+    return {"grid_store": get_grid_store() is not None, "probability_table": get_probability_table() is not None}
+
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the in-memory and on-disk climatology caches and the tile cache."""
+    cache = get_disk_cache()
+    return {
+        "memory": memory_cache.stats(),
+        "disk": cache.stats() if cache else None,
+        "single_flight": fetch_flights.stats(),
+        "tiles": tile_cache.stats(),
+    }
+
+
+@app.get("/api/upstream/stats")
+def upstream_stats():
+    """Scheduler queue depth/wait times and retry, hedging and circuit breaker counters."""
+    return {"scheduler": upstream_scheduler.stats(), "resilience": power_resilience.stats()}
+
+
+@registry.collector
+def _live_stats():
+    # The cache, scheduler and resilience layers keep their own counters; export
+    # them as they are at scrape time
+    cache = get_disk_cache()
+    caches = {"memory": memory_cache.stats(), "disk": cache.stats() if cache else None, "tiles": tile_cache.stats()}
+    resilience = power_resilience.stats()
+    breaker = Gauge("atmo_upstream_breaker_state", "1 for the circuit breaker's current state.", ("state",))
+    for state in ("closed", "open", "half_open"):
+        breaker.set(int(resilience["breaker_state"] == state), state=state)
+    return [
+        *from_stats("atmo_cache", "cache", caches, counters=("hits", "misses", "evictions", "expired"), source="climatology and tile cache"),
+        *from_stats("atmo_single_flight", None, {None: fetch_flights.stats()}, counters=("coalesced",), source="single-flight"),
+        *from_stats("atmo_scheduler", "host", upstream_scheduler.stats(), counters=("granted",), source="upstream scheduler"),
+        *from_stats("atmo_upstream", None, {None: resilience},
+                    counters=("calls", "retries", "hedges", "hedge_wins", "failures", "rejected_by_breaker", "breaker_times_opened"),
+                    source="resilience layer"),
+        breaker,
+    ]
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of every counter, gauge and histogram (see metrics.py)."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 class ProfileFromDateRequest(BaseModel):
-    lat: float
-    lon: float
-    month: int
-    day: int
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31)
 
 
 @app.post('/api/profile/from_date')
-async def profile_from_date(request: ProfileFromDateRequest):
+async def profile_from_date(request: ProfileFromDateRequest, client: httpx.AsyncClient = Depends(power_client)):
     """
     Returns a suggested comfort profile (and default weights) computed from the
     climatology at the requested lat/lon and month/day. Frontend can use this
     to prefill user preferences based on historical norms.
     """
     try:
-        result = await get_profile_from_climatology(lat=request.lat, lon=request.lon, month=request.month, day=request.day)
+        result = await get_profile_from_climatology(lat=request.lat, lon=request.lon, month=request.month, day=request.day, client=client)
         if not result or 'error' in result:
             raise Exception(result.get('error', 'Unknown error while computing profile'))
         return result
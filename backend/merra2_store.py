@@ -0,0 +1,188 @@
+"""
+Local store of daily MERRA-2 summaries.
+
+download_data.py saves hourly MERRA-2 files, one per day and collection: single
+level fields (tavg1_2d_slv_Nx) and, optionally, surface fluxes (tavg1_2d_flx_Nx)
+for precipitation. ingest_merra2.py reduces each day to daily values for the
+variables the service uses, named after the matching POWER parameters (see
+scoring.py), and writes them here as one compressed, chunked netCDF-4 file per
+month, laid out time x lat x lon on the MERRA-2 grid (the POWER grid, see
+power_grid.py). Chunks span a whole month and a small block of cells, so a point's
+history reads only a few chunks per month.
+
+    data/merra2_store/
+        meta.json
+        2020/merra2_daily_2020_08.nc
+"""
+import os
+import json
+import time
+import numpy as np
+import xarray as xr
+from pathlib import Path
+from typing import Optional
+
+from power_grid import LAT_STEP, LON_STEP, N_LAT, N_LON, snap_to_cell, cell_center
+
+# --- Configuration ---
+MERRA2_STORE_DIR = os.getenv("MERRA2_STORE_DIR", "data/merra2_store")
+
+# Bump this whenever the on-disk layout changes
+STORE_VERSION = 2
+META_FILE = "meta.json"
+
+# Hourly MERRA-2 variables read from each collection (everything else is never loaded)
+SOURCE_VARIABLES = {
+    "tavg1_2d_slv_Nx": ("T2M", "U10M", "V10M", "QV2M", "PS"),
+    "tavg1_2d_flx_Nx": ("PRECTOTCORR",),
+}
+
+# Daily variables written to the store, with their units
+DAILY_VARIABLES = {
+    "T2M": "C", "T2M_MAX": "C", "T2M_MIN": "C",
+    "WS10M": "m/s", "WS10M_MAX": "m/s",
+    "QV2M": "g/kg",
+    "RH2M": "%",
+    "PRECTOTCORR": "mm/day", # NaN for days without a flx file
+}
+
+CHUNK_CELLS = (32, 32) # lat x lon cells per chunk
+COMPRESSION_LEVEL = 4
+
+
+def relative_humidity(t2m_c, qv2m, ps):
+    """Relative humidity (%) from 2 m temperature (°C), specific humidity (kg/kg) and surface pressure (Pa)."""
+    vapour_pressure = qv2m * ps / (0.622 + 0.378 * qv2m)
+    saturation = 611.2 * np.exp(17.67 * t2m_c / (t2m_c + 243.5)) # Bolton (1980)
+    return (100 * vapour_pressure / saturation).clip(0, 100)
+
+
+def daily_summary(hourly: xr.Dataset, fluxes: Optional[xr.Dataset] = None) -> dict:
+    """
+    Reduces one day of hourly MERRA-2 fields (plus, when given, the same day's
+    surface fluxes) to the DAILY_VARIABLES, as a dict of (lat, lon) float32 arrays.
+    Works on dask-backed (chunked) datasets too.
+    """
+    t2m = hourly["T2M"] - 273.15
+    wind = np.hypot(hourly["U10M"], hourly["V10M"])
+    rh = relative_humidity(t2m, hourly["QV2M"], hourly["PS"])
+    daily = xr.Dataset({
+        "T2M": t2m.mean("time"),
+        "T2M_MAX": t2m.max("time"),
+        "T2M_MIN": t2m.min("time"),
+        "WS10M": wind.mean("time"),
+        "WS10M_MAX": wind.max("time"),
+        "QV2M": hourly["QV2M"].mean("time") * 1000,
+        "RH2M": rh.mean("time"),
+        # kg m-2 s-1 averaged over the day is mm/s; MERRA-2 stores it as float32
+        "PRECTOTCORR": fluxes["PRECTOTCORR"].mean("time") * 86400 if fluxes is not None
+                       else xr.full_like(t2m.isel(time=0, drop=True), np.nan),
+    }).load() # one pass over the hourly data, even when it is dask-backed
+    return {name: daily[name].values.astype(np.float32) for name in DAILY_VARIABLES}
+
+
+def month_path(directory: str, year: int, month: int) -> Path:
+    return Path(directory, f"{year:04d}", f"merra2_daily_{year:04d}_{month:02d}.nc")
+
+
+class MERRA2Store:
+    """
+    Read/write access to the monthly daily-summary files, and the meta.json that
+    records which days each month file holds (and which of them have
+    precipitation) and which cells it covers.
+    """
+
+    def __init__(self, directory: str, meta: dict):
+        self.directory = directory
+        self.meta = meta
+
+    @classmethod
+    def open(cls, directory: str = MERRA2_STORE_DIR, create: bool = False) -> "MERRA2Store":
+        path = Path(directory, META_FILE)
+        if not path.exists():
+            if not create:
+                raise FileNotFoundError(f"No MERRA-2 store at '{directory}' (run ingest_merra2.py)")
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            store = cls(directory, {"version": STORE_VERSION, "variables": DAILY_VARIABLES, "months": {}})
+            store.save_meta()
+            return store
+        meta = json.loads(path.read_text())
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"MERRA-2 store version {meta.get('version')} is not supported (expected {STORE_VERSION})")
+        return cls(directory, meta)
+
+    def save_meta(self):
+        self.meta["updated"] = time.time()
+        tmp = Path(self.directory, META_FILE + ".tmp")
+        tmp.write_text(json.dumps(self.meta, indent=2))
+        tmp.replace(Path(self.directory, META_FILE))
+
+    def days(self, year: int, month: int, key: str = "days") -> set:
+        """The days already stored for a month (key="precip_days": those with precipitation), as YYYYMMDD strings."""
+        return set(self.meta["months"].get(f"{year:04d}-{month:02d}", {}).get(key, []))
+
+    # --- Writing ---
+
+    def write_month(self, year: int, month: int, days: list, fields: list, lat_idx: slice, lon_idx: slice):
+        """
+        Writes (or replaces) one month file. `days` are YYYYMMDD strings and `fields`
+        the matching daily_summary dicts, all covering the cells lat_idx x lon_idx.
+        """
+        order = np.argsort(days)
+        days = [days[i] for i in order]
+        lats = -90.0 + np.arange(N_LAT)[lat_idx] * LAT_STEP
+        lons = -180.0 + np.arange(N_LON)[lon_idx] * LON_STEP
+        times = np.array([np.datetime64(f"{d[:4]}-{d[4:6]}-{d[6:]}") for d in days])
+
+        data_vars = {}
+        encoding = {}
+        for name, units in DAILY_VARIABLES.items():
+            stacked = np.stack([fields[i][name] for i in order])
+            data_vars[name] = (("time", "lat", "lon"), stacked, {"units": units})
+            encoding[name] = {
+                "zlib": True,
+                "complevel": COMPRESSION_LEVEL,
+                "shuffle": True,
+                "dtype": "float32",
+                "chunksizes": (len(days), min(CHUNK_CELLS[0], len(lats)), min(CHUNK_CELLS[1], len(lons))),
+            }
+        dataset = xr.Dataset(data_vars, coords={"time": times, "lat": lats, "lon": lons})
+        precip_days = [d for d, i in zip(days, order) if not np.isnan(fields[i]["PRECTOTCORR"]).all()]
+        collections = list(SOURCE_VARIABLES) if precip_days else ["tavg1_2d_slv_Nx"]
+        dataset.attrs["source"] = f"MERRA-2 {' + '.join(collections)}, daily summaries"
+
+        path = month_path(self.directory, year, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        dataset.to_netcdf(tmp, engine="netcdf4", encoding=encoding)
+        tmp.replace(path)
+
+        self.meta["months"][f"{year:04d}-{month:02d}"] = {
+            "days": days,
+            "precip_days": precip_days,
+            "lat_idx": [lat_idx.start, lat_idx.stop],
+            "lon_idx": [lon_idx.start, lon_idx.stop],
+            "bytes": path.stat().st_size,
+        }
+
+    # --- Reading ---
+
+    def month_files(self, start: Optional[str] = None, end: Optional[str] = None) -> list:
+        """Month file paths in time order, optionally limited to YYYY-MM keys in [start, end]."""
+        keys = sorted(k for k in self.meta["months"] if (not start or k >= start) and (not end or k <= end))
+        return [month_path(self.directory, int(k[:4]), int(k[5:])) for k in keys]
+
+    def read_point(self, lat: float, lon: float, start: Optional[str] = None, end: Optional[str] = None) -> xr.Dataset:
+        """
+        Daily time series for the grid cell containing a point, across every stored
+        month (or the YYYY-MM range [start, end]). Only that cell's chunks are read.
+        """
+        cell_lat, cell_lon = cell_center(*snap_to_cell(lat, lon))
+        series = []
+        for path in self.month_files(start, end):
+            with xr.open_dataset(path, engine="netcdf4") as month:
+                if month.lat[0] <= cell_lat <= month.lat[-1] and month.lon[0] <= cell_lon <= month.lon[-1]:
+                    series.append(month.sel(lat=cell_lat, lon=cell_lon, method="nearest").load())
+        if not series:
+            raise KeyError(f"The MERRA-2 store has no data for ({lat}, {lon})")
+        return xr.concat(series, dim="time")
@@ -0,0 +1,298 @@
+"""
+Prometheus metrics for the API, the upstream POWER calls and the scoring pipeline.
+
+Counters, gauges and histograms are kept in process and rendered in the Prometheus
+text exposition format by GET /metrics, so the service needs no client library.
+Request metrics are recorded by middleware.py (labelled by route template,
+not raw path, to keep cardinality bounded); nasa_service times its fetch, parse
+and score stages with `stage()`. Numbers that already live elsewhere (cache,
+scheduler and resilience counters) are read at scrape time by collectors
+registered with `registry.collector()`, so they are never counted twice.
+
+The same stages also feed an opt-in per-request Trace (see `current_trace`),
+which middleware.py returns as a Server-Timing header (main.py adds it to the body
+in debug mode).
+"""
+import time
+import math
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+# --- Configuration ---
+# Seconds. Spans a warm cache hit (well under a millisecond) to a slow upstream call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SAMPLE_COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    """A named family of samples, one per combination of label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        # Sync endpoints run in FastAPI's thread pool, so updates can race
+        self._lock = threading.Lock()
+        if not self.label_names and self.kind != "histogram":
+            self._values[()] = 0 # exported as 0 before the first update
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Counts the enclosed block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0] # bucket counts, sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, (list(counts), total, n)) for k, (counts, total, n) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, _INF_LABEL)} {n}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {n}")
+        return lines
+
+
+class Registry:
+    """Holds every metric plus the scrape-time collectors, and renders them all."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[_Metric]]):
+        """Registers fn, called on every scrape to build fresh metrics from live stats."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- HTTP API ---
+http_requests = registry.register(Counter(
+    "atmo_http_requests_total", "API requests served, by route template, method and status code.",
+    ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "atmo_http_request_duration_seconds", "Time until the response starts, by route template and method.",
+    ("method", "route")))
+http_requests_in_progress = registry.register(Gauge(
+    "atmo_http_requests_in_progress", "API requests currently being handled."))
+
+# --- Upstream NASA POWER ---
+upstream_requests = registry.register(Counter(
+    "atmo_upstream_requests_total", "Single HTTP attempts against NASA POWER, by outcome (status code or error type).",
+    ("outcome",)))
+upstream_request_duration = registry.register(Histogram(
+    "atmo_upstream_request_duration_seconds", "Duration of single HTTP attempts against NASA POWER (after the scheduler slot is granted).",
+    ("outcome",)))
+upstream_in_flight = registry.register(Gauge(
+    "atmo_upstream_requests_in_flight", "HTTP attempts against NASA POWER currently waiting on the network."))
+
+# --- Pipeline ---
+stage_duration = registry.register(Histogram(
+    "atmo_stage_duration_seconds", "Time spent per pipeline stage (sample, fetch, parse, probabilities, score, build, aggregate, heatmap, tile).",
+    ("stage",)))
+climatology_lookups = registry.register(Counter(
+    "atmo_climatology_lookups_total", "Climatology record lookups, by where they were served from (store, memory, disk, api, stale).",
+    ("source",)))
+polygon_samples = registry.register(Histogram(
+    "atmo_polygon_samples", "Sample points (or grid cells) analyzed per polygon request.",
+    ("mode",), buckets=SAMPLE_COUNT_BUCKETS))
+
+
+def from_stats(prefix: str, label: str, stats_by_label: dict, counters: tuple = (), source: str = "") -> list:
+    """
+    Turns existing stats() dicts into metrics for a collector: one family per numeric
+    field, named prefix_field, with one sample per entry of stats_by_label (labelled
+    label=key; pass label=None and a single {None: stats} entry for unlabelled ones).
+    Fields listed in `counters` become counters (suffixed _total), the rest gauges;
+    non-numeric and None fields are skipped.
+    """
+    fields = {}
+    for key, stats in stats_by_label.items():
+        for field, value in (stats or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                fields.setdefault(field, []).append((key, value))
+
+    labels = (label,) if label else ()
+    metrics = []
+    for field, samples in fields.items():
+        if field in counters:
+            metric = Counter(f"{prefix}_{field}_total", f"{field} from the {source or prefix} stats.", labels)
+            for key, value in samples:
+                metric.inc(value, **({label: key} if label else {}))
+        else:
+            metric = Gauge(f"{prefix}_{field}", f"{field} from the {source or prefix} stats.", labels)
+            for key, value in samples:
+                metric.set(value, **({label: key} if label else {}))
+        metrics.append(metric)
+    return metrics
+
+
+# --- Per-request tracing ---
+
+class Trace:
+    """
+    Time spent per stage while serving one request. Spans with the same name (e.g.
+    one "fetch" per grid cell of a polygon) are summed, so concurrent spans can add
+    up to more than the request's wall time; `count` says how many were merged.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {} # name -> [seconds, count], in first-seen order
+
+    def add(self, name: str, seconds: float):
+        span = self.spans.setdefault(name, [0.0, 0])
+        span[0] += seconds
+        span[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> list:
+        """The spans as JSON-ready dicts, plus the request's wall time so far as "total"."""
+        spans = [{"name": name, "ms": round(seconds * 1000, 2), "count": count} for name, (seconds, count) in self.spans.items()]
+        return spans + [{"name": "total", "ms": round(self.elapsed() * 1000, 2), "count": 1}]
+
+    def server_timing(self) -> str:
+        """The spans as a Server-Timing header value (shown in the browser's devtools)."""
+        return ", ".join(
+            f'{span["name"]};dur={span["ms"]}' + (f';desc="{span["count"]}x"' if span["count"] > 1 else "")
+            for span in self.summary()
+        )
+
+
+# Set by middleware.py for requests that asked for timings; None means not tracing
+current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times the enclosed block into atmo_stage_duration_seconds{stage=name}, and into
+    the current request's Trace when it is being traced.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(elapsed, stage=name)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
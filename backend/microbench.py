@@ -0,0 +1,183 @@
+"""
+Micro-benchmarks for the CPU hot paths behind each request.
+
+Every case runs one function on a fixed, deterministic payload (climatology from
+the POWER stub's generator, a fixed polygon with a hole, pre-built signatures), so
+timings are comparable between commits. Each case is timed with timeit: the best
+of several repeats, reported per call. The tracked baseline (BASELINE_FILE) is
+refreshed in the same commit as any intended speed change, and --compare fails
+when a case slows down by more than --max-regression against it:
+
+    python microbench.py --compare                 # against benchmarks/micro-baseline.json
+    python microbench.py --save-baseline           # refresh it, then commit it
+    python microbench.py -k polygon                # only cases whose name contains "polygon"
+
+Timings only compare on similar hardware, so the baseline records the machine it
+was taken on and --compare warns when it runs elsewhere; for a local before/after
+check, save a baseline to another path on the base commit and compare against it.
+
+End-to-end latency and throughput live in benchmark.py.
+"""
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import numpy as np
+from pathlib import Path
+
+from power_stub import climatology_payload
+from scoring import (PARAMETERS, CLIMATOLOGY_DTYPE, climatology_from_power, calculate_heat_index,
+                     score_conditions, build_signatures, daily_climatology, conditions_for_day, select_day)
+from geometry import parse_polygons, points_in_polygons, sample_polygons, polygon_cells
+from aggregation import aggregate_results, RunningAggregate
+from heatmap import score_colors, encode_png
+
+# --- Configuration ---
+REPEATS = 5 # each repeat runs the case enough times to take at least 0.2 s (timeit autorange)
+BASELINE_FILE = str(Path(__file__).parent / "benchmarks" / "micro-baseline.json")
+
+PROFILE = {"temp_min": 15, "temp_max": 25, "wind_max": 10, "rain_chance_max": 20, "humidity_max": 70}
+WEIGHTS = {"temperature": 1.5, "wind": 1.0, "rain": 2.0, "humidity": 1.0}
+
+# A 4x4 degree square over northern India with a 1x1 degree hole
+POLYGON = {
+    "type": "Polygon",
+    "coordinates": [
+        [[76, 20], [80, 20], [80, 24], [76, 24], [76, 20]],
+        [[77.5, 21.5], [78.5, 21.5], [78.5, 22.5], [77.5, 22.5], [77.5, 21.5]],
+    ],
+}
+
+
+# --- Fixtures ---
+
+def climatology_fixture(n: int) -> np.ndarray:
+    """(n, 12) climatology for n fixed pseudo-random points."""
+    rng = np.random.default_rng(0)
+    lats, lons = rng.uniform(-60, 70, n), rng.uniform(-180, 180, n)
+    climatology = np.empty((n, 12), dtype=CLIMATOLOGY_DTYPE)
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        climatology[i] = climatology_from_power(climatology_payload(lat, lon, list(PARAMETERS))["properties"]["parameter"])
+    return climatology
+
+
+def signatures_fixture(n: int) -> list:
+    climatology = climatology_fixture(n)
+    scored = score_conditions(climatology[:, 7], PROFILE, WEIGHTS)
+    return build_signatures(scored, [0.0] * n, [0.0] * n, "Benchmark")
+
+
+# --- Cases ---
+
+def build_cases() -> dict:
+    """Maps case name -> zero-argument callable. Fixture setup happens here, untimed."""
+    one = climatology_fixture(1)
+    batch = climatology_fixture(5000)
+    batch_daily = np.stack([daily_climatology(c) for c in batch[:500]])
+    temps = np.linspace(-10, 45, 10_000)
+    humidity = np.linspace(10, 100, 10_000)
+
+    polygons = parse_polygons(POLYGON)
+    rng = np.random.default_rng(1)
+    pip_lons, pip_lats = rng.uniform(75, 81, 10_000), rng.uniform(19, 25, 10_000)
+
+    signatures = signatures_fixture(2000)
+    sample_weights = list(np.linspace(0.1, 1.0, len(signatures)))
+    raster = np.random.default_rng(2).integers(0, 101, (256, 256)).astype(np.uint8)
+
+    def running_aggregate():
+        running = RunningAggregate()
+        for result in signatures:
+            running.add(result)
+        return running.snapshot()
+
+    return {
+        # Heat index
+        "heat_index/scalar": lambda: calculate_heat_index(31.0, 70.0),
+        "heat_index/array_10k": lambda: calculate_heat_index(temps, humidity),
+        # Scoring and response construction (what /api/analyze/point does per request)
+        "point/score": lambda: score_conditions(one[:, 7], PROFILE, WEIGHTS),
+        "point/score_and_signature": lambda: build_signatures(score_conditions(one[:, 7], PROFILE, WEIGHTS), [22.0], [78.0], "Benchmark"),
+        "point/daily_climatology": lambda: daily_climatology(one[0]),
+        "batch/score_5k": lambda: score_conditions(batch[:, 7], PROFILE, WEIGHTS),
+        "batch/score_and_signatures_5k": lambda: build_signatures(score_conditions(batch[:, 7], PROFILE, WEIGHTS), [0.0] * 5000, [0.0] * 5000, "Benchmark"),
+        "batch/select_day_500": lambda: select_day(batch_daily, 8, 15),
+        "batch/conditions_for_day_5k": lambda: conditions_for_day(batch, 8, 15),
+        # Polygons
+        "polygon/parse": lambda: parse_polygons(POLYGON),
+        "polygon/points_in_polygon_10k": lambda: points_in_polygons(pip_lons, pip_lats, polygons),
+        "polygon/sample_81": lambda: sample_polygons(polygons, 81),
+        "polygon/cells": lambda: polygon_cells(polygons),
+        "polygon/aggregate_2k": lambda: aggregate_results(signatures),
+        "polygon/aggregate_weighted_2k": lambda: aggregate_results(signatures, sample_weights),
+        "polygon/running_aggregate_2k": running_aggregate,
+        # Overlays
+        "overlay/png_256": lambda: encode_png(score_colors(raster)),
+    }
+
+
+# --- Running ---
+
+def time_case(fn) -> dict:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [t / number for t in timer.repeat(repeat=REPEATS, number=number)]
+    return {"best_us": round(min(runs) * 1e6, 2), "median_us": round(float(np.median(runs)) * 1e6, 2), "loops": number}
+
+
+def machine() -> dict:
+    return {"platform": platform.platform(), "processor": platform.processor() or platform.machine(),
+            "python": platform.python_version(), "numpy": np.__version__}
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> bool:
+    """Prints per-case changes against a baseline; False if any case slowed down more than allowed."""
+    if baseline.get("machine") and baseline["machine"] != machine():
+        print(f"Note: the baseline was taken on {baseline['machine']}, this is {machine()}")
+    ok = True
+    for name, result in results.items():
+        before = baseline.get("cases", {}).get(name)
+        if not before:
+            print(f"{name:<36} new")
+            continue
+        change = (result["best_us"] - before["best_us"]) / before["best_us"]
+        flag = ""
+        if change > max_regression:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<36} {before['best_us']:>12.2f} -> {result['best_us']:>12.2f} us ({change:+.0%}){flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for scoring, geometry and aggregation hot paths.")
+    parser.add_argument("-k", dest="filter", help="Only run cases whose name contains this string")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_FILE, help="Write the results to this JSON file (default: %(const)s)")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_FILE, help="Baseline JSON to compare against (default: %(const)s)")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed slowdown per case (default: 25%%)")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    results = {}
+    for name, fn in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = time_case(fn)
+        print(f"{name:<36} {results[name]['best_us']:>12.2f} us")
+
+    if args.save_baseline:
+        path = Path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"timestamp": time.time(), "machine": machine(), "cases": results}, indent=2) + "\n")
+        print(f"Baseline written to '{path}'")
+
+    if args.compare:
+        print()
+        if not compare(results, json.loads(Path(args.compare).read_text()), args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+The per-request bookkeeping around every API call, as one pure ASGI middleware.
+
+For each HTTP request it:
+- tags upstream NASA calls with a fresh owner, so they queue fairly against other
+  requests' calls (see scheduler.py),
+- records request count, latency and in-progress metrics (see metrics.py),
+- when the request asked for timings (?debug=true, or SERVER_TIMING=true), collects
+  the stages timed while serving it and returns them in a Server-Timing header,
+- when OpenTelemetry tracing is on, wraps the request in a server span (see
+  telemetry.py).
+
+One ASGI layer instead of a BaseHTTPMiddleware per concern: each of those costs a
+task and a response re-wrap per request. Tracing and timing are skipped outright
+when off.
+"""
+import os
+import time
+from contextlib import nullcontext
+from urllib.parse import parse_qs
+
+import telemetry
+from scheduler import current_owner, new_owner
+from metrics import Trace, current_trace, http_requests, http_request_duration, http_requests_in_progress
+
+# --- Configuration ---
+# Send a Server-Timing header on every response, not only for ?debug=true requests
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+
+def debug_requested(scope) -> bool:
+    if b"debug" not in scope.get("query_string", b""):
+        return False
+    values = parse_qs(scope["query_string"].decode("latin-1")).get("debug", [""])
+    return values[-1].lower() in ("1", "true", "yes")
+
+
+class RequestMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        started = time.perf_counter()
+        trace = Trace() if SERVER_TIMING or debug_requested(scope) else None
+        state = {"status": 500, "timed": False}
+
+        def route() -> str:
+            # The matched route's template (e.g. /tiles/{layer}/{z}/{x}/{y}.png), so raw
+            # paths can't blow up the number of metric series
+            return getattr(scope.get("route"), "path", "unmatched")
+
+        def record():
+            # Timed until the response starts: streaming responses aren't held open
+            if not state["timed"]:
+                state["timed"] = True
+                r = route()
+                http_requests.inc(method=method, route=r, status=state["status"])
+                http_request_duration.observe(time.perf_counter() - started, method=method, route=r)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if trace is not None:
+                    # Only the spans finished before the headers go out
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", trace.server_timing().encode("latin-1")),
+                        (b"timing-allow-origin", b"*"),
+                    ]
+                record()
+            await send(message)
+
+        if telemetry.tracing_enabled():
+            headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+            span = telemetry.server_span(method, scope["path"], headers)
+        else:
+            span = nullcontext()
+
+        owner_token = current_owner.set(new_owner())
+        trace_token = current_trace.set(trace) if trace is not None else None
+        http_requests_in_progress.inc()
+        try:
+            with span as current:
+                await self.app(scope, receive, send_wrapper)
+                if current is not None:
+                    current.update_name(f"{method} {route()}")
+                    current.set_attribute("http.route", route())
+                    current.set_attribute("http.response.status_code", state["status"])
+        finally:
+            record()
+            http_requests_in_progress.dec()
+            if trace_token is not None:
+                current_trace.reset(trace_token)
+            current_owner.reset(owner_token)
@@ -1,252 +1,495 @@
 import os
+import time
 import httpx
 import asyncio
+import importlib.util
 import numpy as np
-from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Optional
 from dotenv import load_dotenv
 
+from power_grid import cell_key, snap_to_cell
+from climatology_cache import get_disk_cache, memory_cache, fetch_flights
+from grid_store import get_grid_store
+from probability_table import get_probability_table, empirical_probabilities
+from scheduler import upstream_scheduler
+from resilience import power_resilience
+from metrics import stage, climatology_lookups, upstream_requests, upstream_request_duration, upstream_in_flight
+from telemetry import span, set_attribute
+from scoring import PARAMETERS, CLIMATOLOGY_DTYPE, climatology_from_power, select_month, score_conditions, build_signatures
+from scoring import daily_climatology, day_of_year, DAYS_IN_YEAR, MONTH_START, DAY_MONTH_IDX
+from scoring import estimate_rain_probability, rank_conditions
+
 # --- Configuration ---
 load_dotenv()
 NASA_API_KEY = os.getenv("NASA_API_KEY")
-POWER_CLIMATOLOGY_API_URL = "https://power.larc.nasa.gov/api/temporal/climatology/point"
+# Overridable so the service can be pointed at a local stub (see power_stub.py)
+POWER_CLIMATOLOGY_API_URL = os.getenv("POWER_CLIMATOLOGY_API_URL", "https://power.larc.nasa.gov/api/temporal/climatology/point")
+
+# Connection pool settings for the shared POWER client (overridable from .env)
+POWER_TIMEOUT = float(os.getenv("POWER_TIMEOUT", "30"))
+POWER_MAX_CONNECTIONS = int(os.getenv("POWER_MAX_CONNECTIONS", "20"))
+POWER_MAX_KEEPALIVE = int(os.getenv("POWER_MAX_KEEPALIVE", "10"))
+POWER_KEEPALIVE_EXPIRY = float(os.getenv("POWER_KEEPALIVE_EXPIRY", "60"))
+POWER_HTTP2 = os.getenv("POWER_HTTP2", "true").lower() in ("1", "true", "yes")
+
+# Batch analysis: how many distinct grid cells to fetch at once, and how many
+# results to build per streamed chunk
+BATCH_FETCH_CONCURRENCY = int(os.getenv("BATCH_FETCH_CONCURRENCY", "8"))
+BATCH_CHUNK_SIZE = 500
 
-# --- Helper Functions ---
+# Every endpoint shares one parameter set, so one cache entry per grid cell
+CLIMATOLOGY_PARAMS_KEY = ",".join(sorted(PARAMETERS))
+RECORD_OVERHEAD_BYTES = 512 # rough per-record size beyond the array, for the LRU byte cap
 
-def calculate_heat_index(T, RH):
+# --- HTTP Client ---
+
+def create_http_client() -> httpx.AsyncClient:
     """
-    Calculates Heat Index in Celsius. A simplified version of the NOAA formula for broader applicability.
-    This gives an indication of perceived temperature.
+    Builds the pooled client used for every NASA POWER request. The FastAPI app owns
+    one of these for its whole lifetime so that concurrent requests (e.g. polygon
+    samples) reuse warm keep-alive connections instead of paying a new TLS handshake.
     """
-    # Formula is based on Fahrenheit, so we convert back and forth.
-    T_F = T * 9/5 + 32
-    
-    # Simple formula for lower temperatures
-    if T_F < 80:
-        HI_F = 0.5 * (T_F + 61.0 + ((T_F - 68.0) * 1.2) + (RH * 0.094))
-    # More complex formula for higher temperatures
-    else:
-        HI_F = -42.379 + 2.04901523*T_F + 10.14333127*RH - .22475541*T_F*RH - .00683783*T_F*T_F - .05481717*RH*RH + .00122874*T_F*T_F*RH + .00085282*T_F*RH*RH - .00000199*T_F*T_F*RH*RH
-    
-    return (HI_F - 32) * 5/9 # Convert final result back to Celsius
+    limits = httpx.Limits(
+        max_connections=POWER_MAX_CONNECTIONS,
+        max_keepalive_connections=POWER_MAX_KEEPALIVE,
+        keepalive_expiry=POWER_KEEPALIVE_EXPIRY,
+    )
+    # HTTP/2 needs the optional 'h2' package (installed via httpx[http2])
+    http2 = POWER_HTTP2 and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(timeout=POWER_TIMEOUT, limits=limits, http2=http2)
 
-# --- Main Service Function ---
 
-async def get_climatological_analysis(lat: float, lon: float, month: int, day: int, profile, weights):
+async def _fetch_power_json(params: dict, client: Optional[httpx.AsyncClient] = None) -> dict:
     """
-    Fetches and analyzes a full suite of climatological data from the NASA POWER API
-    to generate a complete "Atmospheric Signature".
+    GETs the POWER climatology endpoint with the given client. Falls back to a
+    short-lived client when called outside the app (e.g. from scripts).
+    Transient failures are retried and slow attempts hedged (see resilience.py);
+    raises CircuitOpenError while upstream is marked unhealthy.
+    """
+    if client is None:
+        async with create_http_client() as temp_client:
+            return await _fetch_power_json(params, temp_client)
+
+    async def attempt(sent):
+        # Every upstream call waits for a slot from the global scheduler
+        async with upstream_scheduler.slot(POWER_CLIMATOLOGY_API_URL):
+            sent()
+            with upstream_in_flight.track(), span("POWER GET", **{"http.request.method": "GET", "url.full": POWER_CLIMATOLOGY_API_URL}):
+                started = time.perf_counter()
+                try:
+                    response = await client.get(POWER_CLIMATOLOGY_API_URL, params=params)
+                except Exception as e:
+                    _record_attempt(type(e).__name__, started)
+                    raise
+                set_attribute("http.response.status_code", response.status_code)
+        _record_attempt(str(response.status_code), started)
+        response.raise_for_status()
+        return response.json()
+
+    # No hedging while POWER requests are queued: the hedge would just queue too
+    return await power_resilience.call(attempt, can_hedge=lambda: not upstream_scheduler.busy(POWER_CLIMATOLOGY_API_URL))
+
+
+def _record_lookup(source: str):
+    # Where a climatology lookup was served from: metrics, and the current trace span
+    climatology_lookups.inc(source=source)
+    set_attribute("atmo.climatology.source", source)
+
+
+def _record_attempt(outcome: str, started: float):
+    # Hedged attempts that lose the race are cancelled and not recorded
+    upstream_requests.inc(outcome=outcome)
+    upstream_request_duration.observe(time.perf_counter() - started, outcome=outcome)
+
+
+async def fetch_climatology(lat: float, lon: float, client: Optional[httpx.AsyncClient] = None) -> dict:
     """
-    # We now request all the parameters needed for our advanced scores
-    parameters = [
-        "T2M", "T2M_MAX", "T2M_MIN",       # Temperature (Avg, Max, Min)
-        "WS10M", "WS10M_MAX",              # Wind Speed (Avg, Max)
-        "RH2M",                           # Relative Humidity
-        "PRECTOTCORR",                    # Precipitation
-        "ALLSKY_SFC_SW_DWN", "KT"          # All Sky Insolation and Clearness Index (for sunlight)
-    ]
+    Returns the raw POWER climatology payload (all of PARAMETERS) for a point, from the
+    on-disk cache when its grid cell has been fetched before, otherwise from the API.
+    If upstream fails, an expired cache entry is served when one exists; otherwise the
+    error is raised.
+    """
+    data, _ = await _fetch_climatology(lat, lon, client)
+    return data
+
+
+async def _fetch_climatology(lat: float, lon: float, client):
+    # fetch_climatology, also returning where the payload came from ("disk", "stale" or "api")
+    cache = get_disk_cache()
+    key = (cell_key(lat, lon), CLIMATOLOGY_PARAMS_KEY)
+    data = cache.get(*key) if cache is not None else None
+    if data is not None:
+        _record_lookup("disk")
+        return data, "disk"
 
     params = {
         "latitude": lat,
         "longitude": lon,
         "community": "RE", # Renewable Energy community has a good set of parameters
-        "parameters": ",".join(parameters),
+        "parameters": ",".join(PARAMETERS),
         "format": "JSON",
         "header": "false", # We don't need the metadata header in the response
         "api_key": NASA_API_KEY
     }
+    try:
+        with stage("fetch"):
+            data = await _fetch_power_json(params, client)
+    except Exception:
+        # Upstream is failing: an expired cache entry beats no answer at all
+        stale = cache.get(*key, allow_stale=True) if cache is not None else None
+        if stale is None:
+            raise
+        _record_lookup("stale")
+        return stale, "stale"
+    _record_lookup("api")
+
+    # Only cache payloads that actually carry parameter data
+    if cache is not None and data.get("properties", {}).get("parameter"):
+        cache.put(*key, data)
+    return data, "api"
+
+
+# --- Canonical Climatology Record ---
+
+@dataclass
+class ClimatologyRecord:
+    """
+    Everything known about one POWER grid cell: the superset of parameters every
+    endpoint needs, as a (12,) structured array (see scoring.py), plus the 366-row
+    day-of-year table interpolated from it when the record is built. All endpoints
+    derive their results from this one record, so one fetch and one cache entry
+    serve analysis, profile suggestions and anything built later.
+    """
+    cell: tuple             # (lat_idx, lon_idx) on the POWER grid
+    climatology: np.ndarray # (12,) CLIMATOLOGY_DTYPE, NaN where missing
+    location: str = "Unknown Location"
+    source: str = "api"     # "store", "api" or "cache" (the SQLite disk cache, fresh or stale)
+    daily: np.ndarray = field(init=False, repr=False) # (366,) CLIMATOLOGY_DTYPE
+
+    def __post_init__(self):
+        self.daily = daily_climatology(self.climatology)
+
+    def month(self, month: int) -> np.ndarray:
+        """The (1,) conditions row for a month (1-12)."""
+        return select_month(self.climatology, month)
+
+    def day(self, month: int, day: int) -> np.ndarray:
+        """The (1,) conditions row for a calendar date, from the day-of-year table."""
+        return self.daily[day_of_year([month], [day])]
+
+    @property
+    def nbytes(self) -> int:
+        return self.climatology.nbytes + self.daily.nbytes
+
+
+async def load_climatology(lat: float, lon: float, client: Optional[httpx.AsyncClient] = None) -> ClimatologyRecord:
+    """
+    Returns the ClimatologyRecord for the grid cell containing a point. Served from
+    the in-process LRU, then from the offline grid store when it covers the point,
+    and otherwise fetched via fetch_climatology; either way the record is kept in
+    the LRU, and concurrent misses for the same cell share a single load.
+    """
+    cell = snap_to_cell(lat, lon)
+    # One span per grid cell load, i.e. per sample task of a batch or polygon
+    with span("load_climatology", **{"atmo.cell.lat_idx": cell[0], "atmo.cell.lon_idx": cell[1]}):
+        return await _load_record(cell, lat, lon, client)
+
+
+async def _load_record(cell: tuple, lat: float, lon: float, client) -> ClimatologyRecord:
+    cached = memory_cache.get(cell)
+    if cached is not None:
+        _record_lookup("memory")
+        return cached
+
+    store = get_grid_store()
+    if store is not None:
+        climatology = store.lookup(lat, lon)
+        if climatology is not None:
+            _record_lookup("store")
+            with stage("parse"):
+                record = ClimatologyRecord(cell, climatology, location=_cached_location(lat, lon), source="store")
+            memory_cache.put(cell, record, record.nbytes + RECORD_OVERHEAD_BYTES)
+            return record
 
+    async def load():
+        data, source = await _fetch_climatology(lat, lon, client)
+        raw_params = data.get("properties", {}).get("parameter", {})
+        with stage("parse"):
+            record = ClimatologyRecord(
+                cell,
+                climatology_from_power(raw_params),
+                location=_location_name(data),
+                source="api" if source == "api" else "cache",
+            )
+        if raw_params:
+            memory_cache.put(cell, record, record.nbytes + RECORD_OVERHEAD_BYTES)
+        return record
+
+    return await fetch_flights.do(cell, load)
+
+
+def _location_name(data: dict) -> str:
+    return data.get("header", {}).get("title", "Unknown Location")
+
+
+def _cached_location(lat: float, lon: float) -> str:
+    # The grid store holds no names: reuse the one from the cell's POWER payload, if
+    # it was ever fetched (even past its TTL, a name doesn't go stale)
+    cache = get_disk_cache()
+    data = cache.get(cell_key(lat, lon), CLIMATOLOGY_PARAMS_KEY, allow_stale=True) if cache is not None else None
+    return _location_name(data) if data is not None else "Unknown Location"
+
+
+# --- Main Service Function ---
+
+async def get_climatological_analysis(lat: float, lon: float, month: int, day: int, profile, weights, client: Optional[httpx.AsyncClient] = None):
+    """
+    Fetches and analyzes a full suite of climatological data from the NASA POWER API
+    to generate a complete "Atmospheric Signature". Pass the app's shared `client`
+    to reuse pooled connections. Conditions are read for the exact date from the
+    record's day-of-year table. When the MERRA-2 probability table covers the point,
+    rain chance and percent_meet_profile become empirical probabilities for the
+    date (see probability_table.py). The scoring itself lives in scoring.py.
+    """
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(POWER_CLIMATOLOGY_API_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
+        record = await load_climatology(lat, lon, client)
     except Exception as e:
         return {"error": f"Failed to fetch data from NASA POWER API: {e}"}
 
     # --- Process the Fetched Data ---
     try:
-        # Extract the data for the specific month from the response
-        month_key = datetime(2000, month, 1).strftime('%b').upper()
-        raw_params = data.get("properties", {}).get("parameter", {})
-        
-        # --- 1. Temperature Analysis (with safe access) ---
-        temp_avg = raw_params.get("T2M", {}).get(month_key, -999)
-        if temp_avg < -900: # -999 is the POWER API's code for missing data
+        conditions = record.day(month, day)
+        if np.isnan(conditions["T2M"][0]):
             raise KeyError("Core temperature data (T2M) is missing from the API response for this location.")
-        temp_max = raw_params.get("T2M_MAX", {}).get(month_key, temp_avg)
-        temp_min = raw_params.get("T2M_MIN", {}).get(month_key, temp_avg)
-        temp_in_comfort = profile.temp_min <= temp_avg <= profile.temp_max
-
-        # --- 2. Wind Analysis (with safe access) ---
-        wind_avg = raw_params.get("WS10M", {}).get(month_key, 0)
-        wind_max = raw_params.get("WS10M_MAX", {}).get(month_key, wind_avg)
-        wind_in_comfort = wind_avg <= profile.wind_max
-        
-        # --- 3. Humidity Analysis (with safe access) ---
-        humidity_avg = raw_params.get("RH2M", {}).get(month_key, 50) # Default to 50%
-        humidity_in_comfort = humidity_avg <= profile.humidity_max
-        
-        # --- 4. Precipitation Analysis (with safe access) ---
-        precip_avg_daily = raw_params.get("PRECTOTCORR", {}).get(month_key, 0)
-        # Heuristic: A simple but effective model to estimate the chance of a rainy day.
-        rain_probability = min(precip_avg_daily * 15, 100)
-        rain_in_comfort = rain_probability <= profile.rain_chance_max
-
-        # --- 5. "Wow" Factor Specialty Score Calculations (with safe access) ---
-        
-        # Uncomfortable Heat & Humidity Score
-        heat_index_avg = calculate_heat_index(temp_avg, humidity_avg)
-        uncomfortable_chance = 0
-        if temp_avg > 27: # Only calculate if it's already warm
-             uncomfortable_chance = min((heat_index_avg - 27) * 10, 100)
-        
-        # Golden Hour & Sunlight Score
-        # THIS IS THE FIX: Use .get() with a default value for robustness.
-        clearness_index = raw_params.get("KT", {}).get(month_key, 0.5) # Default to 0.5 (partly cloudy) if missing
-        golden_hour_score = round(clearness_index * 10) # Convert to a simple 1-10 score
-        sunny_day_likelihood = round(clearness_index * 100)
-
-        # --- 6. Calculate Final Weighted Overall Score ---
-        scores = {
-            "temperature": 1 if temp_in_comfort else 0,
-            "wind": 1 if wind_in_comfort else 0,
-            "rain": 1 if rain_in_comfort else 0,
-            "humidity": 1 if humidity_in_comfort else 0,
-        }
-        
-        total_weight = sum(weights.dict().values())
-        weighted_score = sum(scores[key] * weights.dict()[key] for key in scores)
-        overall_score = round((weighted_score / total_weight) * 100) if total_weight > 0 else 0
-
-        # --- 7. Construct the Final Rich JSON Response ---
-        # Determine final verdict for a single point (all primary metrics meet profile?)
-        def sample_meets_point(atm):
-            t = atm.get('temperature', {}).get('meets_profile')
-            w = atm.get('wind', {}).get('meets_profile')
-            p = atm.get('precipitation', {}).get('meets_profile')
-            h = atm.get('humidity', {}).get('meets_profile')
-            return bool(t and w and p and h)
-
-        percent_meet_profile = 100 if sample_meets_point({
-            'temperature': {'meets_profile': temp_in_comfort},
-            'wind': {'meets_profile': wind_in_comfort},
-            'precipitation': {'meets_profile': rain_in_comfort},
-            'humidity': {'meets_profile': humidity_in_comfort}
-        }) else 0
-
-        # Include per-sample (single point) details for frontend consistency
-        samples_info = [{
-            'lat': lat,
-            'lon': lon,
-            'overall_score': overall_score,
-            'atmospheric_signature': {
-                'temperature': {'avg': round(temp_avg, 1), 'meets_profile': temp_in_comfort},
-                'wind': {'avg': round(wind_avg, 1), 'meets_profile': wind_in_comfort},
-                'humidity': {'avg': round(humidity_avg, 1), 'meets_profile': humidity_in_comfort},
-                'precipitation': {'estimated_daily_chance': round(rain_probability, 1), 'meets_profile': rain_in_comfort},
-            },
-            'specialty_scores': {
-                'uncomfortable_heat_chance': round(max(0, uncomfortable_chance)),
-                'golden_hour_quality': golden_hour_score,
-                'outdoor_activity_index': round((overall_score + sunny_day_likelihood) / 2)
-            }
-        }]
 
-        return {
-            "overall_score": overall_score,
-            "location": data.get("header", {}).get("title", "Unknown Location"),
-            "atmospheric_signature": {
-                "temperature": {
-                    "avg": round(temp_avg, 1), "min": round(temp_min, 1), "max": round(temp_max, 1),
-                    "meets_profile": temp_in_comfort, "units": "°C"
-                },
-                "wind": {
-                    "avg": round(wind_avg, 1), "max": round(wind_max, 1),
-                    "meets_profile": wind_in_comfort, "units": "m/s"
-                },
-                "humidity": {
-                    "avg": round(humidity_avg, 1),
-                    "meets_profile": humidity_in_comfort, "units": "%"
-                },
-                "precipitation": {
-                    "avg_daily_amount": round(precip_avg_daily, 2), # mm/day
-                    "estimated_daily_chance": round(rain_probability, 1),
-                    "meets_profile": rain_in_comfort, "units": {"amount": "mm/day", "chance": "%"}
-                },
-                "sunlight": {
-                    "sunny_day_likelihood": sunny_day_likelihood,
-                    "clearness_index": clearness_index, "units": "% likelihood"
-                }
-            },
-            "specialty_scores": {
-                "uncomfortable_heat_chance": round(max(0, uncomfortable_chance)),
-                "golden_hour_quality": golden_hour_score,
-                # A simple blend of the main score and the likelihood of sun
-                "outdoor_activity_index": round((overall_score + sunny_day_likelihood) / 2)
-            }
-            ,
-            "final_verdict": {
-                "percent_meet_profile": percent_meet_profile,
-                "samples_evaluated": 1
-            },
-            "samples": samples_info
-        }
+        table = get_probability_table()
+        with stage("probabilities"):
+            probabilities = table.probabilities(lat, lon, month, day, profile) if table else None
+
+        with stage("score"):
+            scored = score_conditions(conditions, profile, weights, probabilities)
+            signature = build_signatures(scored, [lat], [lon], record.location)[0]
+        if probabilities:
+            signature["probabilities"] = probabilities
+        return signature
 
     except Exception as e:
         return {"error": f"Failed to process data: {e}"}
 
 
-async def get_profile_from_climatology(lat: float, lon: float, month: int, day: int):
+async def get_calendar_ranking(lat: float, lon: float, profile, weights, top: int = 5, resolution: str = "month",
+                               client: Optional[httpx.AsyncClient] = None):
     """
-    Fetches climatology for the given location and month, and returns a suggested
-    comfort profile (ranges/thresholds) and default weights based on the typical
-    conditions for that month.
+    Scores every month of the year for one location in a single vectorized pass over
+    its climatology record and ranks them, so finding the best time to visit costs
+    one lookup instead of one /api/analyze/point call per month. With resolution
+    "day" the 366 rows of the record's day-of-year table are ranked instead. Returns
+    the whole calendar in chronological order (each entry carrying its rank) plus
+    the `top` best entries.
     """
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "community": "RE",
-        "parameters": "T2M,T2M_MAX,T2M_MIN,WS10M,WS10M_MAX,RH2M,PRECTOTCORR,KT",
-        "format": "JSON",
-        "header": "false",
-        "api_key": NASA_API_KEY
-    }
+    try:
+        record = await load_climatology(lat, lon, client)
+    except Exception as e:
+        return {"error": f"Failed to fetch data from NASA POWER API: {e}"}
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(POWER_CLIMATOLOGY_API_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
+        if resolution == "day":
+            conditions, days = record.daily, np.arange(DAYS_IN_YEAR)
+            months = DAY_MONTH_IDX + 1
+            dates = [{"month": int(m), "day": int(d - MONTH_START[m - 1] + 1)} for m, d in zip(months, days)]
+        else:
+            # Monthly rows take the table's probabilities for mid-month
+            conditions, days = record.climatology, day_of_year(np.arange(1, 13), 15)
+            dates = [{"month": m} for m in range(1, 13)]
+
+        with stage("probabilities"):
+            probabilities = empirical_probabilities(record.cell[0], record.cell[1], days, profile)
+        with stage("score"):
+            scored = score_conditions(conditions, profile, weights, probabilities)
+            order = rank_conditions(scored, profile)
+        if len(order) == 0:
+            raise KeyError("Core temperature data (T2M) is missing from the API response for this location.")
+
+        ranks = np.zeros(len(conditions), dtype=np.int64)
+        ranks[order] = np.arange(1, len(order) + 1)
+        c = {k: v.tolist() for k, v in scored.items()}
+        calendar = []
+        for i, rank in enumerate(ranks.tolist()):
+            entry = {**dates[i], "rank": rank or None}
+            if c["valid"][i]:
+                entry.update({
+                    "overall_score": int(c["overall_score"][i]),
+                    "meets_profile": c["all_in_comfort"][i],
+                    "temperature_avg": round(c["temp_avg"][i], 1),
+                    "wind_avg": round(c["wind_avg"][i], 1),
+                    "humidity_avg": round(c["humidity_avg"][i], 1),
+                    "rain_chance": round(c["rain_probability"][i], 1),
+                    "sunny_day_likelihood": int(c["sunny_day_likelihood"][i]),
+                })
+            calendar.append(entry)
+
+        return {
+            "location": record.location,
+            "resolution": resolution,
+            "best": [calendar[i] for i in order[:top].tolist()],
+            "calendar": calendar,
+        }
+
     except Exception as e:
-        return {"error": f"Failed to fetch climatology data: {e}"}
+        return {"error": f"Failed to process data: {e}"}
 
+
+async def get_batch_analysis(points: list, profile, weights, client: Optional[httpx.AsyncClient] = None):
+    """
+    Analyzes many (lat, lon, month, day) points that share one profile and weights.
+    Points are deduplicated by POWER grid cell, cells missing from the grid store are
+    fetched with bounded concurrency, and everything is scored in a single vectorized
+    pass over each point's day-of-year conditions. Yields one {"index", "result"} or {"index", "error"} dict per point, in input
+    order, building the response dicts chunk by chunk so callers can stream them out.
+    """
+    # --- 1. Deduplicate by grid cell ---
+    cells = {}
+    point_cells = []
+    for lat, lon, _, _ in points:
+        cell = snap_to_cell(lat, lon)
+        cells.setdefault(cell, (lat, lon))
+        point_cells.append(cell)
+
+    # --- 2. Fetch each distinct cell once ---
+    semaphore = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+    loaded = await asyncio.gather(*(_load_cell(cell, lat, lon, semaphore, client) for cell, (lat, lon) in cells.items()))
+    cell_results = {cell: rest for cell, *rest in loaded}
+
+    # --- 3. Score every point in one pass ---
+    days = day_of_year(
+        np.array([p[2] for p in points], dtype=np.int64),
+        np.array([p[3] for p in points], dtype=np.int64),
+    )
+    conditions = np.full(len(points), np.nan, dtype=CLIMATOLOGY_DTYPE)
+    locations = []
+    errors = []
+    for i, cell in enumerate(point_cells):
+        cell_daily, location, error = cell_results[cell]
+        if cell_daily is not None:
+            conditions[i] = cell_daily[days[i]]
+        locations.append(location)
+        errors.append(error)
+
+    with stage("probabilities"):
+        cell_idx = np.array(point_cells, dtype=np.int64).reshape(-1, 2)
+        probabilities = empirical_probabilities(cell_idx[:, 0], cell_idx[:, 1], days, profile)
+    with stage("score"):
+        scored = score_conditions(conditions, profile, weights, probabilities)
+
+    # --- 4. Build the response dicts chunk by chunk ---
+    for start in range(0, len(points), BATCH_CHUNK_SIZE):
+        stop = min(start + BATCH_CHUNK_SIZE, len(points))
+        chunk = {k: v[start:stop] for k, v in scored.items()}
+        with stage("build"):
+            signatures = build_signatures(
+                chunk,
+                [p[0] for p in points[start:stop]],
+                [p[1] for p in points[start:stop]],
+                locations[start:stop],
+            )
+        for offset, signature in enumerate(signatures):
+            i = start + offset
+            yield _result_row(i, signature, errors[i])
+
+
+async def stream_batch_analysis(points: list, profile, weights, client: Optional[httpx.AsyncClient] = None):
+    """
+    Same contract as get_batch_analysis, but yields rows in completion order: as soon
+    as one grid cell's climatology arrives, every point in that cell is scored and
+    yielded, so the slowest upstream fetch no longer delays the first results.
+    If the consumer stops iterating early, cells still waiting for a fetch slot are
+    cancelled; fetches already running are shielded and complete into the cache.
+    """
+    cells = {}
+    groups = {}
+    for i, (lat, lon, _, _) in enumerate(points):
+        cell = snap_to_cell(lat, lon)
+        cells.setdefault(cell, (lat, lon))
+        groups.setdefault(cell, []).append(i)
+
+    semaphore = asyncio.Semaphore(BATCH_FETCH_CONCURRENCY)
+    tasks = [asyncio.ensure_future(_load_cell(cell, lat, lon, semaphore, client)) for cell, (lat, lon) in cells.items()]
     try:
-        month_key = datetime(2000, month, 1).strftime('%b').upper()
-        raw = data.get("properties", {}).get("parameter", {})
+        for next_done in asyncio.as_completed(tasks):
+            cell, daily, location, error = await next_done
+            indices = groups[cell]
+            if error:
+                for i in indices:
+                    yield _result_row(i, None, error)
+                continue
 
-        temp_avg = raw.get("T2M", {}).get(month_key, None)
-        temp_min = raw.get("T2M_MIN", {}).get(month_key, temp_avg if temp_avg is not None else None)
-        temp_max = raw.get("T2M_MAX", {}).get(month_key, temp_avg if temp_avg is not None else None)
+            months = np.array([points[i][2] for i in indices], dtype=np.int64)
+            days = np.array([points[i][3] for i in indices], dtype=np.int64)
+            rows = day_of_year(months, days)
+            conditions = daily[rows]
+            with stage("probabilities"):
+                probabilities = empirical_probabilities(cell[0], cell[1], rows, profile)
+            with stage("score"):
+                scored = score_conditions(conditions, profile, weights, probabilities)
+            with stage("build"):
+                signatures = build_signatures(scored, [points[i][0] for i in indices], [points[i][1] for i in indices], location)
+            for i, signature in zip(indices, signatures):
+                yield _result_row(i, signature, None)
+    finally:
+        for task in tasks:
+            task.cancel()
 
-        wind_avg = raw.get("WS10M", {}).get(month_key, None)
-        wind_max = raw.get("WS10M_MAX", {}).get(month_key, wind_avg if wind_avg is not None else None)
 
-        humidity_avg = raw.get("RH2M", {}).get(month_key, None)
+async def _load_cell(cell, lat: float, lon: float, semaphore: asyncio.Semaphore, client):
+    # Returns (cell, daily, location, error) without raising, for gather/as_completed
+    async with semaphore:
+        try:
+            record = await load_climatology(lat, lon, client)
+            return cell, record.daily, record.location, None
+        except Exception as e:
+            return cell, None, None, f"Failed to fetch data from NASA POWER API: {e}"
 
-        precip_avg = raw.get("PRECTOTCORR", {}).get(month_key, 0)
-        rain_probability = min(precip_avg * 15, 100)
+
+def _result_row(index: int, signature, error):
+    if error:
+        return {"index": index, "error": error}
+    if signature is None:
+        return {"index": index, "error": "Core temperature data (T2M) is missing for this location."}
+    return {"index": index, "result": signature}
+
+
+async def get_profile_from_climatology(lat: float, lon: float, month: int, day: int, client: Optional[httpx.AsyncClient] = None):
+    """
+    Returns a suggested comfort profile (ranges/thresholds) and default weights based
+    on the typical conditions for the given location and date. Uses the same
+    ClimatologyRecord (and cache entry) as get_climatological_analysis.
+    """
+    try:
+        record = await load_climatology(lat, lon, client)
+    except Exception as e:
+        return {"error": f"Failed to fetch climatology data: {e}"}
+
+    try:
+        conditions = record.day(month, day)[0]
+
+        temp_avg = float(conditions["T2M"])
+        wind_avg = float(conditions["WS10M"])
+        humidity_avg = float(conditions["RH2M"])
+        precip_avg = 0.0 if np.isnan(conditions["PRECTOTCORR"]) else float(conditions["PRECTOTCORR"])
+        rain_probability = float(estimate_rain_probability(precip_avg))
 
         # Build a reasonable suggested profile around climatology
-        if temp_avg is None:
+        if np.isnan(temp_avg):
             return {"error": "Missing temperature climatology for this location/month"}
 
-        # Suggest a comfortable band +/- 4C around the monthly mean
+        # Suggest a comfortable band +/- 4C around the mean for the date
         suggested = {
             "temp_min": int(round(temp_avg - 4)),
             "temp_max": int(round(temp_avg + 4)),
-            "wind_max": int(round(wind_avg if wind_avg is not None else 10)),
+            "wind_max": int(round(10 if np.isnan(wind_avg) else wind_avg)),
             "rain_chance_max": int(round(min(100, max(5, rain_probability)))),
-            "humidity_max": int(round(humidity_avg if humidity_avg is not None else 75)),
+            "humidity_max": int(round(75 if np.isnan(humidity_avg) else humidity_avg)),
         }
 
         # Default weights: emphasize rain and temperature slightly
@@ -257,8 +500,7 @@ async def get_profile_from_climatology(lat: float, lon: float, month: int, day:
             "humidity": 1.0,
         }
 
-        return {"profile": suggested, "weights": default_weights, "location": data.get("header", {}).get("title", "Unknown Location")}
+        return {"profile": suggested, "weights": default_weights, "location": record.location}
 
     except Exception as e:
         return {"error": f"Failed to construct profile: {e}"}
-
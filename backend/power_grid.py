@@ -0,0 +1,36 @@
+"""
+Helpers for the NASA POWER native grid.
+
+POWER's meteorological parameters come from MERRA-2, which sits on a
+0.5° latitude x 0.625° longitude grid. Every lat/lon inside one grid cell
+returns identical climatology, so the cell (not the raw coordinate) is the
+natural key for caching and deduplicating upstream requests.
+"""
+
+# --- Grid Definition ---
+LAT_STEP = 0.5
+LON_STEP = 0.625
+N_LAT = 361   # cell centres at -90, -89.5, ..., 90
+N_LON = 576   # cell centres at -180, -179.375, ..., 179.375
+
+
+def snap_to_cell(lat: float, lon: float):
+    """
+    Returns the (lat_idx, lon_idx) of the grid cell whose centre is nearest
+    to the given point. Longitudes wrap around the antimeridian.
+    """
+    lat_idx = int(round((lat + 90.0) / LAT_STEP))
+    lat_idx = min(max(lat_idx, 0), N_LAT - 1)
+    lon_idx = int(round((lon + 180.0) / LON_STEP)) % N_LON
+    return lat_idx, lon_idx
+
+
+def cell_center(lat_idx: int, lon_idx: int):
+    """Returns the (lat, lon) centre of a grid cell."""
+    return -90.0 + lat_idx * LAT_STEP, -180.0 + lon_idx * LON_STEP
+
+
+def cell_key(lat: float, lon: float) -> str:
+    """A compact string key ("lat_idx:lon_idx") for the cell containing a point."""
+    lat_idx, lon_idx = snap_to_cell(lat, lon)
+    return f"{lat_idx}:{lon_idx}"
@@ -0,0 +1,160 @@
+"""
+Local stand-in for the NASA POWER climatology point API.
+
+Serves deterministic, plausible climatology for any lat/lon with configurable
+latency and failure behaviour, so the resilience layer and the benchmarks can run
+without touching NASA. Run it and point the backend at it:
+
+    uvicorn power_stub:app --port 8001
+    POWER_CLIMATOLOGY_API_URL=http://127.0.0.1:8001/api/temporal/climatology/point uvicorn main:app
+
+Behaviour can be changed at runtime with POST /stub/config (same keys as STUB_CONFIG),
+and GET /stub/stats reports how many upstream calls the stub has served.
+
+It also serves fake MERRA-2 files under /data/MERRA2/ (deterministic bytes with an
+HDF5 signature, HTTP Range support, optional dropped connections and HTML login
+pages), so the bulk downloader in download_data.py can be exercised locally:
+
+    python download_data.py --start 2020-08-01 --end 2020-08-31 \\
+        --base-url http://127.0.0.1:8001/data/MERRA2/M2T1NXSLV.5.12.4/
+"""
+import os
+import math
+import random
+import asyncio
+import hashlib
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+MONTH_KEYS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+
+# --- Configuration ---
+STUB_CONFIG = {
+    "latency_ms": float(os.getenv("STUB_LATENCY_MS", "50")),       # median latency
+    "latency_sigma": float(os.getenv("STUB_LATENCY_SIGMA", "0.3")), # log-normal spread
+    "slow_rate": float(os.getenv("STUB_SLOW_RATE", "0")),           # share of very slow responses
+    "slow_ms": float(os.getenv("STUB_SLOW_MS", "5000")),
+    "failure_rate": float(os.getenv("STUB_FAILURE_RATE", "0")),     # share of 503 responses
+    "seed": int(os.getenv("STUB_SEED", "0")),
+    "file_kb": int(os.getenv("STUB_FILE_KB", "512")),               # size of each fake MERRA-2 file
+    "truncate_rate": float(os.getenv("STUB_TRUNCATE_RATE", "0")),   # share of file downloads cut off halfway
+    "login_rate": float(os.getenv("STUB_LOGIN_RATE", "0")),         # share answered with an HTML login page (bad token)
+}
+
+stats = {"calls": 0, "failures": 0, "slow": 0, "file_requests": 0, "range_requests": 0, "truncated": 0, "login_pages": 0}
+_rng = random.Random(STUB_CONFIG["seed"])
+
+app = FastAPI(title="NASA POWER stub")
+
+
+def climatology_payload(lat: float, lon: float, parameters: list) -> dict:
+    """Builds a POWER-shaped climatology response from simple smooth functions of lat/lon."""
+    hemisphere = 1 if lat >= 0 else -1
+    base_temp = 28 - 0.45 * abs(lat)
+    values = {}
+    for i, month in enumerate(MONTH_KEYS):
+        season = hemisphere * math.sin((i - 3) / 12 * 2 * math.pi) # peaks in Jul (north)
+        t2m = base_temp + (3 + abs(lat) / 6) * season
+        values[month] = {
+            "T2M": t2m,
+            "T2M_MAX": t2m + 5.5,
+            "T2M_MIN": t2m - 5.5,
+            "WS10M": 3 + 2 * abs(math.sin(math.radians(lon))) + 0.5 * season,
+            "WS10M_MAX": 9 + 3 * abs(math.sin(math.radians(lon))),
+            "RH2M": 65 + 15 * math.cos(math.radians(lat * 2)) * (0.5 + 0.5 * season),
+            "PRECTOTCORR": max(0.0, 2.5 + 3 * math.cos(math.radians(lat * 3)) * season),
+            "ALLSKY_SFC_SW_DWN": 5 + 1.5 * season,
+            "KT": 0.55 - 0.1 * season * math.cos(math.radians(lat)),
+        }
+
+    parameter_block = {}
+    for name in parameters:
+        monthly = {m: round(values[m].get(name, 0.0), 2) for m in MONTH_KEYS}
+        monthly["ANN"] = round(sum(monthly.values()) / 12, 2)
+        parameter_block[name] = monthly
+
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat, 0]},
+        "properties": {"parameter": parameter_block},
+    }
+
+
+@app.get("/api/temporal/climatology/point")
+async def climatology_point(latitude: float, longitude: float, parameters: str = Query(...)):
+    stats["calls"] += 1
+    latency = STUB_CONFIG["latency_ms"] * math.exp(_rng.gauss(0, STUB_CONFIG["latency_sigma"]))
+    if _rng.random() < STUB_CONFIG["slow_rate"]:
+        stats["slow"] += 1
+        latency = STUB_CONFIG["slow_ms"]
+    await asyncio.sleep(latency / 1000)
+
+    if _rng.random() < STUB_CONFIG["failure_rate"]:
+        stats["failures"] += 1
+        return JSONResponse({"messages": ["Service temporarily unavailable (stub)"]}, status_code=503)
+    return climatology_payload(latitude, longitude, parameters.split(","))
+
+
+def merra_file_bytes(file_name: str) -> bytes:
+    """Deterministic content for a fake MERRA-2 file: the HDF5 signature, then seeded bytes."""
+    signature = b"\x89HDF\r\n\x1a\n"
+    seed = int.from_bytes(hashlib.sha256(file_name.encode()).digest()[:8], "big")
+    return signature + random.Random(seed).randbytes(STUB_CONFIG["file_kb"] * 1024 - len(signature))
+
+
+@app.get("/data/MERRA2/{collection}/{year}/{month}/{file_name}")
+async def merra_file(collection: str, year: str, month: str, file_name: str, request: Request):
+    stats["file_requests"] += 1
+    if _rng.random() < STUB_CONFIG["login_rate"]:
+        # What GES DISC serves (with a 200) when the Earthdata token is missing or wrong
+        stats["login_pages"] += 1
+        return Response("<!DOCTYPE html><html><body>Earthdata Login</body></html>", media_type="text/html")
+    body = merra_file_bytes(file_name)
+    total = len(body)
+
+    start = 0
+    range_header = request.headers.get("range", "")
+    if range_header.startswith("bytes="):
+        stats["range_requests"] += 1
+        start = int(range_header[len("bytes="):].split("-")[0] or 0)
+        if start >= total:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+
+    chunk = body[start:]
+    truncate = _rng.random() < STUB_CONFIG["truncate_rate"]
+    if truncate:
+        stats["truncated"] += 1
+
+    async def send():
+        # Declares the full length but, when truncating, drops the connection halfway
+        half = len(chunk) // 2
+        yield chunk[:half] if truncate else chunk
+        if truncate:
+            raise ConnectionError("stub: truncated transfer")
+
+    headers = {"Content-Length": str(len(chunk)), "Accept-Ranges": "bytes"}
+    if start:
+        headers["Content-Range"] = f"bytes {start}-{total - 1}/{total}"
+    return StreamingResponse(send(), status_code=206 if start else 200,
+                             media_type="application/octet-stream", headers=headers)
+
+
+@app.post("/stub/config")
+def update_config(config: dict):
+    global _rng
+    STUB_CONFIG.update({k: type(STUB_CONFIG[k])(v) for k, v in config.items() if k in STUB_CONFIG})
+    if "seed" in config:
+        _rng = random.Random(STUB_CONFIG["seed"])
+    return STUB_CONFIG
+
+
+@app.get("/stub/stats")
+def get_stats():
+    return stats
+
+
+@app.post("/stub/reset")
+def reset_stats():
+    for key in stats:
+        stats[key] = 0
+    return stats
@@ -0,0 +1,212 @@
+"""
+Empirical per-day probabilities from the MERRA-2 daily store.
+
+The climatology endpoints only know monthly means, so "rain chance" is a heuristic
+and "meets profile" is judged against averages. This table holds the actual daily
+history instead: for every grid cell of the ingested region and every day of the
+(leap) year, the daily values of TABLE_VARIABLES from every year, laid out
+lat x lon x day-of-year x year x variable in one float16 array. A query reads the
+days around the requested date from every year (a few hundred samples, independent
+of how many cells or months are stored) and counts how often the profile's
+conditions actually held, so any profile can be evaluated without rebuilding.
+Every endpoint that scores conditions passes the table's rain and all-conditions
+percentages to score_conditions (see `empirical_probabilities`), so a location and
+date get the same rain chance and verdict whichever endpoint asks.
+
+Build it from the store with `python build_probabilities.py`.
+"""
+import os
+import json
+import time
+import numpy as np
+from pathlib import Path
+from typing import Optional
+
+from power_grid import snap_to_cell
+from scoring import DAYS_IN_YEAR, day_of_year, _as_dict
+
+# --- Configuration ---
+PROBABILITY_TABLE_DIR = os.getenv("PROBABILITY_TABLE_DIR", "data/probability_table")
+WINDOW_DAYS = int(os.getenv("PROBABILITY_WINDOW_DAYS", "7")) # days either side of the date
+RAIN_DAY_MM = 1.0 # a day with at least this much precipitation counts as rainy
+LOOKUP_CHUNK = 1024 # cells per read in cell_probabilities, bounding the working set
+
+# Bump this whenever the on-disk layout changes
+TABLE_VERSION = 1
+DATA_FILE = "samples.npy"
+META_FILE = "meta.json"
+
+TABLE_VARIABLES = ("T2M", "WS10M", "RH2M", "PRECTOTCORR")
+_T, _WIND, _RH, _PRECIP = range(len(TABLE_VARIABLES))
+
+
+class ProbabilityTable:
+    """
+    Read access to the per-cell daily history, and the probability queries on it.
+    """
+
+    def __init__(self, directory: str, data: np.ndarray, meta: dict):
+        self.directory = directory
+        self.data = data
+        self.meta = meta
+        self.lat_start, self.lat_stop = meta["lat_idx"]
+        self.lon_start, self.lon_stop = meta["lon_idx"]
+
+    @classmethod
+    def open(cls, directory: str) -> "ProbabilityTable":
+        path = Path(directory)
+        meta = json.loads((path / META_FILE).read_text())
+        if meta.get("version") != TABLE_VERSION:
+            raise ValueError(f"Probability table version {meta.get('version')} is not supported (expected {TABLE_VERSION})")
+        # Memory-mapped: a query only touches the pages of one cell's window
+        return cls(directory, np.load(path / DATA_FILE, mmap_mode="r"), meta)
+
+    @classmethod
+    def create(cls, directory: str, lat_idx: slice, lon_idx: slice, first_year: int, years: int) -> "ProbabilityTable":
+        """Creates an empty (all-NaN) table on disk, written through a memory map."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        shape = (lat_idx.stop - lat_idx.start, lon_idx.stop - lon_idx.start, DAYS_IN_YEAR, years, len(TABLE_VARIABLES))
+        # Swapped in rather than truncated in place, as in GridStore.create
+        tmp = path / (DATA_FILE + ".tmp")
+        data = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float16, shape=shape)
+        data[:] = np.nan
+        data.flush()
+        os.replace(tmp, path / DATA_FILE)
+        meta = {
+            "version": TABLE_VERSION,
+            "variables": list(TABLE_VARIABLES),
+            "lat_idx": [lat_idx.start, lat_idx.stop],
+            "lon_idx": [lon_idx.start, lon_idx.stop],
+            "first_year": first_year,
+            "years": years,
+            "shape": list(shape),
+        }
+        return cls(directory, data, meta)
+
+    def save_meta(self):
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+        self.meta["created"] = time.time()
+        Path(self.directory, META_FILE).write_text(json.dumps(self.meta, indent=2))
+
+    # --- Reading ---
+
+    def samples(self, lat: float, lon: float, month: int, day: int) -> Optional[np.ndarray]:
+        """
+        The (K, len(TABLE_VARIABLES)) daily values within WINDOW_DAYS of a date, from
+        every year, for the cell containing a point. None when the cell isn't covered.
+        """
+        lat_idx, lon_idx = snap_to_cell(lat, lon)
+        if not (self.lat_start <= lat_idx < self.lat_stop and self.lon_start <= lon_idx < self.lon_stop):
+            return None
+        window = (day_of_year(month, day) + np.arange(-WINDOW_DAYS, WINDOW_DAYS + 1)) % DAYS_IN_YEAR
+        rows = self.data[lat_idx - self.lat_start, lon_idx - self.lon_start, window].astype(np.float32)
+        rows = rows.reshape(-1, len(TABLE_VARIABLES))
+        rows = rows[~np.isnan(rows[:, _T])] # 29 Feb in other years, and years not ingested
+        return rows if len(rows) else None
+
+    def probabilities(self, lat: float, lon: float, month: int, day: int, profile) -> Optional[dict]:
+        """
+        Empirical probabilities (in %) that a day around this date meets each of the
+        profile's conditions, and all of them at once. None when the cell isn't covered.
+        """
+        rows = self.samples(lat, lon, month, day)
+        if rows is None:
+            return None
+        summary = {k: float(v[0]) for k, v in _summarize(rows[None], profile).items()}
+
+        first_year = self.meta["first_year"]
+        return {
+            "temp_in_range": summary["temp_in_range"],
+            "wind_over_max": summary["wind_over_max"],
+            "humidity_over_max": summary["humidity_over_max"],
+            "rain": None if np.isnan(summary["rain"]) else summary["rain"],
+            "all_conditions": summary["all_conditions"],
+            "samples": int(len(rows)),
+            "window_days": 2 * WINDOW_DAYS + 1,
+            "years": [first_year, first_year + self.meta["years"] - 1],
+            "source": "MERRA-2 daily history",
+        }
+
+    def cell_probabilities(self, lat_idx, lon_idx, days, profile) -> dict:
+        """
+        Vectorized form for many (grid cell, day-of-year) pairs, given as broadcastable
+        index arrays: the "rain" and "all_conditions" percentages as flat (N,) arrays,
+        NaN where the table doesn't cover the cell, ready for score_conditions.
+        """
+        lat_idx, lon_idx, days = (a.ravel() for a in np.broadcast_arrays(lat_idx, lon_idx, days))
+        rain = np.full(len(days), np.nan)
+        all_conditions = np.full(len(days), np.nan)
+
+        covered = ((self.lat_start <= lat_idx) & (lat_idx < self.lat_stop) &
+                   (self.lon_start <= lon_idx) & (lon_idx < self.lon_stop))
+        offsets = np.arange(-WINDOW_DAYS, WINDOW_DAYS + 1)
+        indices = np.flatnonzero(covered)
+        for start in range(0, len(indices), LOOKUP_CHUNK):
+            chunk = indices[start:start + LOOKUP_CHUNK]
+            window = (days[chunk, None] + offsets) % DAYS_IN_YEAR
+            rows = self.data[lat_idx[chunk, None] - self.lat_start, lon_idx[chunk, None] - self.lon_start, window]
+            summary = _summarize(rows.astype(np.float32).reshape(len(chunk), -1, len(TABLE_VARIABLES)), profile)
+            rain[chunk] = summary["rain"]
+            all_conditions[chunk] = summary["all_conditions"]
+        return {"rain": rain, "all_conditions": all_conditions}
+
+
+def _summarize(rows: np.ndarray, profile) -> dict:
+    """
+    Per-row percentages over (N, K, len(TABLE_VARIABLES)) daily samples, ignoring
+    missing days. NaN where a row has no samples (or, for rain, no precipitation).
+    """
+    profile = _as_dict(profile)
+    valid = ~np.isnan(rows[..., _T]) # 29 Feb in other years, and years not ingested
+    temp_ok = valid & (profile["temp_min"] <= rows[..., _T]) & (rows[..., _T] <= profile["temp_max"])
+    wind_over = valid & (rows[..., _WIND] > profile["wind_max"])
+    humidity_over = valid & (rows[..., _RH] > profile["humidity_max"])
+    all_ok = temp_ok & ~wind_over & ~humidity_over
+
+    # Precipitation only exists for days whose flux file was ingested; where it
+    # does, "all conditions" also requires a dry day
+    has_precip = valid & ~np.isnan(rows[..., _PRECIP])
+    rainy = has_precip & (rows[..., _PRECIP] >= RAIN_DAY_MM)
+    n_valid, n_precip = valid.sum(axis=-1), has_precip.sum(axis=-1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        def percent(flags, n):
+            return np.round(flags.sum(axis=-1) / n * 100, 1) # NaN where n == 0
+
+        return {
+            "temp_in_range": percent(temp_ok, n_valid),
+            "wind_over_max": percent(wind_over, n_valid),
+            "humidity_over_max": percent(humidity_over, n_valid),
+            "rain": percent(rainy, n_precip),
+            "all_conditions": np.where(n_precip > 0, percent(all_ok & has_precip & ~rainy, n_precip), percent(all_ok, n_valid)),
+        }
+
+
+_probability_table: Optional[ProbabilityTable] = None
+_probability_table_checked = False
+
+
+def get_probability_table() -> Optional[ProbabilityTable]:
+    """
+    Returns the process-wide probability table, opening it on first use, or None
+    when none has been built at PROBABILITY_TABLE_DIR.
+    """
+    global _probability_table, _probability_table_checked
+    if not _probability_table_checked:
+        _probability_table_checked = True
+        if PROBABILITY_TABLE_DIR and Path(PROBABILITY_TABLE_DIR, META_FILE).exists():
+            _probability_table = ProbabilityTable.open(PROBABILITY_TABLE_DIR)
+    return _probability_table
+
+
+def empirical_probabilities(lat_idx, lon_idx, days, profile) -> Optional[dict]:
+    """
+    The probability table's percentages for (grid cell, day-of-year) index arrays,
+    for score_conditions' `probabilities` argument. None when no table is built.
+    """
+    table = get_probability_table()
+    if table is None:
+        return None
+    return table.cell_probabilities(np.asarray(lat_idx), np.asarray(lon_idx), np.asarray(days), profile)
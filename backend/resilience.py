@@ -0,0 +1,236 @@
+"""
+Resilience layer for upstream NASA POWER calls.
+
+Wraps a single request attempt with:
+- retries with jittered exponential backoff for transient failures (timeouts,
+  connection errors, 429 and 5xx responses),
+- hedging: when an attempt is slower than the recent latency percentile (timed
+  from when it leaves the scheduler queue), a duplicate is fired and whichever
+  finishes first wins,
+- a circuit breaker that fails fast while upstream is unhealthy, so callers can
+  fall back to cached data instead of waiting out timeouts.
+"""
+import os
+import time
+import random
+import asyncio
+import httpx
+from collections import deque
+
+# --- Configuration ---
+RETRY_ATTEMPTS = int(os.getenv("POWER_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("POWER_RETRY_BASE_DELAY", "0.25"))
+RETRY_MAX_DELAY = float(os.getenv("POWER_RETRY_MAX_DELAY", "4"))
+HEDGE_PERCENTILE = float(os.getenv("POWER_HEDGE_PERCENTILE", "95"))  # 0 disables hedging
+HEDGE_MIN_SAMPLES = 20       # latencies needed before the percentile is trusted
+HEDGE_MIN_DELAY = 0.2        # never hedge sooner than this (seconds)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("POWER_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("POWER_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class LatencyTracker:
+    """Sliding window of recent successful latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open every call is
+    rejected; after `reset_seconds` a single probe is let through (half-open) and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            return True # this caller is the probe
+        return self.state == "closed"
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def abandon_probe(self):
+        # The probe ended without a verdict (e.g. it was cancelled): stay open and
+        # let another probe through after reset_seconds, rather than never again
+        if self.state == "half_open":
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class _Attempt:
+    """One in-flight attempt, and when it actually went out (its scheduler slot was granted)."""
+
+    def __init__(self, attempt_fn):
+        self.sent_at = None
+        self.sent = asyncio.Event()
+        self.task = asyncio.ensure_future(attempt_fn(self.mark_sent))
+
+    def mark_sent(self):
+        self.sent_at = time.monotonic()
+        self.sent.set()
+
+
+class ResilientCaller:
+    """Runs request attempts through the breaker, hedging and retry policies."""
+
+    def __init__(self, attempts: int = RETRY_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, hedge_percentile: float = HEDGE_PERCENTILE,
+                 breaker: CircuitBreaker = None):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def backoff(self, attempt: int, error: Exception = None) -> float:
+        # Honour Retry-After on 429/503 when the server sends one
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = error.response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_delay)
+        # "Full jitter" exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, attempt_fn, can_hedge=None):
+        """
+        Calls `attempt_fn` (a coroutine function performing one request) until it
+        succeeds, retries run out or a non-retryable error occurs. attempt_fn gets a
+        `sent()` callback to call once its request actually goes out (e.g. after its
+        scheduler slot is granted): hedge timers and recorded latencies start there,
+        so time spent queuing is never mistaken for upstream latency. `can_hedge()`,
+        when given, is checked before firing a hedge (e.g. False while the host's
+        queue is non-empty, where a hedge would only queue behind everyone else).
+        Raises CircuitOpenError without calling upstream while the breaker is open.
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError("NASA POWER is currently unavailable (circuit open)")
+
+        self.calls += 1
+        try:
+            return await self._retried(attempt_fn, can_hedge)
+        except BaseException:
+            # Covers cancellation, which skips the verdicts recorded in _retried
+            self.breaker.abandon_probe()
+            raise
+
+    async def _retried(self, attempt_fn, can_hedge):
+        for attempt in range(self.attempts):
+            try:
+                result = await self._hedged(attempt_fn, can_hedge)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    # e.g. a 4xx for a bad request says nothing about upstream health
+                    if self.breaker.state == "half_open":
+                        self.breaker.record_success()
+                    raise
+                if attempt == self.attempts - 1:
+                    self.failures += 1
+                    self.breaker.record_failure()
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+
+    async def _hedged(self, attempt_fn, can_hedge=None):
+        hedge_after = self.latency.percentile(self.hedge_percentile) if self.hedge_percentile > 0 else None
+
+        attempts = [_Attempt(attempt_fn)]
+        try:
+            first = attempts[0]
+            if hedge_after is not None:
+                # The hedge clock starts once the request is out, not while it queues
+                sent = asyncio.ensure_future(first.sent.wait())
+                try:
+                    await asyncio.wait([first.task, sent], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    sent.cancel()
+                if not first.task.done():
+                    done, _ = await asyncio.wait([first.task], timeout=max(hedge_after, HEDGE_MIN_DELAY))
+                    if not done and (can_hedge is None or can_hedge()):
+                        self.hedges += 1
+                        attempts.append(_Attempt(attempt_fn))
+
+            by_task = {a.task: a for a in attempts}
+            pending = set(by_task)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = by_task[task]
+                        if winner is not first:
+                            self.hedge_wins += 1
+                        if winner.sent_at is not None:
+                            self.latency.add(time.monotonic() - winner.sent_at)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for a in attempts:
+                a.task.cancel()
+
+    def stats(self) -> dict:
+        p = self.latency.percentile(self.hedge_percentile) if self.hedge_percentile > 0 else None
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+            "rejected_by_breaker": self.rejected,
+            "breaker_state": self.breaker.state,
+            "breaker_times_opened": self.breaker.times_opened,
+            "hedge_after_ms": round(max(p, HEDGE_MIN_DELAY) * 1000, 1) if p is not None else None,
+        }
+
+
+# Shared by every NASA POWER call in nasa_service
+power_resilience = ResilientCaller()
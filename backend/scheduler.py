@@ -0,0 +1,176 @@
+"""
+Global scheduler for upstream (NASA) HTTP requests.
+
+Every outgoing request takes a slot from its host's queue first. Each host has a
+concurrency cap and a token-bucket rate limit, and waiting requests are served
+round-robin across "owners" (one owner per incoming API request), so one large
+polygon analysis can't starve everybody else. Queue depth and wait times are
+tracked for monitoring.
+"""
+import os
+import time
+import asyncio
+import itertools
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+# --- Configuration ---
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "8"))    # per host
+UPSTREAM_RATE_PER_SECOND = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "10")) # per host, 0 disables
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "20"))
+
+# Identifies who a request is made on behalf of; middleware.py sets one per API request
+current_owner = contextvars.ContextVar("upstream_owner", default="default")
+_owner_ids = itertools.count(1)
+
+
+def new_owner(prefix: str = "req") -> str:
+    return f"{prefix}-{next(_owner_ids)}"
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _HostQueue:
+    def __init__(self, max_concurrency: int, rate: float, burst: int):
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.active = 0
+        self.waiting = OrderedDict() # owner -> deque of futures, in round-robin order
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.granted = 0
+        self.total_wait = 0.0
+
+    def enqueue(self, owner, future):
+        self.waiting.setdefault(owner, deque()).append(future)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+
+    def discard(self, owner, future):
+        waiters = self.waiting.get(owner)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self.waiting[owner]
+
+    def next_waiter(self):
+        # Take the oldest waiter of the owner at the front, then send that owner
+        # to the back of the line if it still has more waiting
+        while self.waiting:
+            owner, waiters = next(iter(self.waiting.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self.waiting.move_to_end(owner)
+            else:
+                del self.waiting[owner]
+            if not future.done():
+                return future
+        return None
+
+
+class UpstreamScheduler:
+    """
+    Hands out per-host request slots with a concurrency cap, a rate limit and fair
+    (round-robin per owner) queuing. Use as:
+
+        async with upstream_scheduler.slot(url):
+            response = await client.get(url)
+    """
+
+    def __init__(self, max_concurrency: int = UPSTREAM_MAX_CONCURRENCY,
+                 rate_per_second: float = UPSTREAM_RATE_PER_SECOND, burst: int = UPSTREAM_BURST):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._hosts = {}
+
+    def _host(self, url_or_host: str) -> _HostQueue:
+        host = urlsplit(url_or_host).hostname or url_or_host
+        if host not in self._hosts:
+            self._hosts[host] = _HostQueue(self.max_concurrency, self.rate_per_second, self.burst)
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url_or_host: str, owner: str = None):
+        queue = self._host(url_or_host)
+        owner = owner or current_owner.get()
+        started = time.monotonic()
+
+        if queue.active < queue.max_concurrency and not queue.waiting:
+            queue.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            queue.enqueue(owner, future)
+            try:
+                await future # resolved by _release, which hands its slot straight to us
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(queue) # granted just as we were cancelled: pass it on
+                else:
+                    queue.discard(owner, future)
+                raise
+
+        queue.granted += 1
+        queue.total_wait += time.monotonic() - started
+        try:
+            await queue.bucket.acquire()
+            yield
+        finally:
+            self._release(queue)
+
+    def busy(self, url_or_host: str) -> bool:
+        """True while requests are queued for the host, i.e. every slot is taken."""
+        return self._host(url_or_host).queued > 0
+
+    def _release(self, queue: _HostQueue):
+        future = queue.next_waiter()
+        if future is not None:
+            future.set_result(None) # the slot moves to the waiter; `active` is unchanged
+        else:
+            queue.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            host: {
+                "active": q.active,
+                "queued": q.queued,
+                "queued_owners": len(q.waiting),
+                "max_queue_depth": q.max_queue_depth,
+                "max_concurrency": q.max_concurrency,
+                "rate_per_second": q.bucket.rate,
+                "granted": q.granted,
+                "avg_wait_ms": round(q.total_wait / q.granted * 1000, 2) if q.granted else 0.0,
+            }
+            for host, q in self._hosts.items()
+        }
+
+
+# Shared by nasa_service and the offline tooling (validate_data.py, ingest_grid.py)
+upstream_scheduler = UpstreamScheduler()
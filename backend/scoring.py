@@ -0,0 +1,366 @@
+"""
+Pure, vectorized scoring engine for climatology data.
+
+Nothing in here touches the network: climatology is passed in as a NumPy
+structured array (one field per POWER parameter, one row per month), so the same
+code scores a single point, thousands of batch points or every month of the year
+in one pass, and can be benchmarked offline. The monthly values can also be
+expanded into a smooth 366-row day-of-year table (daily_climatology), so a date's
+conditions are a plain row lookup.
+"""
+import numpy as np
+
+# --- Climatology Layout ---
+
+# Every POWER parameter the scoring engine understands, in storage order
+PARAMETERS = (
+    "T2M", "T2M_MAX", "T2M_MIN",       # Temperature (Avg, Max, Min)
+    "WS10M", "WS10M_MAX",              # Wind Speed (Avg, Max)
+    "RH2M",                            # Relative Humidity
+    "PRECTOTCORR",                     # Precipitation
+    "ALLSKY_SFC_SW_DWN", "KT",         # All Sky Insolation and Clearness Index (for sunlight)
+)
+MONTH_KEYS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+
+CLIMATOLOGY_DTYPE = np.dtype([(p, np.float64) for p in PARAMETERS])
+
+# -999 is the POWER API's code for missing data
+POWER_FILL_VALUE = -999
+
+# Day-of-year tables use a leap-year calendar, so every (month, day) has a row
+DAYS_IN_MONTH = np.array([31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+DAYS_IN_YEAR = int(DAYS_IN_MONTH.sum())
+MONTH_START = np.concatenate(([0], np.cumsum(DAYS_IN_MONTH)[:-1]))
+DAY_MONTH_IDX = np.repeat(np.arange(12), DAYS_IN_MONTH) # month index of each day row
+
+# Annual harmonics in the day-of-year interpolant: 12 monthly values pin down the
+# constant, cos/sin of harmonics 1-5 and the cos term of harmonic 6 exactly
+DAILY_HARMONICS = 6
+# Parameters that can't go negative, so harmonic overshoot is clipped at zero
+NON_NEGATIVE_PARAMETERS = ("WS10M", "WS10M_MAX", "RH2M", "PRECTOTCORR", "ALLSKY_SFC_SW_DWN", "KT")
+
+# Weight keys in the order the component scores are stacked
+SCORE_KEYS = ("temperature", "wind", "rain", "humidity")
+
+
+def climatology_from_power(raw_params: dict) -> np.ndarray:
+    """
+    Converts the `properties.parameter` block of a POWER climatology response into a
+    (12,) structured array. Missing parameters and fill values become NaN.
+    """
+    clim = np.full(12, np.nan, dtype=CLIMATOLOGY_DTYPE)
+    for name in PARAMETERS:
+        monthly = raw_params.get(name)
+        if not monthly:
+            continue
+        values = np.array([monthly.get(m, np.nan) for m in MONTH_KEYS], dtype=np.float64)
+        values[values <= POWER_FILL_VALUE + 1] = np.nan
+        clim[name] = values
+    return clim
+
+
+def select_month(climatology: np.ndarray, month) -> np.ndarray:
+    """
+    Picks one month per point from an (N, 12) climatology array. `month` is 1-12,
+    either a single value or one per point. Returns an (N,) structured array.
+    """
+    climatology = np.atleast_2d(climatology)
+    month_idx = np.broadcast_to(np.asarray(month) - 1, (climatology.shape[0],))
+    return climatology[np.arange(climatology.shape[0]), month_idx]
+
+
+def _harmonic_basis(t: np.ndarray) -> np.ndarray:
+    # Columns: constant, cos of harmonics 1-6, sin of harmonics 1-5 at day positions t
+    angle = 2 * np.pi * np.outer(t, np.arange(1, DAILY_HARMONICS + 1)) / DAYS_IN_YEAR
+    return np.hstack([np.ones((len(t), 1)), np.cos(angle), np.sin(angle[:, :-1])])
+
+
+# Linear map from the 12 monthly values to 366 daily values: the trigonometric
+# interpolant through each month's value on its mid-month day (the 15th or 16th),
+# evaluated on every day of the year. Built once.
+MONTH_MIDPOINTS = MONTH_START + (DAYS_IN_MONTH - 1) // 2
+DAILY_INTERPOLATION = _harmonic_basis(np.arange(DAYS_IN_YEAR)) @ np.linalg.inv(_harmonic_basis(MONTH_MIDPOINTS))
+
+
+def daily_climatology(climatology: np.ndarray) -> np.ndarray:
+    """
+    Expands a (12,) monthly climatology into a (366,) day-of-year table by
+    interpolating annual harmonics through the monthly values: each mid-month day
+    keeps its month's value, and consecutive days change smoothly instead of
+    jumping at month boundaries. A parameter with any
+    missing month falls back to its plain monthly value on each day.
+    """
+    monthly = _monthly_values(climatology) # (12, P)
+    fitted = DAILY_INTERPOLATION @ monthly
+    stepped = monthly[DAY_MONTH_IDX]
+    return _conditions_from_values(np.where(np.isnan(monthly).any(axis=0), stepped, fitted))
+
+
+def conditions_for_day(climatology: np.ndarray, month: int, day: int) -> np.ndarray:
+    """
+    Interpolates an (N, 12) climatology array to a single date, giving the same
+    values as each row's daily_climatology table without building the tables.
+    Returns an (N,) structured array.
+    """
+    day_idx = day_of_year(month, day)
+    monthly = _monthly_values(np.atleast_2d(climatology)) # (N, 12, P)
+    fitted = DAILY_INTERPOLATION[day_idx] @ monthly
+    stepped = monthly[:, DAY_MONTH_IDX[day_idx]]
+    return _conditions_from_values(np.where(np.isnan(monthly).any(axis=1), stepped, fitted))
+
+
+def _monthly_values(climatology: np.ndarray) -> np.ndarray:
+    # (..., 12) structured -> (..., 12, P) float array, parameters in PARAMETERS order
+    return np.stack([climatology[p] for p in PARAMETERS], axis=-1)
+
+
+def _conditions_from_values(values: np.ndarray) -> np.ndarray:
+    # (..., P) float array -> (...,) structured, clipping interpolation overshoot
+    conditions = np.empty(values.shape[:-1], dtype=CLIMATOLOGY_DTYPE)
+    for i, name in enumerate(PARAMETERS):
+        conditions[name] = values[..., i]
+    for name in NON_NEGATIVE_PARAMETERS:
+        conditions[name] = np.maximum(conditions[name], 0)
+    conditions["RH2M"] = np.minimum(conditions["RH2M"], 100)
+    return conditions
+
+
+def day_of_year(month, day) -> np.ndarray:
+    """
+    Row index (0-365) into a daily_climatology table for a month (1-12) and day,
+    either single values or arrays. Days past the end of the month are clamped to
+    its last day.
+    """
+    month_idx = np.asarray(month) - 1
+    day = np.clip(np.asarray(day), 1, DAYS_IN_MONTH[month_idx])
+    return MONTH_START[month_idx] + day - 1
+
+
+def select_day(daily: np.ndarray, month, day) -> np.ndarray:
+    """
+    Picks one day per point from an (N, 366) daily climatology array, the
+    day-of-year counterpart of select_month. Returns an (N,) structured array.
+    """
+    daily = np.atleast_2d(daily)
+    day_idx = np.broadcast_to(day_of_year(month, day), (daily.shape[0],))
+    return daily[np.arange(daily.shape[0]), day_idx]
+
+
+def _as_dict(obj) -> dict:
+    # Accept the pydantic request models as well as plain dicts
+    if isinstance(obj, dict):
+        return obj
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return obj.dict()
+
+
+def _fill(values, default):
+    return np.where(np.isnan(values), default, values)
+
+
+# --- Helper Functions ---
+
+def calculate_heat_index(T, RH):
+    """
+    Calculates Heat Index in Celsius. A simplified version of the NOAA formula for broader applicability.
+    This gives an indication of perceived temperature. Works element-wise on arrays.
+    """
+    # Formula is based on Fahrenheit, so we convert back and forth.
+    T = np.asarray(T, dtype=np.float64)
+    RH = np.asarray(RH, dtype=np.float64)
+    T_F = T * 9/5 + 32
+
+    # Simple formula for lower temperatures
+    simple_F = 0.5 * (T_F + 61.0 + ((T_F - 68.0) * 1.2) + (RH * 0.094))
+    # More complex formula for higher temperatures
+    full_F = (-42.379 + 2.04901523*T_F + 10.14333127*RH - .22475541*T_F*RH - .00683783*T_F*T_F
+              - .05481717*RH*RH + .00122874*T_F*T_F*RH + .00085282*T_F*RH*RH - .00000199*T_F*T_F*RH*RH)
+    HI_F = np.where(T_F < 80, simple_F, full_F)
+
+    HI_C = (HI_F - 32) * 5/9 # Convert final result back to Celsius
+    return float(HI_C) if HI_C.ndim == 0 else HI_C
+
+
+def estimate_rain_probability(precip_avg_daily):
+    # Heuristic: A simple but effective model to estimate the chance of a rainy day.
+    return np.minimum(np.asarray(precip_avg_daily) * 15, 100)
+
+
+# --- Scoring ---
+
+def score_conditions(conditions: np.ndarray, profile, weights, probabilities: dict = None) -> dict:
+    """
+    Scores an (N,) structured array of conditions (one row per point, month or day)
+    against a comfort profile and weights. Returns a dict of (N,) arrays; rows whose
+    T2M is missing are marked invalid in `valid`.
+
+    `probabilities` optionally carries empirical "rain" and "all_conditions"
+    percentages (see probability_table.py), scalars or (N,) arrays with NaN/None
+    where unknown. They replace the rain heuristic and the all-or-nothing
+    percent_meet_profile.
+    """
+    profile = _as_dict(profile)
+    weights = _as_dict(weights)
+
+    # --- 1. Temperature ---
+    temp_avg = conditions["T2M"]
+    valid = ~np.isnan(temp_avg)
+    temp_max = _fill(conditions["T2M_MAX"], temp_avg)
+    temp_min = _fill(conditions["T2M_MIN"], temp_avg)
+    temp_in_comfort = (profile["temp_min"] <= temp_avg) & (temp_avg <= profile["temp_max"])
+
+    # --- 2. Wind ---
+    wind_avg = _fill(conditions["WS10M"], 0)
+    wind_max = _fill(conditions["WS10M_MAX"], wind_avg)
+    wind_in_comfort = wind_avg <= profile["wind_max"]
+
+    # --- 3. Humidity ---
+    humidity_avg = _fill(conditions["RH2M"], 50) # Default to 50%
+    humidity_in_comfort = humidity_avg <= profile["humidity_max"]
+
+    # --- 4. Precipitation ---
+    precip_avg_daily = _fill(conditions["PRECTOTCORR"], 0)
+    rain_probability = estimate_rain_probability(precip_avg_daily)
+    probabilities = probabilities or {}
+    if probabilities.get("rain") is not None:
+        rain_probability = _fill(np.asarray(probabilities["rain"], dtype=np.float64), rain_probability)
+    rain_in_comfort = rain_probability <= profile["rain_chance_max"]
+
+    # --- 5. Specialty Scores ---
+    heat_index_avg = calculate_heat_index(temp_avg, humidity_avg)
+    # Only counts if it's already warm
+    uncomfortable_chance = np.where(temp_avg > 27, np.minimum((heat_index_avg - 27) * 10, 100), 0)
+
+    clearness_index = _fill(conditions["KT"], 0.5) # Default to 0.5 (partly cloudy) if missing
+    golden_hour_score = np.rint(clearness_index * 10) # Convert to a simple 1-10 score
+    sunny_day_likelihood = np.rint(clearness_index * 100)
+
+    # --- 6. Weighted Overall Score ---
+    met = np.stack([temp_in_comfort, wind_in_comfort, rain_in_comfort, humidity_in_comfort])
+    weight_vector = np.array([weights[k] for k in SCORE_KEYS], dtype=np.float64)
+    total_weight = sum(weights.values())
+    if total_weight > 0:
+        overall_score = np.rint(weight_vector @ met / total_weight * 100)
+    else:
+        overall_score = np.zeros(len(conditions))
+
+    all_in_comfort = met.all(axis=0)
+    percent_meet_profile = all_in_comfort * 100.0
+    if probabilities.get("all_conditions") is not None:
+        percent_meet_profile = _fill(np.asarray(probabilities["all_conditions"], dtype=np.float64), percent_meet_profile)
+
+    return {
+        "valid": valid,
+        "temp_avg": temp_avg, "temp_min": temp_min, "temp_max": temp_max,
+        "temp_in_comfort": temp_in_comfort,
+        "wind_avg": wind_avg, "wind_max": wind_max, "wind_in_comfort": wind_in_comfort,
+        "humidity_avg": humidity_avg, "humidity_in_comfort": humidity_in_comfort,
+        "precip_avg_daily": precip_avg_daily, "rain_probability": rain_probability,
+        "rain_in_comfort": rain_in_comfort,
+        "uncomfortable_chance": np.rint(np.maximum(uncomfortable_chance, 0)),
+        "clearness_index": clearness_index,
+        "golden_hour_score": golden_hour_score,
+        "sunny_day_likelihood": sunny_day_likelihood,
+        "overall_score": overall_score,
+        "all_in_comfort": all_in_comfort,
+        "percent_meet_profile": np.broadcast_to(percent_meet_profile, valid.shape),
+    }
+
+
+def rank_conditions(scored: dict, profile) -> np.ndarray:
+    """
+    Orders the rows of a score_conditions result from best to worst: highest overall
+    score first, then rows meeting every preference, then the temperature closest to
+    the middle of the comfort band, then the lowest rain chance. Invalid rows are
+    left out. Returns the row indices.
+    """
+    profile = _as_dict(profile)
+    temp_target = (profile["temp_min"] + profile["temp_max"]) / 2
+    # np.lexsort sorts by the last key first, ascending
+    order = np.lexsort((
+        scored["rain_probability"],
+        np.abs(scored["temp_avg"] - temp_target),
+        ~scored["all_in_comfort"],
+        -scored["overall_score"],
+    ))
+    return order[scored["valid"][order]]
+
+
+# --- Response Construction ---
+
+def build_signatures(scored: dict, lats, lons, locations) -> list:
+    """
+    Turns the arrays from score_conditions into the per-point "Atmospheric Signature"
+    response dicts returned by /api/analyze/point. Invalid rows become None.
+    """
+    # One bulk conversion to Python scalars instead of per-element numpy access
+    c = {k: v.tolist() for k, v in scored.items()}
+    if isinstance(locations, str):
+        locations = [locations] * len(c["valid"])
+
+    signatures = []
+    for i, (lat, lon, location) in enumerate(zip(lats, lons, locations)):
+        if not c["valid"][i]:
+            signatures.append(None)
+            continue
+
+        overall_score = int(c["overall_score"][i])
+        sunny_day_likelihood = int(c["sunny_day_likelihood"][i])
+        temp_avg, temp_ok = round(c["temp_avg"][i], 1), c["temp_in_comfort"][i]
+        wind_avg, wind_ok = round(c["wind_avg"][i], 1), c["wind_in_comfort"][i]
+        humidity_avg, humidity_ok = round(c["humidity_avg"][i], 1), c["humidity_in_comfort"][i]
+        rain_chance, rain_ok = round(c["rain_probability"][i], 1), c["rain_in_comfort"][i]
+        specialty_scores = {
+            "uncomfortable_heat_chance": int(c["uncomfortable_chance"][i]),
+            "golden_hour_quality": int(c["golden_hour_score"][i]),
+            # A simple blend of the main score and the likelihood of sun
+            "outdoor_activity_index": round((overall_score + sunny_day_likelihood) / 2)
+        }
+
+        signatures.append({
+            "overall_score": overall_score,
+            "location": location,
+            "atmospheric_signature": {
+                "temperature": {
+                    "avg": temp_avg, "min": round(c["temp_min"][i], 1), "max": round(c["temp_max"][i], 1),
+                    "meets_profile": temp_ok, "units": "°C"
+                },
+                "wind": {
+                    "avg": wind_avg, "max": round(c["wind_max"][i], 1),
+                    "meets_profile": wind_ok, "units": "m/s"
+                },
+                "humidity": {
+                    "avg": humidity_avg,
+                    "meets_profile": humidity_ok, "units": "%"
+                },
+                "precipitation": {
+                    "avg_daily_amount": round(c["precip_avg_daily"][i], 2), # mm/day
+                    "estimated_daily_chance": rain_chance,
+                    "meets_profile": rain_ok, "units": {"amount": "mm/day", "chance": "%"}
+                },
+                "sunlight": {
+                    "sunny_day_likelihood": sunny_day_likelihood,
+                    "clearness_index": round(c["clearness_index"][i], 2), "units": "% likelihood"
+                }
+            },
+            "specialty_scores": specialty_scores,
+            "final_verdict": {
+                "percent_meet_profile": round(c["percent_meet_profile"][i]),
+                "samples_evaluated": 1
+            },
+            # Per-sample (single point) details for frontend consistency
+            "samples": [{
+                "lat": lat,
+                "lon": lon,
+                "overall_score": overall_score,
+                "atmospheric_signature": {
+                    "temperature": {"avg": temp_avg, "meets_profile": temp_ok},
+                    "wind": {"avg": wind_avg, "meets_profile": wind_ok},
+                    "humidity": {"avg": humidity_avg, "meets_profile": humidity_ok},
+                    "precipitation": {"estimated_daily_chance": rain_chance, "meets_profile": rain_ok},
+                },
+                "specialty_scores": specialty_scores
+            }]
+        })
+    return signatures
@@ -0,0 +1,117 @@
+"""
+Optional OpenTelemetry tracing.
+
+When TRACING_EXPORTER is set and the opentelemetry SDK is installed, every API
+request gets a server span, and beneath it a span per grid cell a batch or
+polygon loads (the sample tasks) and per POWER HTTP attempt, tagged with where
+the climatology came from (store, memory, disk, api, stale). Spans are exported
+in batches to an OTLP collector, to a JSON-lines file or to stdout, and only a
+TRACING_SAMPLE_RATIO share of traces is recorded (callers propagating a sampled
+traceparent are always followed). Without it, `span()` is a no-op context
+manager and nothing else changes.
+
+    pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http
+    TRACING_EXPORTER=otlp OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318 uvicorn main:app
+    TRACING_EXPORTER=file TRACING_FILE=data/traces.jsonl uvicorn main:app
+"""
+import os
+import importlib.util
+from contextlib import contextmanager, nullcontext
+
+# --- Configuration ---
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower() # "otlp", "file", "console" or empty (off)
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))
+TRACING_FILE = os.getenv("TRACING_FILE", "data/traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "atmosphere-backend")
+HAS_OTEL = importlib.util.find_spec("opentelemetry") is not None and importlib.util.find_spec("opentelemetry.sdk") is not None
+
+_tracer = None
+_provider = None
+
+
+def setup_tracing() -> bool:
+    """
+    Installs the tracer provider and exporter. Returns whether tracing is on; it
+    stays off when TRACING_EXPORTER is unset or the SDK isn't installed.
+    """
+    global _tracer, _provider
+    if _tracer is not None or not TRACING_EXPORTER:
+        return _tracer is not None
+    if not HAS_OTEL:
+        print("TRACING_EXPORTER is set but opentelemetry-sdk is not installed; tracing is off")
+        return False
+
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    # Batched, so exporting never happens on the request path
+    _provider.add_span_processor(BatchSpanProcessor(_create_exporter(TRACING_EXPORTER)))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("atmosphere")
+    return True
+
+
+def _create_exporter(kind: str):
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    if kind == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        if importlib.util.find_spec("opentelemetry.exporter.otlp.proto.http") is not None:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        else:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if kind == "file":
+        os.makedirs(os.path.dirname(TRACING_FILE) or ".", exist_ok=True)
+        # One JSON span per line
+        return ConsoleSpanExporter(out=open(TRACING_FILE, "a"), formatter=lambda s: s.to_json(indent=None) + "\n")
+    if kind == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER '{kind}' (expected otlp, file or console)")
+
+
+def shutdown_tracing():
+    """Flushes the spans still queued for export."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def tracing_enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **attributes):
+    """A child span of the current one, or a no-op when tracing is off."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def server_span(method: str, path: str, headers):
+    """
+    The root span of one API request, continuing the caller's trace when it sent a
+    traceparent header. Yields the span (None when tracing is off) so the route
+    template and status can be set once they are known.
+    """
+    if _tracer is None:
+        yield None
+        return
+    from opentelemetry import propagate
+    from opentelemetry.trace import SpanKind
+    attributes = {"http.request.method": method, "url.path": path}
+    with _tracer.start_as_current_span(method, context=propagate.extract(headers), kind=SpanKind.SERVER, attributes=attributes) as current:
+        yield current
+
+
+def set_attribute(key: str, value):
+    """Tags the current span, if any."""
+    if _tracer is not None:
+        from opentelemetry import trace
+        trace.get_current_span().set_attribute(key, value)
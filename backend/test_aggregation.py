@@ -0,0 +1,39 @@
+"""
+Tests for combining point analyses into a region result (aggregation.py).
+
+    pip install pytest && pytest test_aggregation.py
+"""
+from aggregation import aggregate_results, RunningAggregate
+
+
+def signature(percent_meet, meets=False, score=50):
+    flags = {"meets_profile": meets}
+    return {
+        "overall_score": score,
+        "atmospheric_signature": {
+            "temperature": {"avg": 20, **flags}, "wind": {"avg": 3, **flags},
+            "humidity": {"avg": 50, **flags}, "precipitation": {"estimated_daily_chance": 10, **flags},
+        },
+        "final_verdict": {"percent_meet_profile": percent_meet},
+    }
+
+
+def test_percent_meet_is_mean_of_sample_percentages():
+    # Every cell meets the profile 49% of the time, so the region does too
+    samples = [signature(49), signature(49), signature(49)]
+    assert aggregate_results(samples)["final_verdict"]["percent_meet_profile"] == 49
+
+    running = RunningAggregate()
+    for s in samples:
+        running.add(s)
+    assert running.snapshot()["percent_meet_profile"] == 49
+
+
+def test_percent_meet_uses_sample_weights():
+    samples = [signature(100, meets=True), signature(0)]
+    assert aggregate_results(samples, [3.0, 1.0])["final_verdict"]["percent_meet_profile"] == 75
+
+    running = RunningAggregate()
+    running.add(samples[0], 3.0)
+    running.add(samples[1], 1.0)
+    assert running.snapshot()["percent_meet_profile"] == 75
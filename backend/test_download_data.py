@@ -0,0 +1,93 @@
+"""
+Tests for the resumable MERRA-2 downloader (download_data.py), run against the
+fake files served by power_stub.py.
+
+    pip install pytest && pytest test_download_data.py
+"""
+import socket
+import asyncio
+import hashlib
+import threading
+import time
+from datetime import date
+
+import pytest
+import uvicorn
+
+import download_data
+import power_stub
+from download_data import download_all, dates_in_range, merra_file_name, MANIFEST_FILE
+
+DATES = dates_in_range(date(2020, 8, 1), date(2020, 8, 8))
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(power_stub.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}/data/MERRA2/M2T1NXSLV.5.12.4/"
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Stub settings for one test, restored afterwards; retries don't back off."""
+    monkeypatch.setattr(download_data, "RETRY_MAX_DELAY", 0)
+    monkeypatch.setattr(download_data, "RETRY_ATTEMPTS", 20) # a file cut off 5 times in a row is routine at 50%
+    saved = dict(power_stub.STUB_CONFIG)
+    power_stub.reset_stats()
+    yield power_stub.update_config
+    power_stub.update_config(saved)
+
+
+def checksums() -> dict:
+    return {merra_file_name(d): hashlib.sha256(power_stub.merra_file_bytes(merra_file_name(d))).hexdigest() for d in DATES}
+
+
+def test_truncated_transfers_resume(stub, stub_url, tmp_path):
+    stub({"truncate_rate": 0.5, "seed": 1})
+    progress = asyncio.run(download_all(DATES, tmp_path, stub_url, concurrency=4, checksums=checksums()))
+
+    assert progress.completed == len(DATES) and progress.failed == 0
+    assert power_stub.stats["truncated"] > 0
+    # Every cut-off transfer kept its first half and was picked up with a Range request
+    assert progress.resumed == power_stub.stats["range_requests"] == power_stub.stats["truncated"]
+    for d in DATES:
+        name = merra_file_name(d)
+        assert (tmp_path / name).read_bytes() == power_stub.merra_file_bytes(name)
+    assert not list(tmp_path.glob("*.part"))
+    # Nothing was downloaded twice
+    assert progress.bytes == sum(len(power_stub.merra_file_bytes(merra_file_name(d))) for d in DATES)
+
+
+def test_checksum_mismatch_fails(stub, stub_url, tmp_path):
+    expected = {name: "0" * 64 for name in checksums()}
+    progress = asyncio.run(download_all(DATES[:2], tmp_path, stub_url, concurrency=2, checksums=expected))
+
+    assert progress.completed == 0 and progress.failed == 2
+    assert not list(tmp_path.glob("*.nc4")) and not list(tmp_path.glob("*.part"))
+    assert progress.bytes == 0
+
+
+def test_login_page_is_rejected(stub, stub_url, tmp_path):
+    stub({"login_rate": 1.0})
+    progress = asyncio.run(download_all(DATES[:2], tmp_path, stub_url, concurrency=2))
+
+    assert progress.failed == 2 and progress.retries == 0 # a bad token won't fix itself
+    assert not list(tmp_path.glob("*.nc4")) and not list(tmp_path.glob("*.part"))
+
+
+def test_rerun_skips_completed_files(stub, stub_url, tmp_path):
+    asyncio.run(download_all(DATES[:3], tmp_path, stub_url, concurrency=2))
+    assert (tmp_path / MANIFEST_FILE).exists()
+    power_stub.reset_stats()
+
+    progress = asyncio.run(download_all(DATES[:3], tmp_path, stub_url, concurrency=2))
+    assert progress.skipped == 3 and power_stub.stats["file_requests"] == 0
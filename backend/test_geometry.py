@@ -0,0 +1,54 @@
+"""
+Tests for GeoJSON parsing and polygon sampling in geometry.py.
+
+    pip install pytest && pytest test_geometry.py
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from geometry import parse_polygons, sample_polygons
+from main import app
+
+SQUARE = [[76.0, 20.0], [80.0, 20.0], [80.0, 24.0], [76.0, 24.0], [76.0, 20.0]]
+PROFILE = {"temp_min": 15, "temp_max": 25, "wind_max": 10, "rain_chance_max": 20, "humidity_max": 70}
+
+
+@pytest.mark.parametrize("payload", [
+    {"type": "Polygon", "coordinates": [SQUARE]},
+    {"type": "MultiPolygon", "coordinates": [[SQUARE]]},
+    {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [SQUARE]}},
+    {"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [SQUARE]}}]},
+    {"coordinates": SQUARE}, # bare ring, as the frontend used to send
+])
+def test_parses_polygon_payloads(payload):
+    polygons = parse_polygons(payload)
+    assert len(polygons) == 1 and polygons[0][0].shape == (5, 2)
+    assert all(76 <= lon <= 80 and 20 <= lat <= 24 for lat, lon in sample_polygons(polygons, 9))
+
+
+@pytest.mark.parametrize("payload", [
+    {"type": "Point", "coordinates": [78.0, 22.0]},
+    {"type": "LineString", "coordinates": SQUARE},
+    {"type": "Feature", "geometry": {"type": "Point", "coordinates": [78.0, 22.0]}},
+])
+def test_rejects_other_geometry_types(payload):
+    with pytest.raises(ValueError, match="Unsupported geometry type"):
+        parse_polygons(payload)
+
+
+@pytest.mark.parametrize("payload", [
+    {"type": "Polygon", "coordinates": []},
+    {"type": "Polygon", "coordinates": [[]]},
+    {"type": "Polygon", "coordinates": [["a", "b", "c"]]},
+])
+def test_rejects_malformed_polygons(payload):
+    with pytest.raises(ValueError, match="Invalid polygon payload"):
+        parse_polygons(payload)
+
+
+def test_point_geometry_is_a_bad_request():
+    body = {"polygon": {"type": "Point", "coordinates": [78.0, 22.0]}, "month": 7, "day": 15, "profile": PROFILE}
+    with TestClient(app) as client:
+        response = client.post("/api/analyze/polygon", json=body)
+    assert response.status_code == 400
+    assert "Unsupported geometry type" in response.json()["detail"]
@@ -0,0 +1,94 @@
+"""
+Tests for the offline climatology grid store (grid_store.py), built from saved
+POWER responses with ingest_grid.py.
+
+    pip install pytest && pytest test_grid_store.py
+"""
+import json
+import asyncio
+
+import numpy as np
+import pytest
+
+import nasa_service
+from climatology_cache import ClimatologyCache, memory_cache
+from grid_store import GridStore
+from ingest_grid import import_from_dir
+from power_grid import snap_to_cell, cell_center, cell_key
+from power_stub import climatology_payload
+from scoring import PARAMETERS
+
+# Points near Delhi and Mumbai, deliberately off their cells' centres
+POINTS = [(28.61, 77.21), (19.08, 72.88)]
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    fixtures = tmp_path_factory.mktemp("power_climatology")
+    for i, (lat, lon) in enumerate(POINTS):
+        (fixtures / f"point_{i}.json").write_text(json.dumps(climatology_payload(lat, lon, PARAMETERS)))
+    store = GridStore.create(str(tmp_path_factory.mktemp("grid")), PARAMETERS)
+    assert import_from_dir(store, str(fixtures)) == len(POINTS)
+    store.save_meta()
+    return GridStore.open(store.directory)
+
+
+@pytest.fixture
+def service(monkeypatch, store):
+    """nasa_service with the fixture store, no disk cache and an empty LRU."""
+    monkeypatch.setattr(nasa_service, "get_disk_cache", lambda: None)
+    monkeypatch.setattr(nasa_service, "get_grid_store", lambda: store)
+    memory_cache.clear()
+    yield monkeypatch
+    memory_cache.clear()
+
+
+def test_store_is_mapped_and_counts_cells(store):
+    assert isinstance(store.data, np.memmap)
+    assert store.meta["cells_filled"] == len(POINTS)
+
+
+def test_lookup_snaps_points_to_their_cell(store):
+    for lat, lon in POINTS:
+        centre = cell_center(*snap_to_cell(lat, lon))
+        expected = store.lookup(*centre)
+        assert expected is not None
+        # Anywhere inside the cell reads the same block
+        for dlat, dlon in [(0.2, -0.3), (-0.24, 0.3)]:
+            np.testing.assert_array_equal(store.lookup(centre[0] + dlat, centre[1] + dlon), expected)
+        # The next cell over was never ingested
+        assert store.lookup(centre[0] + 0.5, centre[1]) is None
+
+
+def test_store_hit_matches_api_record(service, store):
+    async def fetch(lat, lon, client=None):
+        return climatology_payload(lat, lon, PARAMETERS), "api"
+
+    lat, lon = POINTS[0]
+    from_store = asyncio.run(nasa_service.load_climatology(lat, lon))
+    assert from_store.source == "store"
+    assert asyncio.run(nasa_service.load_climatology(lat, lon)) is from_store # served from the LRU
+
+    memory_cache.clear()
+    service.setattr(nasa_service, "get_grid_store", lambda: None)
+    service.setattr(nasa_service, "_fetch_climatology", fetch)
+    from_api = asyncio.run(nasa_service.load_climatology(lat, lon))
+    assert from_api.source == "api"
+
+    assert from_store.cell == from_api.cell
+    for name in PARAMETERS:
+        # The store keeps float32
+        np.testing.assert_allclose(from_store.climatology[name], from_api.climatology[name], rtol=1e-6, atol=1e-5)
+        np.testing.assert_allclose(from_store.daily[name], from_api.daily[name], rtol=1e-5, atol=1e-4)
+
+
+def test_disk_cache_hit_is_labelled_cache(service, tmp_path):
+    lat, lon = POINTS[1]
+    cache = ClimatologyCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    cache.put(cell_key(lat, lon), nasa_service.CLIMATOLOGY_PARAMS_KEY, climatology_payload(lat, lon, PARAMETERS))
+    service.setattr(nasa_service, "get_disk_cache", lambda: cache)
+    service.setattr(nasa_service, "get_grid_store", lambda: None)
+
+    record = asyncio.run(nasa_service.load_climatology(lat, lon))
+    assert record.source == "cache"
+    assert cache.hits == 1
@@ -0,0 +1,87 @@
+"""
+Tests for the per-day probability table (probability_table.py), built with
+build_probabilities.py from a small synthetic MERRA-2 store.
+
+    pip install pytest && pytest test_probability_table.py
+"""
+import numpy as np
+import pytest
+
+from build_probabilities import build
+from ingest_merra2 import bbox_slices
+from merra2_store import MERRA2Store, DAILY_VARIABLES
+from power_grid import cell_center
+from probability_table import ProbabilityTable, TABLE_VARIABLES, WINDOW_DAYS
+from scoring import DAYS_IN_YEAR, day_of_year
+
+BBOX = (76, 20, 78, 22)
+YEARS = (2019, 2020)
+PROFILE = {"temp_min": 15, "temp_max": 25, "wind_max": 10, "rain_chance_max": 20, "humidity_max": 70}
+
+
+def july_day(day: int, shape) -> dict:
+    """
+    One day's summary: 20 °C on odd days and 10 °C on even ones, 2 mm of rain on
+    days divisible by 3, light wind and moderate humidity throughout.
+    """
+    values = {name: np.full(shape, 0.0) for name in DAILY_VARIABLES}
+    values["T2M"][:] = 20.0 if day % 2 else 10.0
+    values["PRECTOTCORR"][:] = 2.0 if day % 3 == 0 else 0.0
+    values["WS10M"][:] = 3.0
+    values["RH2M"][:] = 50.0
+    return values
+
+
+@pytest.fixture(scope="module")
+def table(tmp_path_factory):
+    store_dir = str(tmp_path_factory.mktemp("merra2_store"))
+    store = MERRA2Store.open(store_dir, create=True)
+    lat_idx, lon_idx = bbox_slices(BBOX)
+    shape = (lat_idx.stop - lat_idx.start, lon_idx.stop - lon_idx.start)
+    for year in YEARS:
+        days = [f"{year}07{d:02d}" for d in range(1, 32)]
+        store.write_month(year, 7, days, [july_day(d, shape) for d in range(1, 32)], lat_idx, lon_idx)
+    store.save_meta()
+
+    out_dir = str(tmp_path_factory.mktemp("probability_table"))
+    build(store_dir, out_dir)
+    return ProbabilityTable.open(out_dir)
+
+
+def test_table_is_a_float16_memmap_of_the_region(table):
+    lat_idx, lon_idx = bbox_slices(BBOX)
+    assert isinstance(table.data, np.memmap)
+    assert table.data.dtype == np.float16
+    assert table.data.shape == (lat_idx.stop - lat_idx.start, lon_idx.stop - lon_idx.start,
+                                DAYS_IN_YEAR, len(YEARS), len(TABLE_VARIABLES))
+    assert table.meta["first_year"] == YEARS[0]
+
+
+def test_lookup_counts_the_days_around_the_date(table):
+    # 15 July +- 7 days is 8-22 July: 7 of 15 days are warm (odd), 5 are rainy
+    # (divisible by 3) and 4 are warm and dry (11, 13, 17, 19)
+    probabilities = table.probabilities(21.0, 77.0, 7, 15, PROFILE)
+    assert probabilities["samples"] == (2 * WINDOW_DAYS + 1) * len(YEARS)
+    assert probabilities["temp_in_range"] == round(7 / 15 * 100, 1)
+    assert probabilities["rain"] == round(5 / 15 * 100, 1)
+    assert probabilities["all_conditions"] == round(4 / 15 * 100, 1)
+    assert probabilities["wind_over_max"] == 0 and probabilities["humidity_over_max"] == 0
+    assert probabilities["years"] == list(YEARS)
+
+
+def test_vectorized_lookup_matches_point_lookup(table):
+    lat_idx, lon_idx = table.lat_start + 1, table.lon_start + 2
+    lat, lon = cell_center(lat_idx, lon_idx)
+    days = day_of_year(np.array([7, 7]), np.array([15, 20]))
+    cells = table.cell_probabilities(np.array([lat_idx, lat_idx]), np.array([lon_idx, lon_idx]), days, PROFILE)
+    for i, day in enumerate([15, 20]):
+        point = table.probabilities(lat, lon, 7, day, PROFILE)
+        assert cells["rain"][i] == point["rain"]
+        assert cells["all_conditions"][i] == point["all_conditions"]
+
+
+def test_uncovered_cells_and_dates(table):
+    assert table.probabilities(40.0, 77.0, 7, 15, PROFILE) is None # outside the box
+    assert table.probabilities(21.0, 77.0, 1, 15, PROFILE) is None # no January in the store
+    cells = table.cell_probabilities(np.array([table.lat_stop]), np.array([table.lon_start]), np.array([200]), PROFILE)
+    assert np.isnan(cells["rain"][0]) and np.isnan(cells["all_conditions"][0])
@@ -0,0 +1,132 @@
+"""
+Tests for the retry, hedging and circuit breaker policies in resilience.py.
+
+    pip install pytest && pytest test_resilience.py
+
+The last tests run nasa_service against the POWER stub (power_stub.py) in process.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+import nasa_service
+import power_stub
+from climatology_cache import ClimatologyCache
+from power_grid import cell_key
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, LatencyTracker, HEDGE_MIN_SAMPLES
+
+STUB_URL = "http://stub/api/temporal/climatology/point"
+
+
+def test_cancelled_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    caller = ResilientCaller(attempts=1, hedge_percentile=0, breaker=breaker)
+
+    async def hang(sent):
+        sent()
+        await asyncio.sleep(60)
+
+    async def run():
+        probe = asyncio.ensure_future(caller.call(hang))
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half_open"
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+    asyncio.run(run())
+    assert breaker.state == "open"
+    assert breaker.allow() # the next caller gets to probe again
+
+
+def test_queue_wait_is_not_recorded_as_latency():
+    caller = ResilientCaller(attempts=1, hedge_percentile=0)
+
+    async def queued_then_fast(sent):
+        await asyncio.sleep(0.2) # waiting for a scheduler slot
+        sent()
+        return "ok"
+
+    assert asyncio.run(caller.call(queued_then_fast)) == "ok"
+    assert max(caller.latency.samples) < 0.1
+
+
+def test_no_hedge_while_queue_is_busy():
+    caller = ResilientCaller(attempts=1, hedge_percentile=50)
+    caller.latency = LatencyTracker()
+    for _ in range(HEDGE_MIN_SAMPLES):
+        caller.latency.add(0.001) # hedge as early as allowed
+
+    async def slow(sent):
+        sent()
+        await asyncio.sleep(0.3)
+        return "ok"
+
+    assert asyncio.run(caller.call(slow, can_hedge=lambda: False)) == "ok"
+    assert caller.hedges == 0
+    assert asyncio.run(caller.call(slow, can_hedge=lambda: True)) == "ok"
+    assert caller.hedges == 1
+
+
+# --- Against the local POWER stub (power_stub.py) ---
+
+@pytest.fixture
+def stub(monkeypatch):
+    """
+    nasa_service pointed at the stub app in process, with a fresh caller that
+    doesn't back off or hedge. Yields the stub's update_config.
+    """
+    monkeypatch.setattr(nasa_service, "POWER_CLIMATOLOGY_API_URL", STUB_URL)
+    monkeypatch.setattr(nasa_service, "power_resilience", ResilientCaller(attempts=5, base_delay=0, hedge_percentile=0))
+    saved = dict(power_stub.STUB_CONFIG)
+    power_stub.reset_stats()
+    power_stub.update_config({"latency_ms": 0, "seed": 3})
+    yield power_stub.update_config
+    power_stub.update_config(saved)
+
+
+def stub_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=power_stub.app))
+
+
+def test_retries_through_stub_failures(stub):
+    stub({"failure_rate": 0.5})
+
+    async def run():
+        async with stub_client() as client:
+            return [await nasa_service._fetch_power_json({"latitude": 20, "longitude": 78, "parameters": "T2M"}, client)
+                    for _ in range(10)]
+
+    payloads = asyncio.run(run())
+    assert all(p["properties"]["parameter"]["T2M"] for p in payloads)
+    assert power_stub.stats["failures"] > 0
+    assert nasa_service.power_resilience.retries == power_stub.stats["failures"]
+
+
+def test_open_breaker_falls_back_to_stale_cache(stub, monkeypatch, tmp_path):
+    stub({"failure_rate": 1.0})
+    nasa_service.power_resilience.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    cache = ClimatologyCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    key = (cell_key(20, 78), nasa_service.CLIMATOLOGY_PARAMS_KEY)
+    cached = power_stub.climatology_payload(20, 78, ["T2M"])
+    cache.put(*key, cached)
+    cache._conn.execute("UPDATE climatology SET fetched_at = 0") # long expired
+    monkeypatch.setattr(nasa_service, "get_disk_cache", lambda: cache)
+
+    async def run():
+        async with stub_client() as client:
+            first = await nasa_service.fetch_climatology(20, 78, client)
+            calls = power_stub.stats["calls"]
+            second = await nasa_service.fetch_climatology(20, 78, client)
+            return first, second, calls
+
+    first, second, calls = asyncio.run(run())
+    assert first == cached and second == cached
+    assert nasa_service.power_resilience.breaker.state == "open"
+    assert power_stub.stats["calls"] == calls # the open breaker kept the second call off upstream
+
+    # Without a cached copy, the open breaker surfaces as CircuitOpenError
+    cache._conn.execute("DELETE FROM climatology")
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(nasa_service.fetch_climatology(20, 78, None))
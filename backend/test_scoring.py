@@ -0,0 +1,58 @@
+"""
+Tests for the day-of-year interpolation and signature building in scoring.py.
+
+    pip install pytest && pytest test_scoring.py
+"""
+import numpy as np
+
+from scoring import (PARAMETERS, CLIMATOLOGY_DTYPE, MONTH_MIDPOINTS, daily_climatology, conditions_for_day,
+                     day_of_year, score_conditions, build_signatures)
+
+PROFILE = {"temp_min": 15, "temp_max": 25, "wind_max": 10, "rain_chance_max": 20, "humidity_max": 70}
+WEIGHTS = {"temperature": 1.5, "wind": 1.0, "rain": 2.0, "humidity": 1.0}
+
+# A monsoon climate: near-dry winter and spring, a wet summer
+PRECIP = [0.1, 0.2, 0.1, 0.5, 2.0, 8.0, 12.0, 11.0, 6.0, 1.0, 0.3, 0.1]
+T2M = [5, 6, 10, 15, 20, 24, 26, 25, 21, 15, 9, 6]
+
+
+def climatology() -> np.ndarray:
+    clim = np.zeros(12, dtype=CLIMATOLOGY_DTYPE)
+    for name in PARAMETERS:
+        clim[name] = np.linspace(0.3, 0.7, 12) if name == "KT" else 50.0
+    clim["PRECTOTCORR"] = PRECIP
+    clim["T2M"] = T2M
+    clim["T2M_MAX"] = np.add(T2M, 5)
+    clim["T2M_MIN"] = np.subtract(T2M, 5)
+    clim["WS10M"] = 3.0
+    return clim
+
+
+def test_mid_month_days_reproduce_monthly_means():
+    daily = daily_climatology(climatology())
+    for name in PARAMETERS:
+        np.testing.assert_allclose(daily[name][MONTH_MIDPOINTS], climatology()[name], atol=1e-9, err_msg=name)
+
+
+def test_conditions_for_day_matches_daily_table():
+    daily = daily_climatology(climatology())
+    for month, day in [(1, 16), (2, 29), (3, 1), (7, 31), (12, 31)]:
+        row = conditions_for_day(climatology(), month, day)[0]
+        expected = daily[day_of_year(month, day)]
+        for name in PARAMETERS:
+            assert np.isclose(row[name], expected[name]), (month, day, name)
+
+
+def test_dry_months_stay_dry():
+    # 0.1 mm/day in March must not be smoothed up by the wet season next to it
+    march = conditions_for_day(climatology(), 3, 16)
+    assert np.isclose(march["PRECTOTCORR"][0], 0.1)
+    scored = score_conditions(march, PROFILE, WEIGHTS)
+    assert scored["rain_probability"][0] < 5
+
+
+def test_signature_values_are_rounded():
+    conditions = conditions_for_day(climatology(), 4, 10)
+    signature = build_signatures(score_conditions(conditions, PROFILE, WEIGHTS), [20.0], [78.0], "Test")[0]
+    sunlight = signature["atmospheric_signature"]["sunlight"]
+    assert sunlight["clearness_index"] == round(sunlight["clearness_index"], 2)
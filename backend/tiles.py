@@ -0,0 +1,116 @@
+"""
+XYZ (slippy map) tiles rendered from the offline climatology grid store.
+
+Each 256x256 Web Mercator tile is mapped onto the POWER grid cells under its
+pixels, those cells are read from the grid store (see grid_store.py) and
+interpolated to the requested date, and the tile is colored either by a profile's
+comfort score or by one raw parameter. Rendered PNGs are kept in a bounded LRU
+keyed by their ETag, so panning back over an area costs a dictionary lookup.
+"""
+import os
+import hashlib
+import numpy as np
+
+from power_grid import LAT_STEP, LON_STEP, N_LAT, N_LON
+from scoring import PARAMETERS, conditions_for_day, score_conditions, day_of_year
+from probability_table import get_probability_table, empirical_probabilities
+from climatology_cache import MemoryLRU
+from heatmap import NODATA, score_colors, encode_png
+
+# --- Configuration ---
+TILE_SIZE = 256
+MAX_TILE_ZOOM = int(os.getenv("MAX_TILE_ZOOM", "12"))
+TILE_CACHE_MAX_ENTRIES = int(os.getenv("TILE_CACHE_MAX_ENTRIES", "4096"))
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TILE_MAX_AGE = int(os.getenv("TILE_MAX_AGE", "86400")) # Cache-Control max-age, in seconds
+
+# Value ranges the parameter layers are colored over (values outside are clamped)
+PARAMETER_RANGES = {
+    "T2M": (-30, 45), "T2M_MAX": (-25, 50), "T2M_MIN": (-35, 40), # °C
+    "WS10M": (0, 15), "WS10M_MAX": (0, 25),                       # m/s
+    "RH2M": (0, 100),                                             # %
+    "PRECTOTCORR": (0, 15),                                       # mm/day
+    "ALLSKY_SFC_SW_DWN": (0, 9),                                  # kWh/m²/day
+    "KT": (0, 1),
+}
+SCORE_LAYER = "score"
+LAYERS = (SCORE_LAYER,) + PARAMETERS
+
+# Blue -> cyan -> yellow -> red ramp for parameter layers
+_RAMP_STOPS = np.array([0.0, 0.33, 0.66, 1.0])
+_RAMP_COLORS = np.array([[49, 54, 149], [116, 173, 209], [254, 224, 144], [215, 48, 39]])
+
+tile_cache = MemoryLRU(TILE_CACHE_MAX_ENTRIES, TILE_CACHE_MAX_BYTES)
+
+
+def tile_cells(z: int, x: int, y: int):
+    """
+    Returns (lat_idx, lon_idx) arrays of the POWER grid cell under each pixel row
+    and column of a Web Mercator tile (rows north to south).
+    """
+    n = 2 ** z
+    offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lons = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    lat_idx = np.clip(np.rint((lats + 90.0) / LAT_STEP), 0, N_LAT - 1).astype(np.int64)
+    lon_idx = np.rint((lons + 180.0) / LON_STEP).astype(np.int64) % N_LON
+    return lat_idx, lon_idx
+
+
+def parameter_colors(values: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Maps values to RGBA along the parameter ramp; NaN becomes transparent."""
+    # NaN (uncovered cells) would not survive the uint8 cast; alpha hides them anyway
+    t = np.nan_to_num(np.clip((values - low) / (high - low), 0, 1))
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.rint(np.interp(t, _RAMP_STOPS, _RAMP_COLORS[:, channel]))
+    rgba[..., 3] = np.where(np.isnan(values), 0, 170)
+    return rgba
+
+
+def tile_etag(store, layer: str, z: int, x: int, y: int, month: int, day: int, profile=None, weights=None) -> str:
+    """
+    A strong ETag for one rendered tile. It covers everything the image depends on,
+    including the grid store build, so re-ingesting invalidates cached tiles.
+    """
+    key = [layer, z, x, y, month, day, store.meta.get("created"), store.meta.get("cells_filled")]
+    if layer == SCORE_LAYER:
+        table = get_probability_table()
+        key += [sorted(profile.items()), sorted(weights.items()), table.meta.get("created") if table else None]
+    return '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+
+
+def render_tile(store, layer: str, z: int, x: int, y: int, month: int, day: int, profile=None, weights=None) -> bytes:
+    """
+    Renders one tile as a PNG. Only the distinct grid cells under the tile are read
+    and scored (at most a few hundred even at low zoom), then expanded to pixels.
+    """
+    lat_idx, lon_idx = tile_cells(z, x, y)
+    rows, row_inverse = np.unique(lat_idx, return_inverse=True)
+    cols, col_inverse = np.unique(lon_idx, return_inverse=True)
+
+    climatology = store.lookup_cells(rows[:, None], cols[None, :]) # (rows, cols, 12)
+    conditions = conditions_for_day(climatology.reshape(-1, 12), month, day)
+
+    if layer == SCORE_LAYER:
+        probabilities = empirical_probabilities(rows[:, None], cols[None, :], day_of_year(month, day), profile)
+        scored = score_conditions(conditions, profile, weights, probabilities)
+        scores = np.where(scored["valid"], np.clip(scored["overall_score"], 0, 100), NODATA).astype(np.uint8)
+        colors = score_colors(scores)
+    else:
+        # A cell the store doesn't cover has no T2M either
+        values = np.where(np.isnan(conditions["T2M"]), np.nan, conditions[layer])
+        colors = parameter_colors(values, *PARAMETER_RANGES[layer])
+
+    colors = colors.reshape(len(rows), len(cols), 4)
+    return encode_png(colors[row_inverse][:, col_inverse])
+
+
+def get_tile(store, layer: str, z: int, x: int, y: int, month: int, day: int, profile=None, weights=None):
+    """Returns (png_bytes, etag), serving repeat requests from tile_cache."""
+    etag = tile_etag(store, layer, z, x, y, month, day, profile, weights)
+    png = tile_cache.get(etag)
+    if png is None:
+        png = render_tile(store, layer, z, x, y, month, day, profile, weights)
+        tile_cache.put(etag, png, len(png))
+    return png, etag
@@ -6,6 +6,8 @@ from datetime import datetime
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+from scheduler import upstream_scheduler, current_owner
+
 # --- Configuration ---
 load_dotenv()
 NASA_API_KEY = os.getenv("NASA_API_KEY")
@@ -37,7 +39,8 @@ async def get_climatology_prediction(session, lat: float, lon: float, month: int
         "parameters": "T2M", "format": "JSON", "header": "false"
     }
     try:
-        response = await session.get(POWER_CLIMATOLOGY_API_URL, params=params)
+        async with upstream_scheduler.slot(POWER_CLIMATOLOGY_API_URL):
+            response = await session.get(POWER_CLIMATOLOGY_API_URL, params=params)
         response.raise_for_status()
         data = response.json()
         month_key = datetime(2000, month, 1).strftime('%b').upper()
@@ -57,7 +60,8 @@ async def get_recent_actuals(session, lat: float, lon: float, month: int, day: i
         "end": f"{end_year}1231"
     }
     try:
-        response = await session.get(POWER_DAILY_API_URL, params=params)
+        async with upstream_scheduler.slot(POWER_DAILY_API_URL):
+            response = await session.get(POWER_DAILY_API_URL, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -79,6 +83,7 @@ async def run_validation_for_location(session, location):
     Runs the full validation process for a single location.
     """
     lat, lon = location["lat"], location["lon"]
+    current_owner.set(location["name"]) # Queue fairly across locations, not requests
     print(f"\n--- Validating for {location['name']} ---")
 
     # 1. Get the "Prediction" (long-term historical average)
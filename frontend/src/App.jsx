@@ -1,9 +1,10 @@
-import React, { useState } from 'react';
-import { fetchAnalysis } from './api.js';
+import React, { useState, useEffect, useRef } from 'react';
+import { fetchAnalysis, streamPolygonAnalysis, fetchCapabilities, climatologyTileUrl } from './api.js';
 import SearchForm from './components/SearchForm.jsx';
 import ResultsDisplay from './components/ResultsDisplay.jsx';
 import ProfileModal from './components/ProfileModal.jsx';
 import MapPicker from './components/MapPicker.jsx';
+import SamplesMap from './components/SamplesMap.jsx';
 
 export default function App() {
   const [searchParams, setSearchParams] = useState({
@@ -28,18 +29,58 @@ export default function App() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [results, setResults] = useState(null);
+  // Samples analyzed so far while a polygon analysis streams in: { total, samples, running }
+  const [progress, setProgress] = useState(null);
+  const searchAbort = useRef(null);
+  // The map overlay needs the backend's grid store; don't request tiles it can't render
+  const [hasGridStore, setHasGridStore] = useState(false);
+
+  useEffect(() => {
+    fetchCapabilities()
+      .then((capabilities) => setHasGridStore(Boolean(capabilities.grid_store)))
+      .catch(() => setHasGridStore(false));
+    return () => searchAbort.current?.abort();
+  }, []);
+
+  // Polygons are streamed, so samples show up on the map as their grid cells arrive
+  const analyzePolygon = async (signal) => {
+    const samples = [];
+    let total = 0;
+    let failure = null;
+    const summary = await streamPolygonAnalysis(searchParams, profile, weights, (event) => {
+      if (event.type === 'start') {
+        total = event.total;
+      } else if (event.type === 'sample') {
+        samples[event.index] = event.sample;
+        setProgress({ total, samples: samples.filter(Boolean), running: event.running });
+      } else if (event.type === 'error') {
+        failure = event.detail;
+      }
+    }, signal);
+    if (!summary) throw new Error(failure || 'The analysis returned no result');
+    return { ...summary, samples: samples.filter(Boolean) };
+  };
 
   const handleSearch = async () => {
+    searchAbort.current?.abort();
+    const controller = new AbortController();
+    searchAbort.current = controller;
     setLoading(true);
     setError(null);
     setResults(null);
+    setProgress(null);
     try {
-      const data = await fetchAnalysis(searchParams, profile, weights);
+      const data = searchParams.polygon
+        ? await analyzePolygon(controller.signal)
+        : await fetchAnalysis(searchParams, profile, weights);
       setResults(data);
     } catch (e) {
-      setError(e.message);
+      if (e.name !== 'AbortError') setError(e.message);
     } finally {
-      setLoading(false);
+      if (searchAbort.current === controller) {
+        setLoading(false);
+        setProgress(null);
+      }
     }
   };
 
@@ -64,6 +105,7 @@ export default function App() {
   };
 
   const handleReset = () => {
+    searchAbort.current?.abort();
     setResults(null);
     setError(null);
     setSearchParams({
@@ -86,6 +128,19 @@ export default function App() {
             <div className="text-center loadingSpinner">
               <div className="spinner"></div>
               <p style={{ marginTop: '1rem' }}>Analyzing 40+ years of NASA data...</p>
+              {progress && (
+                <>
+                  <p style={{ marginTop: '0.5rem', color: 'var(--text-medium)' }}>
+                    {progress.samples.length} of {progress.total} samples analyzed
+                    {typeof progress.running.percent_meet_profile === 'number' && ` · ${progress.running.percent_meet_profile}% meet your profile so far`}
+                  </p>
+                  <SamplesMap
+                    samples={progress.samples}
+                    center={[parseFloat(searchParams.lat) || 20, parseFloat(searchParams.lon) || 0]}
+                    polygon={searchParams.polygon}
+                  />
+                </>
+              )}
             </div>
           )}
 
@@ -119,6 +174,7 @@ export default function App() {
       {isMapOpen && (
         <MapPicker
           initialCenter={[parseFloat(searchParams.lat) || 20, parseFloat(searchParams.lon) || 0]}
+          overlayUrl={hasGridStore && searchParams.month ? climatologyTileUrl('score', searchParams, profile, weights) : null}
           onSave={handlePolygonSave}
           onClose={() => setIsMapOpen(false)}
         />
@@ -1,7 +1,10 @@
 // The URL where your FastAPI backend is running.
 const POINT_API_URL = "http://127.0.0.1:8000/api/analyze/point";
 const POLYGON_API_URL = "http://127.0.0.1:8000/api/analyze/polygon";
+const POLYGON_STREAM_API_URL = "http://127.0.0.1:8000/api/analyze/polygon/stream";
 const PROFILE_FROM_DATE_URL = "http://127.0.0.1:8000/api/profile/from_date";
+const TILES_URL = "http://127.0.0.1:8000/tiles";
+const CAPABILITIES_URL = "http://127.0.0.1:8000/api/capabilities";
 
 /**
  * Fetches the analysis from the backend API.
@@ -72,3 +75,90 @@ export const fetchProfileFromDate = async ({ lat, lon, month, day }) => {
 
   return response.json();
 };
+
+/**
+ * Asks the backend which optional offline datasets it has. Map tiles and heatmaps
+ * need the climatology grid store; without one they only return 503s.
+ * @returns {Promise<object>} { grid_store: boolean, probability_table: boolean }
+ */
+export const fetchCapabilities = async () => {
+  const response = await fetch(CAPABILITIES_URL);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+};
+
+/**
+ * Builds a Leaflet TileLayer URL template for the backend's climatology map tiles.
+ * The query string changes with the date, profile and weights, so the browser and
+ * the server's tile cache only reuse tiles rendered for the same inputs.
+ * @param {string} layer - 'score' or a POWER parameter such as 'T2M' or 'PRECTOTCORR'.
+ * @param {{month: number, day: number}} date - The date to render.
+ * @param {object} [profile] - The user's comfort profile (score layer only).
+ * @param {object} [weights] - The user's importance weights (score layer only).
+ * @returns {string} - A '{z}/{x}/{y}' URL template.
+ */
+export const climatologyTileUrl = (layer, { month, day }, profile = {}, weights = {}) => {
+  const query = new URLSearchParams({ month: parseInt(month), day: parseInt(day) || 15 });
+  if (layer === 'score') {
+    Object.entries({ ...profile, ...weights }).forEach(([key, value]) => query.set(key, value));
+  }
+  return `${TILES_URL}/${layer}/{z}/{x}/{y}.png?${query}`;
+};
+
+/**
+ * Streams a polygon analysis, calling onEvent for every NDJSON event as it arrives:
+ * {type: 'start'}, then {type: 'sample', sample, running} per sample (or
+ * {type: 'sample_error'}), and finally {type: 'summary', result} or {type: 'error'}.
+ * Pass an AbortSignal to cancel early.
+ * @param {object} searchParams - Must include polygon, month and day.
+ * @param {object} profile - The user's comfort profile.
+ * @param {object} weights - The user's importance weights.
+ * @param {(event: object) => void} onEvent - Called once per streamed event.
+ * @param {AbortSignal} [signal]
+ * @returns {Promise<object|null>} - The final aggregated result, if any.
+ */
+export const streamPolygonAnalysis = async (searchParams, profile, weights, onEvent, signal) => {
+  const response = await fetch(POLYGON_STREAM_API_URL, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
+    body: JSON.stringify({
+      polygon: searchParams.polygon,
+      month: parseInt(searchParams.month),
+      day: parseInt(searchParams.day),
+      profile,
+      weights,
+      sample_count: searchParams.sample_count || 9,
+      mode: searchParams.mode || 'samples',
+    }),
+    signal,
+  });
+
+  if (!response.ok) {
+    const err = await response.json().catch(() => ({}));
+    throw new Error(err.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary = null;
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const event = JSON.parse(line);
+      if (event.type === 'summary') summary = event.result;
+      onEvent(event);
+    }
+  }
+
+  return summary;
+};
@@ -18,7 +18,7 @@ function FitBounds({ bounds }) {
   return null;
 }
 
-export default function MapPicker({ initialCenter = [20, 0], initialZoom = 2, onSave, onClose }) {
+export default function MapPicker({ initialCenter = [20, 0], initialZoom = 2, overlayUrl, onSave, onClose }) {
   const featureGroupRef = useRef(null);
 
   // create draw control after map initialized
@@ -115,6 +115,8 @@ export default function MapPicker({ initialCenter = [20, 0], initialZoom = 2, on
             attribution='Tiles &copy; Esri &mdash; Source: Esri, Maxar, Earthstar Geographics, and the GIS User Community'
             url={'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}'}
           />
+          {/* Optional climatology overlay (comfort score or a parameter) from the backend tile server */}
+          {overlayUrl && <TileLayer url={overlayUrl} opacity={0.6} maxNativeZoom={12} />}
           <FeatureGroup ref={featureGroupRef}>
             <DrawControl />
           </FeatureGroup>